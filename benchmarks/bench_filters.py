@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark for the filters in `parboil.ext`.
+
+Each filter is timed with a set of typical inputs, once called directly
+and once through `memoize` with repeated inputs, the way templates call
+them in loops.
+
+    python benchmarks/bench_filters.py [--number N] [--repeat R]
+"""
+
+import argparse
+import timeit
+import typing as t
+
+from parboil.ext import (
+    jinja_filter_fileify,
+    jinja_filter_roman,
+    jinja_filter_slugify,
+    memoize,
+)
+
+INPUTS: t.Dict[str, t.List[t.Tuple[str, t.Tuple[t.Any, ...]]]] = {
+    "fileify": [
+        ("ascii", ("My Project Name",)),
+        ("umlauts", ("Übung für Größen",)),
+        ("accents", ("Café Crème Brûlée",)),
+        ("long", ("Lorem ipsum dolor sit amet " * 20,)),
+        ("custom sep", ("My Project Name", "-")),
+    ],
+    "slugify": [
+        ("ascii", ("Hello, World!",)),
+        ("accents", ("Café Crème Brûlée",)),
+        ("unicode", ("Straße in Köln", True)),
+        ("long", ("Lorem ipsum, dolor sit amet! " * 20,)),
+    ],
+    "roman": [
+        ("small", (7,)),
+        ("large", (3888,)),
+        ("no int", ("x",)),
+    ],
+}
+
+FILTERS = {
+    "fileify": jinja_filter_fileify,
+    "slugify": jinja_filter_slugify,
+    "roman": jinja_filter_roman,
+}
+
+
+def bench(
+    func: t.Callable[..., t.Any], args: t.Tuple[t.Any, ...], number: int, repeat: int
+) -> float:
+    """Returns the best time per call in nanoseconds."""
+    times = timeit.repeat(lambda: func(*args), number=number, repeat=repeat)
+    return min(times) / number * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    opts = parser.parse_args()
+
+    print(f"{'filter':<10} {'input':<12} {'direct':>12} {'memoized':>12}")
+    for name, func in FILTERS.items():
+        cached = memoize(func)
+        for label, args in INPUTS[name]:
+            direct = bench(func, args, opts.number, opts.repeat)
+            memo = bench(cached, args, opts.number, opts.repeat)
+            print(f"{name:<10} {label:<12} {direct:>9.0f} ns {memo:>9.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
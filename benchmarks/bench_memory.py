@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Measures the peak memory of generating recipes with many files.
+
+Recipes with a growing number of template files are generated once with
+the files materialized like parboil did before (all template paths in
+`Recipe.templates` and all planned files in one list) and once with the
+streaming pipeline, that reads, plans, renders and writes the files in
+chunks.
+
+The rendered files are discarded by a sink, that only counts them, so
+the numbers show the memory of the pipeline itself. This includes the
+output paths of all files, that are kept to detect collisions, so the
+streaming peak still grows slightly with the number of files. Use `--write` to
+write the files to a temporary directory instead.
+
+    python benchmarks/bench_memory.py [--files N,N,...] [--dirs D] [--write]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing as t
+from pathlib import Path
+
+import parboil.recipes
+from parboil.recipes import Boiler, Recipe
+from parboil.sinks import Content, DirectorySink, Sink
+
+
+class CountingSink(Sink):
+    """Discards all files and counts them."""
+
+    def __init__(self) -> None:
+        self.files = 0
+        self.bytes = 0
+
+    def write(self, path: t.Union[str, Path], content: Content) -> None:
+        self.files += 1
+        self.bytes += len(content)
+
+
+def create_recipe(repo: Path, files: int, dirs: int) -> None:
+    recipe = repo / f"files{files}"
+    for d in range(dirs):
+        recipe.joinpath("template", f"pkg{d}").mkdir(parents=True)
+    for i in range(files):
+        # the filenames are rendered, too
+        name = f"{{{{ Name|lower }}}}_mod{i}.py"
+        recipe.joinpath("template", f"pkg{i % dirs}", name).write_text(
+            "# {{ Name }} module " + str(i) + "\n"
+        )
+    recipe.joinpath("parboil.json").write_text(json.dumps({"Name": "Bench"}))
+
+
+def run(
+    repo: Path, name: str, materialized: bool, write: bool
+) -> t.Tuple[float, int, int]:
+    chunk = parboil.recipes.PLAN_CHUNK
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        recipe = Recipe(name, repo, load=True)
+        if materialized:
+            # the template paths and the plan are held completely in memory
+            recipe.templates = list(recipe.walk_templates())
+            parboil.recipes.PLAN_CHUNK = sys.maxsize
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = DirectorySink(tmp) if write else CountingSink()
+            boiler = Boiler(recipe, Path(tmp), dict(), sink=sink, interactive=False)
+            boiler.fill()
+            with sink:
+                created = sum(success for success, _, _ in boiler.compile())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        parboil.recipes.PLAN_CHUNK = chunk
+    return elapsed, peak, created
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", default="1000,5000,20000")
+    parser.add_argument("--dirs", type=int, default=100)
+    parser.add_argument(
+        "--write", action="store_true", help="write the files to a directory"
+    )
+    opts = parser.parse_args()
+
+    print(f"{'files':>7} {'pipeline':<13} {'time':>9} {'peak':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Path(tmp)
+        for files in (int(n) for n in opts.files.split(",")):
+            create_recipe(repo, files, min(files, opts.dirs))
+            for label, materialized in (("materialized", True), ("streaming", False)):
+                elapsed, peak, created = run(
+                    repo, f"files{files}", materialized, opts.write
+                )
+                assert created == files
+                print(
+                    f"{files:>7} {label:<13} {elapsed:>8.2f}s "
+                    f"{peak / 1024 / 1024:>8.1f} MiB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Counts the filesystem calls of writing a generated project to disk.
+
+A tree of small files is written once with the per-file approach parboil
+used before (create the parent directories and check for an existing
+file for every file) and with a `DirectorySink`, that creates each
+directory once and lists directories instead of checking each file.
+The `DirectorySink` runs once without and once with batched writes of
+small files.
+
+Calls are counted at the Python level. Each call can be delayed by
+`--latency` milliseconds to simulate the round trip to a network
+filesystem.
+
+    python benchmarks/bench_syscalls.py [--files N] [--dirs D] [--latency MS]
+"""
+
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from parboil.sinks import DirectorySink, Sink
+
+COUNTED = ("stat", "lstat", "mkdir", "listdir", "scandir", "write", "close", "fsync")
+
+
+class LegacyDirectorySink(DirectorySink):
+    """The directory sink as it was before directories and listings were
+    cached.
+
+    Files are written with the same calls as by `DirectorySink`, so only
+    the directory creation and the existence checks differ.
+    """
+
+    def __init__(self, root: Path):
+        super().__init__(root, batch_size=0)
+
+    def exists(self, path: t.Union[str, Path]) -> bool:
+        return (self.root / path).exists()
+
+    def write(self, path: t.Union[str, Path], content: t.Union[str, bytes]) -> None:
+        target = self.root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        self._write_file(target, content)
+
+
+class CallCounter:
+    """Counts (and delays) calls to filesystem functions of the os module."""
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.counts: t.Counter[str] = collections.Counter()
+        self.active = False
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        if not self.active:
+            return
+        with self._lock:
+            self.counts[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def install(self) -> None:
+        for name in COUNTED:
+            func = getattr(os, name)
+
+            def wrapper(*args, __name=name, __func=func, **kwargs):
+                self.count(__name)
+                return __func(*args, **kwargs)
+
+            setattr(os, name, wrapper)
+
+        # builtins.open and os.open both raise the "open" audit event
+        def hook(event: str, args: t.Tuple[t.Any, ...]) -> None:
+            if event == "open":
+                self.count("open")
+
+        sys.addaudithook(hook)
+
+
+def run(
+    sink: Sink, files: int, dirs: int, check_exists: bool, counter: CallCounter
+) -> t.Tuple[float, t.Counter[str]]:
+    counter.counts.clear()
+    counter.active = True
+    start = time.perf_counter()
+    for i in range(files):
+        path = f"pkg{i % dirs}/sub/file{i}.txt"
+        if check_exists and sink.exists(path):
+            continue
+        sink.write(path, f"# generated file {i}\n" * 10)
+    sink.close()
+    elapsed = time.perf_counter() - start
+    counter.active = False
+    return elapsed, collections.Counter(counter.counts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--dirs", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="delay of each call in ms"
+    )
+    parser.add_argument(
+        "--exists",
+        action="store_true",
+        help="check for existing files like for `overwrite: false`",
+    )
+    opts = parser.parse_args()
+
+    counter = CallCounter(opts.latency / 1000)
+    counter.install()
+
+    sinks: t.Dict[str, t.Callable[[Path], Sink]] = {
+        "per file": LegacyDirectorySink,
+        "cached": lambda root: DirectorySink(root, batch_size=0),
+        "batched": DirectorySink,
+    }
+    names = ["open"] + list(COUNTED)
+    print(
+        f"{'sink':<10} {'time':>9} {'total':>7} " + " ".join(f"{n:>7}" for n in names)
+    )
+    for label, factory in sinks.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = factory(Path(tmp) / "out")
+            elapsed, counts = run(sink, opts.files, opts.dirs, opts.exists, counter)
+        print(
+            f"{label:<10} {elapsed:>8.2f}s {sum(counts.values()):>7} "
+            + " ".join(f"{counts[n]:>7}" for n in names)
+        )
+
+
+if __name__ == "__main__":
+    main()
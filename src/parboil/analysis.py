@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""Analysis of the variables a recipe uses.
+
+Templates, filename patterns and tasks are parsed with jinja to find the
+ingredients and context entries they reference. From that a graph of
+variables and their consumers is built, which allows non-interactive runs
+to evaluate only the ingredients that are actually needed.
+"""
+
+import logging
+import typing as t
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from jinja2 import Environment, TemplateError, meta
+
+from .errors import ProjectConfigError
+from .ingredients import ChoiceIngredient, FileselectIngredient, RecipeIngredient
+from .paths import ConditionalDir, TemplateDir
+from .renderer import _BOOL_WORDS, has_template_syntax
+
+if t.TYPE_CHECKING:
+    from parboil.recipes import Recipe
+
+logger = logging.getLogger(__name__)
+
+# variables provided by parboil itself
+BUILTINS = frozenset(("BOIL", "ENV", "INGREDIENT", "TASK"))
+# objects that allow access to arbitrary values of the boiler
+DYNAMIC = frozenset(("BOILER", "RECIPE"))
+
+
+@dataclass
+class Usage:
+    """Variables used by a recipe.
+
+    Attributes:
+        consumers:
+            Maps each variable to the templates, filenames, tasks,
+            ingredients or context entries that use it.
+        dependencies:
+            Maps ingredients and context entries to the variables they
+            use themselves.
+        roots:
+            Variables used by the generated output.
+        dynamic:
+            `True`, if the recipe accesses variables in a way that can't
+            be analysed. All variables are needed in this case.
+    """
+
+    consumers: t.Dict[str, t.Set[str]] = field(default_factory=dict)
+    dependencies: t.Dict[str, t.Set[str]] = field(default_factory=dict)
+    roots: t.Set[str] = field(default_factory=set)
+    dynamic: bool = False
+
+    def add(self, consumer: str, variables: t.Iterable[str], root: bool) -> None:
+        for var in variables:
+            self.consumers.setdefault(var, set()).add(consumer)
+            if root:
+                self.roots.add(var)
+
+    def needed(
+        self, extra: t.Optional[t.Mapping[str, t.Set[str]]] = None
+    ) -> t.Set[str]:
+        """All variables needed to generate the output, including the
+        variables needed to evaluate those.
+
+        Args:
+            extra: Additional dependencies of variables, e.g. of prefilled
+                values that are templates themselves.
+        """
+        extra = extra or dict()
+        needed: t.Set[str] = set()
+        stack = list(self.roots)
+        while stack:
+            var = stack.pop()
+            if var not in needed:
+                needed.add(var)
+                stack.extend(self.dependencies.get(var, ()))
+                stack.extend(extra.get(var, ()))
+        return needed
+
+    def order(
+        self,
+        names: t.Sequence[str],
+        extra: t.Optional[t.Mapping[str, t.Set[str]]] = None,
+    ) -> t.List[str]:
+        """Orders `names`, so that each variable comes after the variables
+        in `names` it uses, directly or through other variables (like the
+        `_index` of a choice ingredient). Otherwise the order of `names` is
+        kept.
+
+        Args:
+            names: The variables to order, e.g. ingredients in recipe order.
+            extra: Additional dependencies of variables, e.g. of prefilled
+                values that are templates themselves.
+
+        Raises:
+            ProjectConfigError: If the variables depend on each other.
+        """
+        extra = extra or dict()
+        wanted = set(names)
+        deps: t.Dict[str, t.Set[str]] = dict()
+        for name in names:
+            found: t.Set[str] = set()
+            seen = {name}
+            stack = [*self.dependencies.get(name, ()), *extra.get(name, ())]
+            while stack:
+                var = stack.pop()
+                if var in seen:
+                    continue
+                seen.add(var)
+                if var in wanted:
+                    found.add(var)
+                else:
+                    stack.extend(self.dependencies.get(var, ()))
+                    stack.extend(extra.get(var, ()))
+            deps[name] = found
+
+        ordered: t.List[str] = list()
+        done: t.Set[str] = set()
+        pending = list(names)
+        while pending:
+            ready = [name for name in pending if deps[name] <= done]
+            if not ready:
+                raise ProjectConfigError(
+                    f"Ingredients have cyclic dependencies: {', '.join(pending)}"
+                )
+            # only the first ready variable is taken to keep the order
+            ordered.append(ready[0])
+            done.add(ready[0])
+            pending.remove(ready[0])
+        return ordered
+
+    def dead(self, names: t.Iterable[str]) -> t.List[str]:
+        """Returns the variables in `names` nobody needs."""
+        if self.dynamic:
+            return []
+        needed = self.needed()
+        return [name for name in names if name not in needed]
+
+
+class _Analyzer:
+    def __init__(self, recipe: "Recipe"):
+        self.recipe = recipe
+        self.env: Environment = recipe.environment
+        self.usage = Usage()
+        self._parsed: t.Dict[str, t.Set[str]] = dict()
+
+    def variables(self, source: t.Any) -> t.Set[str]:
+        """Finds the variables used in a string template."""
+        if not isinstance(source, str):
+            return set()
+        return self._check(meta.find_undeclared_variables(self.env.parse(source)))
+
+    def condition_variables(self, source: t.Any) -> t.Set[str]:
+        """Finds the variables used in a condition, that is either a
+        template or a single expression."""
+        if not isinstance(source, str) or source.strip().lower() in _BOOL_WORDS:
+            return set()
+        if has_template_syntax(self.env, source):
+            return self.variables(source)
+        return self.variables(f"{{{{ {source} }}}}")
+
+    def _check(self, variables: t.Set[str]) -> t.Set[str]:
+        if variables & DYNAMIC:
+            self.usage.dynamic = True
+        return variables - BUILTINS - DYNAMIC
+
+    def template_variables(self, name: str) -> t.Set[str]:
+        """Finds the variables used in the template file `name` and all
+        templates it includes, imports or extends.
+
+        The parsed template is dropped right away. Only the variables of
+        templates referenced by other templates are cached, so the
+        analysis doesn't keep data for each template file.
+        """
+        source, _, _ = self.env.loader.get_source(self.env, name)  # type: ignore
+        ast = self.env.parse(source)
+        variables = self._check(meta.find_undeclared_variables(ast))
+        refs = list(meta.find_referenced_templates(ast))
+        del ast, source
+        for ref in refs:
+            if ref is None:
+                # dynamic include, can't tell which variables are used
+                self.usage.dynamic = True
+            else:
+                variables |= self._referenced_variables(ref)
+        return variables
+
+    def _referenced_variables(self, name: str) -> t.Set[str]:
+        if name not in self._parsed:
+            # added before parsing to stop recursive includes
+            self._parsed[name] = set()
+            self._parsed[name].update(self.template_variables(name))
+        return self._parsed[name]
+
+    def template_files(self, templates: t.Iterable[t.Any]) -> t.Iterator[str]:
+        """Yields the names of all template files, including the files in
+        template directories and conditional directories."""
+        for _file in templates:
+            if isinstance(_file, TemplateDir):
+                if isinstance(_file, ConditionalDir):
+                    self.usage.add(
+                        f"directory:{_file.path.as_posix()}",
+                        self.condition_variables(_file.condition),
+                        True,
+                    )
+                yield from self.template_files(
+                    self.recipe.rules.walk(self.recipe.templates_dir, _file.path)
+                )
+            elif isinstance(_file, (str, Path)):
+                yield Path(_file).as_posix()
+
+    def analyze(self) -> Usage:
+        recipe = self.recipe
+        usage = self.usage
+
+        for name in self.template_files(recipe.templates):
+            file_cfg = recipe.file_config(name)
+            if file_cfg.get("exclude", False):
+                continue
+            usage.add(
+                f"condition:{name}",
+                self.condition_variables(file_cfg.get("condition")),
+                True,
+            )
+            if "foreach" in file_cfg:
+                usage.add(
+                    f"foreach:{name}",
+                    self.condition_variables(file_cfg["foreach"]),
+                    True,
+                )
+            usage.add(
+                f"filename:{name}",
+                self.variables(file_cfg.get("filename", name)),
+                True,
+            )
+            if file_cfg.get("render", True):
+                usage.add(f"template:{name}", self.template_variables(name), True)
+
+        for hook, tasks in recipe.tasks.items():
+            for i, task in enumerate(tasks):
+                variables = set()
+                for source in task.cmd:
+                    variables |= self.variables(source)
+                for source in (task.env or dict()).values():
+                    variables |= self.variables(source)
+                usage.add(f"task:{hook}:{i+1}", variables, True)
+
+        for ingredient in recipe.ingredients:
+            sources = [ingredient.help, ingredient.default]
+            if isinstance(ingredient, ChoiceIngredient):
+                sources.extend(ingredient.choices)
+                # values set by choice ingredients
+                for suffix in ("_index", "_key"):
+                    usage.dependencies[f"{ingredient.name}{suffix}"] = {ingredient.name}
+            variables = self.condition_variables(ingredient.condition)
+            for source in sources:
+                variables |= self.variables(source)
+            usage.dependencies[ingredient.name] = variables
+            usage.add(f"ingredient:{ingredient.name}", variables, False)
+
+            if isinstance(ingredient, FileselectIngredient):
+                # selected includes add templates with unknown variables
+                usage.roots.add(ingredient.name)
+                for include in recipe.includes:
+                    name = f"includes:{Path(include).as_posix()}"
+                    usage.add(f"template:{name}", self.template_variables(name), True)
+            elif isinstance(ingredient, RecipeIngredient):
+                usage.roots.add(ingredient.name)
+                if ingredient.args.get("pass_context", True):
+                    # the subrecipe may use any variable
+                    usage.dynamic = True
+
+        for key, value in recipe.context.items():
+            variables = self.variables(value)
+            usage.dependencies[key] = variables
+            usage.add(f"context:{key}", variables, False)
+
+        return usage
+
+
+def analyze(recipe: "Recipe") -> Usage:
+    """Analyses which variables `recipe` uses.
+
+    Recipes that can't be parsed are reported as `dynamic`.
+    """
+    analyzer = _Analyzer(recipe)
+    try:
+        return analyzer.analyze()
+    except (TemplateError, UnicodeDecodeError) as e:
+        logger.info("Could not analyse recipe %s: %s", recipe.name, e)
+        return Usage(dynamic=True)
+
+
+def value_dependencies(
+    recipe: "Recipe", values: t.Mapping[str, t.Any]
+) -> t.Optional[t.Dict[str, t.Set[str]]]:
+    """Finds the variables used by values, that are rendered as templates
+    before they are used (like prefilled ingredient values).
+
+    Returns `None` if a value can't be analysed.
+    """
+    analyzer = _Analyzer(recipe)
+    try:
+        dependencies = {
+            name: analyzer.variables(value) for name, value in values.items()
+        }
+    except TemplateError as e:
+        logger.info("Could not analyse values: %s", e)
+        return None
+    if analyzer.usage.dynamic:
+        return None
+    return dependencies
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Embeddable API to generate projects without the commandline interface.
+
+The functions in this module never prompt for input and never change the
+working directory of the process. Each call works on a freshly loaded
+[parboil.recipes.Recipe][], so many generations can run concurrently in
+separate threads:
+
+```python
+from parboil.api import generate
+from parboil.sinks import ZipSink
+
+with open("project.zip", "wb") as f:
+    generate("python-package", {"Name": "foo"}, ZipSink(f), repository=repo)
+```
+"""
+
+import logging
+import typing as t
+from pathlib import Path
+
+from .recipes import Boiler, Recipe, Repository
+from .sinks import MemorySink, Sink
+
+logger = logging.getLogger(__name__)
+
+
+def load_recipe(
+    recipe: t.Union[str, Path, Recipe],
+    repository: t.Optional[t.Union[str, Path, Repository]] = None,
+) -> Recipe:
+    """Loads a new `Recipe` instance for `recipe`.
+
+    `recipe` may be the name of a recipe in `repository`, the path to a
+    recipe directory or an existing `Recipe`. Since recipes are modified
+    while a project is generated, a new instance is loaded in every case.
+
+    Raises:
+        ProjectFileNotFoundError: If the recipe does not exist.
+        ProjectError: If the recipe could not be loaded.
+    """
+    if isinstance(recipe, Recipe):
+        return Recipe(recipe.name, recipe.repository, load=True)
+    elif repository is not None:
+        return Recipe(str(recipe), repository, load=True)
+    else:
+        path = Path(recipe).resolve()
+        return Recipe(path.name, path.parent, load=True)
+
+
+def generate(
+    recipe: t.Union[str, Path, Recipe],
+    answers: t.Optional[t.Dict[str, t.Any]] = None,
+    sink: t.Optional[Sink] = None,
+    *,
+    repository: t.Optional[t.Union[str, Path, Repository]] = None,
+    target_dir: t.Optional[t.Union[str, Path]] = None,
+    run_tasks: bool = True,
+) -> Sink:
+    """Generates a project from `recipe` into `sink`.
+
+    Args:
+        recipe: A recipe name, path or `Recipe` (see [load_recipe][parboil.api.load_recipe]).
+        answers: Values for the recipes ingredients. Ingredients without
+            an answer use their default value.
+        sink: The output backend. Defaults to a new [parboil.sinks.MemorySink][].
+        repository: The repository to load named recipes from.
+        target_dir: The directory reported to templates as `BOIL.OUTDIR`.
+            Defaults to the root of `sink` or the recipe name.
+        run_tasks: If `False`, pre- and post-run tasks are skipped. Tasks
+            can only run for sinks with a directory on disk.
+
+    Returns:
+        The (closed) sink the project was rendered into. If generation
+        fails, the sink is aborted instead (see [parboil.sinks.Sink.abort][]).
+
+    Raises:
+        BoilerError: If the recipe has tasks, `run_tasks` is `True` and
+            `sink` has no working directory.
+    """
+    _recipe = load_recipe(recipe, repository)
+    if not run_tasks:
+        _recipe.tasks = {hook: [] for hook in _recipe.tasks}
+
+    if sink is None:
+        sink = MemorySink()
+    if target_dir is None:
+        target_dir = sink.root or Path(_recipe.name)
+
+    boiler = Boiler(
+        _recipe,
+        Path(target_dir),
+        dict(answers or {}),
+        sink=sink,
+        interactive=False,
+    )
+    # the sink is aborted, if generation fails
+    with sink:
+        boiler.fill()
+        for success, file_in, file_out in boiler.compile():
+            logger.debug("%s -> %s (%s)", file_in, file_out, success)
+
+    return sink
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed cache for the results of tasks.
+
+Tasks with a `cache` option declare the files they read (`inputs`) and
+the files or directories they produce (`outputs`). The cache key is a hash
+of the rendered command, the tasks environment and the contents of all
+inputs. After a task succeeded, its outputs are copied into the cache.
+The next time a task with the same key runs, the outputs are restored
+instead of running the command.
+
+Entries are stored in `CACHE_DIR/<key[:2]>/<key>` and written to a
+temporary directory first, so concurrent runs never see partial entries.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import typing as t
+from pathlib import Path
+
+from .settings import CACHE_DIR
+
+if t.TYPE_CHECKING:
+    from parboil.tasks import Task
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _expand(cwd: Path, patterns: t.Iterable[str]) -> t.List[Path]:
+    """Expands glob `patterns` relative to `cwd` into a sorted list of files."""
+    files = set()
+    for pattern in patterns:
+        for path in sorted(cwd.glob(pattern)):
+            if path.is_dir():
+                files.update(p for p in path.rglob("*") if p.is_file())
+            elif path.is_file():
+                files.add(path)
+    return sorted(files)
+
+
+class TaskCache:
+    """Stores and restores the outputs of cached tasks in `root`."""
+
+    def __init__(self, root: t.Union[str, Path] = CACHE_DIR):
+        self.root = Path(root)
+
+    def key(self, task: "Task", cwd: t.Union[str, Path]) -> str:
+        """Computes the cache key for `task` running in `cwd`.
+
+        Missing inputs are part of the key, so a task is not restored
+        from an entry that was created with an input present.
+        """
+        cwd = Path(cwd)
+        inputs = task.cache.get("inputs", []) if task.cache else []
+        data = dict(
+            cmd=list(task.cmd),
+            shell=task._shell,
+            env=task.env or dict(),
+            outputs=task.cache.get("outputs", []) if task.cache else [],
+            inputs={
+                path.relative_to(cwd).as_posix(): hash_file(path)
+                for path in _expand(cwd, inputs)
+            },
+        )
+        return hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def restore(self, key: str, cwd: t.Union[str, Path]) -> bool:
+        """Copies the outputs for `key` into `cwd`.
+
+        Returns:
+            `True` if the cache had an entry for `key`.
+        """
+        entry = self.path(key)
+        if not entry.is_dir():
+            return False
+        logger.debug("Restoring cache entry %s", key)
+        shutil.copytree(entry, cwd, symlinks=True, dirs_exist_ok=True)
+        return True
+
+    def store(
+        self, key: str, cwd: t.Union[str, Path], outputs: t.Iterable[str]
+    ) -> None:
+        """Copies `outputs` from `cwd` into a new entry for `key`.
+
+        Outputs that don't exist are skipped.
+        """
+        entry = self.path(key)
+        if entry.exists():
+            return
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        cwd = Path(cwd)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key[:8]}-", dir=entry.parent))
+        try:
+            for pattern in outputs:
+                for path in sorted(cwd.glob(pattern)):
+                    target = tmp / path.relative_to(cwd)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    if path.is_dir() and not path.is_symlink():
+                        shutil.copytree(path, target, symlinks=True)
+                    else:
+                        shutil.copy2(path, target, follow_symlinks=False)
+            os.replace(tmp, entry)
+            logger.debug("Stored cache entry %s", key)
+        except OSError:
+            # another process stored the same entry first
+            if not entry.exists():
+                raise
+        finally:
+            if tmp.exists():
+                shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Checksum manifests of generated projects.
+
+With `boil use --manifest` the files of a project are hashed by a
+[parboil.sinks.ChecksumSink][] while they are written. The digests are
+stored in a manifest file in the project, together with the recipe name,
+version and commit and a hash of the answers:
+
+```json
+{
+  "recipe": "python-package",
+  "version": "1.2.0",
+  "commit": "3f1c2e...",
+  "answers": "9b74c9...",
+  "algorithm": "sha256",
+  "files": {"README.md": {"sha256": "e3b0c4...", "size": 0}}
+}
+```
+
+`boil verify DIR` checks a project against its manifest. Files are hashed
+in parallel and large files are mapped into memory instead of being read.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import typing as t
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .errors import ManifestError
+from .helpers import git_head
+from .settings import MANIFEST_FILE
+from .sinks import ChecksumSink
+
+if t.TYPE_CHECKING:
+    from .recipes import Boiler
+
+MMAP_SIZE = 1024 * 1024
+"""Files of at least this many bytes are hashed through mmap."""
+
+
+def answers_hash(answers: t.Mapping[str, t.Any]) -> str:
+    """Returns the SHA-256 of the canonical JSON of `answers`."""
+    data = json.dumps(answers, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: t.Union[str, Path]) -> t.Tuple[str, int]:
+    """Returns the SHA-256 hex digest and the size of the file at `path`."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_SIZE:
+            return hashlib.sha256(f.read()).hexdigest(), size
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return hashlib.sha256(data).hexdigest(), size
+
+
+def write_manifest(sink: ChecksumSink, boiler: "Boiler") -> t.Dict[str, t.Any]:
+    """Writes the manifest for the files written to `sink` by `boiler`.
+
+    The manifest is written to the sink wrapped by `sink`, so it does not
+    list itself.
+
+    Returns:
+        The manifest.
+    """
+    recipe = boiler.recipe
+    answers = {
+        ingredient.name: boiler.context[ingredient.name]
+        for ingredient in recipe.ingredients
+        if ingredient.name in boiler.context
+    }
+    manifest = dict(
+        recipe=recipe.name,
+        version=recipe.settings.get("version"),
+        commit=git_head(recipe.root),
+        answers=answers_hash(answers),
+        algorithm="sha256",
+        files={
+            path: dict(sha256=digest, size=size)
+            for path, (digest, size) in sorted(sink.checksums.items())
+        },
+    )
+    sink.sink.write(MANIFEST_FILE, json.dumps(manifest, indent=2) + "\n")
+    return manifest
+
+
+@dataclass
+class Verification:
+    """Result of verifying a directory against its manifest.
+
+    Attributes:
+        manifest: The loaded manifest.
+        verified: Paths of files matching the manifest.
+        changed: Paths of files with a different checksum or size.
+        missing: Paths of files listed in the manifest, that do not exist.
+    """
+
+    manifest: t.Dict[str, t.Any]
+    verified: t.List[str] = field(default_factory=list)
+    changed: t.List[str] = field(default_factory=list)
+    missing: t.List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not (self.changed or self.missing)
+
+
+def read_manifest(root: t.Union[str, Path]) -> t.Dict[str, t.Any]:
+    """Reads the manifest in `root`.
+
+    Raises:
+        ManifestError: If the manifest is missing or malformed.
+    """
+    root = Path(root)
+    try:
+        with open(root / MANIFEST_FILE) as f:
+            manifest = json.load(f)
+        if not isinstance(manifest["files"], dict):
+            raise TypeError("files is not an object")
+    except FileNotFoundError as e:
+        raise ManifestError(f"No manifest found in {root}.") from e
+    except (ValueError, KeyError, TypeError) as e:
+        raise ManifestError(f"Malformed manifest in {root}.") from e
+    return manifest
+
+
+def verify(root: t.Union[str, Path], jobs: t.Optional[int] = None) -> Verification:
+    """Verifies the files in `root` against the manifest in `root`.
+
+    Files are hashed by up to `jobs` threads (defaults to the number of
+    CPUs). Hashing releases the GIL, so the threads run in parallel.
+
+    Raises:
+        ManifestError: If the manifest is missing or malformed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    root = Path(root)
+    manifest = read_manifest(root)
+    files = manifest["files"]
+    if manifest.get("algorithm", "sha256") != "sha256":
+        raise ManifestError(f"Unsupported algorithm {manifest['algorithm']}.")
+
+    def check(path: str) -> t.Optional[bool]:
+        expected = files[path]
+        try:
+            if os.stat(root / path).st_size != expected["size"]:
+                return False
+            return hash_file(root / path)[0] == expected["sha256"]
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+
+    result = Verification(manifest)
+    paths = sorted(files)
+    with ThreadPoolExecutor(max(1, jobs or os.cpu_count() or 1)) as pool:
+        for path, matches in zip(paths, pool.map(check, paths)):
+            if matches is None:
+                result.missing.append(path)
+            elif matches:
+                result.verified.append(path)
+            else:
+                result.changed.append(path)
+    return result
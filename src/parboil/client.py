@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Thin client for a running `boil serve` daemon.
+
+The client only depends on the standard library, so `boil use --server`
+does not pay for loading recipes, jinja or the filter libraries.
+
+Server addresses are either the path of a unix socket (optionally prefixed
+with `unix:`) or a `host:port` pair (optionally prefixed with `http://`).
+
+Servers on a TCP port need a token. Pass it as `token` or set the
+`BOIL_SERVER_TOKEN` environment variable.
+"""
+
+import http.client
+import json
+import os
+import shutil
+import socket
+import typing as t
+
+from .errors import ServerError
+
+Address = t.Union[str, t.Tuple[str, int]]
+
+TOKEN_ENV = "BOIL_SERVER_TOKEN"
+
+
+def parse_address(address: str) -> Address:
+    """Parses `address` into a socket path or a `(host, port)` tuple."""
+    if address.startswith("unix:"):
+        return address[5:]
+    if address.startswith("http://"):
+        address = address[7:].rstrip("/")
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a unix domain socket."""
+
+    def __init__(self, path: str, timeout: t.Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._path)
+        self.sock = sock
+
+
+def connect(
+    address: str, timeout: t.Optional[float] = None
+) -> http.client.HTTPConnection:
+    addr = parse_address(address)
+    if isinstance(addr, tuple):
+        return http.client.HTTPConnection(*addr, timeout=timeout)
+    return UnixHTTPConnection(addr, timeout=timeout)
+
+
+def request(
+    address: str,
+    method: str,
+    path: str,
+    payload: t.Optional[t.Dict[str, t.Any]] = None,
+    timeout: t.Optional[float] = None,
+    token: t.Optional[str] = None,
+) -> t.Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+    """Sends a request to the server and returns the connection and response.
+
+    The `token` defaults to the `BOIL_SERVER_TOKEN` environment variable.
+
+    Raises:
+        ServerError: If the server can't be reached or answers with an error.
+    """
+    conn = connect(address, timeout=timeout)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    headers = {"Content-Type": "application/json"} if body else {}
+    token = token or os.environ.get(TOKEN_ENV)
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+    except OSError as e:
+        conn.close()
+        raise ServerError(f"Could not connect to server at {address}: {e}") from e
+
+    if response.status != 200:
+        try:
+            msg = json.loads(response.read())["error"]
+        except (ValueError, KeyError):
+            msg = response.reason
+        conn.close()
+        raise ServerError(msg, status=response.status)
+    return conn, response
+
+
+def recipes(address: str, token: t.Optional[str] = None) -> t.List[str]:
+    """Lists the recipes available on the server."""
+    conn, response = request(address, "GET", "/recipes", token=token)
+    try:
+        return json.loads(response.read())["recipes"]
+    finally:
+        conn.close()
+
+
+def generate(
+    address: str,
+    recipe: str,
+    answers: t.Optional[t.Dict[str, t.Any]] = None,
+    *,
+    archive_format: t.Optional[str] = None,
+    out: t.Optional[t.BinaryIO] = None,
+    target: t.Optional[str] = None,
+    hard: bool = False,
+    atomic: bool = False,
+    fsync: str = "none",
+    mtime: t.Optional[int] = None,
+    run_tasks: bool = True,
+    token: t.Optional[str] = None,
+) -> t.Dict[str, t.Any]:
+    """Asks the server to generate a project from `recipe`.
+
+    With `archive_format` the archive is written to `out`. Otherwise the
+    server writes the project into the directory `target`, which should be
+    an absolute path. `atomic` and `fsync` work like for a
+    [parboil.sinks.AtomicDirectorySink][]. With `mtime` the output is
+    reproducible (see [parboil.sinks][]). `token` is sent to the server
+    (see [parboil.client.request][]).
+
+    Returns:
+        The servers JSON response with the number of `created` files
+        and, for directories, the list of generated `files`.
+    """
+    payload = dict(
+        recipe=recipe,
+        answers=answers or {},
+        format=archive_format,
+        target=target,
+        hard=hard,
+        atomic=atomic,
+        fsync=fsync,
+        mtime=mtime,
+        run_tasks=run_tasks,
+    )
+    conn, response = request(address, "POST", "/generate", payload, token=token)
+    try:
+        if archive_format:
+            shutil.copyfileobj(response, out)
+            return dict(created=int(response.getheader("X-Parboil-Created", 0)))
+        return json.loads(response.read())
+    finally:
+        conn.close()
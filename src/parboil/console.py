@@ -5,47 +5,35 @@ import textwrap
 import typing as t
 from functools import partial
 
-import click
-import rich
-from rich.console import Console
-from rich.prompt import (
-    Confirm,
-    DefaultType,
-    FloatPrompt,
-    IntPrompt,
-    Prompt,
-    PromptBase,
-    PromptType,
-)
-from rich.style import Style
-from rich.theme import Theme
-
-THEME = Theme(
-    {
-        # Decorations
-        "info.label": "bright_cyan bold",
-        "info": "default",
-        "error.label": "bright_red bold",
-        "error": "red",
-        "warn.label": "orange_red1 bold",
-        "warn": "orange3",
-        "success.label": "bright_green bold",
-        "success": "default",
-        "question.label": "yellow bold",
-        "question": "default",
-        # Custom highlight
-        "recipe": "bright_magenta",
-        "ingredient": "indian_red bold",
-        "path": "cyan italic",
-        "keyword": "magenta bold",
-        "input": "dark_orange",
-        "cmd": "indian_red1 italic",
-        # Change some default
-        "prompt.default": "indian_red",
-        "repr.path": "cyan italic",
-        "repr.filename": "bright_cyan italic",
-    }
-)
+if t.TYPE_CHECKING:
+    from rich.console import Console
+
+PromptType = t.TypeVar("PromptType")
+
+THEME = {
+    # Decorations
+    "info.label": "bright_cyan bold",
+    "info": "default",
+    "error.label": "bright_red bold",
+    "error": "red",
+    "warn.label": "orange_red1 bold",
+    "warn": "orange3",
+    "success.label": "bright_green bold",
+    "success": "default",
+    "question.label": "yellow bold",
+    "question": "default",
+    # Custom highlight
+    "recipe": "bright_magenta",
+    "ingredient": "indian_red bold",
+    "path": "cyan italic",
+    "keyword": "magenta bold",
+    "input": "dark_orange",
+    "cmd": "indian_red1 italic",
+    # Change some default
+    "prompt.default": "indian_red",
+    "repr.path": "cyan italic",
+    "repr.filename": "bright_cyan italic",
+}
 DECORATIONS = {
     "error": "X",
     "info": "i",
@@ -54,7 +42,29 @@ DECORATIONS = {
     "warn": "!",
 }
 
-out = Console(theme=THEME)
+_out: t.Optional["Console"] = None
+
+
+def get_console() -> "Console":
+    """Returns the console for all output.
+
+    The console (and rich) is loaded on first use, so commands that
+    print plain text start faster.
+    """
+    global _out
+    if _out is None:
+        from rich.console import Console
+        from rich.theme import Theme
+
+        _out = Console(theme=Theme(THEME))
+    return _out
+
+
+def __getattr__(name: str) -> t.Any:
+    # `console.out` is created lazily by `get_console`
+    if name == "out":
+        return get_console()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def decoration(decor: str) -> str:
@@ -65,11 +75,12 @@ def decoration(decor: str) -> str:
 
 def clear():
     """Clear the terminal."""
-    out.clear()
+    get_console().clear()
 
 
 def sep():
     """Draw a separator with the full width of the terminal."""
+    out = get_console()
     out.print("┄" * out.size.width, style="gray66")
 
 
@@ -83,6 +94,7 @@ def printd(
 
     tab = " " * max(0, indent)
 
+    out = get_console()
     out.print(f"{decoration(decor)} {msg[0]}")
     for line in msg[1:]:
         out.print(f"{tab}{line}")
@@ -101,6 +113,9 @@ def prompt(
     secret: bool = False,
 ) -> PromptType:
     """Shows a prompt to the user and returns the next input."""
+    from rich.prompt import Confirm, FloatPrompt, IntPrompt, Prompt
+
+    out = get_console()
     if isinstance(msg, str):
         msg = msg.split("\n")
     else:
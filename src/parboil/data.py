@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Data files for the render context.
+
+`_context` entries of the form `"data:<path>"` reference a JSON, JSONL or
+CSV file in the `data` folder of a recipe. The files are bound to the
+context by a [parboil.data.DataContext][], that only reads a file when a
+template first uses it:
+
+- JSON files are parsed completely. The parsed data is cached in memory
+  (for a warm `boil serve` daemon) and, if the boiler has a cache
+  directory, as a pickle that later runs load instead of parsing the
+  file again. Cache entries are keyed by the path, size and modification
+  time of the file.
+- JSONL and CSV files are bound as [parboil.data.Records][], that stream
+  the rows from the memory mapped file each time they are iterated. Rows
+  of CSV files are dicts keyed by the header row.
+
+Data is shared between runs and should be treated as read-only by
+templates.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import tempfile
+import threading
+import typing as t
+from pathlib import Path
+
+from .errors import DataFileError
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+"""Data file formats by file suffix."""
+
+# parsed JSON files by path with the (size, mtime) they were parsed at
+_parsed: t.Dict[Path, t.Tuple[t.Tuple[int, int], t.Any]] = dict()
+_lock = threading.Lock()
+
+
+def data_format(path: t.Union[str, Path]) -> str:
+    """Returns the format of the data file at `path`.
+
+    Raises:
+        DataFileError: If the suffix is not one of the known `FORMATS`.
+    """
+    try:
+        return FORMATS[Path(path).suffix.lower()]
+    except KeyError:
+        raise DataFileError(
+            f"Unknown data format of {path}. Use one of {', '.join(FORMATS)}."
+        ) from None
+
+
+def _stamp(path: Path) -> t.Tuple[int, int]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise DataFileError(f"Data file {path} not found.") from None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Records:
+    """The rows of a JSONL or CSV file.
+
+    The file is read each time the records are iterated, so the rows are
+    never all in memory. `len()` counts the rows once for each version of
+    the file.
+    """
+
+    def __init__(self, path: t.Union[str, Path], format: str):
+        self.path = Path(path)
+        self.format = format
+        self._len: t.Optional[t.Tuple[t.Tuple[int, int], int]] = None
+
+    def _lines(self) -> t.Generator[bytes, None, None]:
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield from iter(data.readline, b"")
+
+    def __iter__(self) -> t.Iterator[t.Any]:
+        if self.format == "jsonl":
+            for line in self._lines():
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            lines = (line.decode("utf-8") for line in self._lines())
+            first = next(lines, "").removeprefix("\ufeff")
+            yield from csv.DictReader(_chain(first, lines))
+
+    def __len__(self) -> int:
+        stamp = _stamp(self.path)
+        if self._len is None or self._len[0] != stamp:
+            self._len = (stamp, sum(1 for _ in self))
+        return self._len[1]
+
+    def __repr__(self) -> str:
+        return f"<Records {self.path.name}>"
+
+
+def _chain(first: str, rest: t.Iterator[str]) -> t.Iterator[str]:
+    if first:
+        yield first
+    yield from rest
+
+
+def _load_json(path: Path, cache_dir: t.Optional[Path]) -> t.Any:
+    stamp = _stamp(path)
+    with _lock:
+        if path in _parsed and _parsed[path][0] == stamp:
+            return _parsed[path][1]
+
+    cache_file = None
+    if cache_dir is not None:
+        key = hashlib.sha256(f"{path}:{stamp[0]}:{stamp[1]}".encode()).hexdigest()
+        cache_file = cache_dir / f"{key}.pickle"
+        try:
+            with open(cache_file, "rb") as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.debug("Could not load cached data for %s: %s", path, e)
+        else:
+            with _lock:
+                _parsed[path] = (stamp, data)
+            return data
+
+    try:
+        with open(path, "rb") as f:
+            data = json.load(f)
+    except ValueError as e:
+        raise DataFileError(f"Malformed data file {path}: {e}") from e
+    with _lock:
+        _parsed[path] = (stamp, data)
+
+    if cache_file is not None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # written to a temporary file first, so concurrent runs never
+            # read a partial pickle
+            fd, tmp = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_file)
+        except OSError as e:
+            logger.debug("Could not cache data for %s: %s", path, e)
+    return data
+
+
+def load_data(path: t.Union[str, Path], cache_dir: t.Optional[Path] = None) -> t.Any:
+    """Loads the data file at `path`.
+
+    JSON files are parsed (or loaded from the cache in `cache_dir`), JSONL
+    and CSV files are returned as [parboil.data.Records][].
+
+    Raises:
+        DataFileError: If the file is missing, malformed or of an unknown
+            format.
+    """
+    path = Path(path).resolve()
+    format = data_format(path)
+    if format == "json":
+        return _load_json(path, cache_dir)
+    _stamp(path)
+    return Records(path, format)
+
+
+class DataContext(t.Mapping[str, t.Any]):
+    """Context variables bound to data files, that are loaded on first
+    access.
+
+    Args:
+        files: The path of the data file for each variable.
+        cache_dir: Directory to cache parsed JSON files in. If `None`,
+            parsed files are only cached in memory.
+    """
+
+    def __init__(
+        self, files: t.Dict[str, Path], cache_dir: t.Optional[Path] = None
+    ) -> None:
+        self.files = files
+        self.cache_dir = cache_dir
+        self._loaded: t.Dict[str, t.Any] = dict()
+
+    def __getitem__(self, key: str) -> t.Any:
+        if key not in self._loaded:
+            self._loaded[key] = load_data(self.files[key], self.cache_dir)
+        return self._loaded[key]
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self.files)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.files
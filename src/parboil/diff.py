@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Comparison of a rendered project with an existing directory.
+
+`boil use --diff` renders a recipe into a [parboil.diff.ShadowSink][] in
+memory and compares the files with the target directory, without writing
+anything to disk.
+
+Only the rendered files and the files recorded in the manifest of the
+target directory (see [parboil.checksums][]) are compared, so files
+created by tasks or version control don't show up as removed. Other
+files in the directory are only reported with `untracked`.
+"""
+
+import difflib
+import os
+import typing as t
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .paths import PathRules
+from .settings import MANIFEST_FILE
+from .sinks import Content, MemorySink, encode_file
+
+VCS_DIRS = frozenset((".git", ".hg", ".svn", ".bzr"))
+"""Directories that are never reported as removed."""
+
+
+class ShadowSink(MemorySink):
+    """Collects all files in memory like a [parboil.sinks.MemorySink][],
+    but reports the files in the directory `shadowed` as existing.
+
+    Files with `overwrite: false` are skipped like they would be when
+    rendering into `shadowed`.
+    """
+
+    def __init__(self, shadowed: t.Union[str, Path]):
+        super().__init__()
+        self.shadowed = Path(shadowed)
+
+    def exists(self, path: t.Union[str, Path]) -> bool:
+        return super().exists(path) or (self.shadowed / path).exists()
+
+
+def _text_lines(data: bytes) -> t.Optional[t.List[str]]:
+    """Splits `data` into lines or returns `None`, if it is binary."""
+    if b"\0" in data:
+        return None
+    try:
+        return data.decode("utf-8").splitlines(keepends=True)
+    except UnicodeDecodeError:
+        return None
+
+
+@dataclass
+class TreeDiff:
+    """Differences between the `files` of a rendered project and the
+    directory `root`.
+
+    All paths are relative posix paths. `added` files are only in the
+    rendered project, `removed` files only in the directory.
+    """
+
+    root: Path
+    files: t.Mapping[str, Content]
+    added: t.List[str] = field(default_factory=list)
+    changed: t.List[str] = field(default_factory=list)
+    removed: t.List[str] = field(default_factory=list)
+    identical: t.List[str] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self) -> t.Dict[str, t.Any]:
+        """Returns the lists of paths as a JSON serializable dict."""
+        return dict(
+            target=str(self.root),
+            added=self.added,
+            changed=self.changed,
+            removed=self.removed,
+            identical=self.identical,
+        )
+
+    def unified(self, context: int = 3) -> t.Generator[str, None, None]:
+        """Yields the lines of a unified diff from the directory to the
+        rendered project."""
+        added, removed = set(self.added), set(self.removed)
+        for path in sorted(self.added + self.changed + self.removed):
+            old = b"" if path in added else (self.root / path).read_bytes()
+            new = b"" if path in removed else encode_file(self.files[path])
+            fromfile = "/dev/null" if path in added else f"a/{path}"
+            tofile = "/dev/null" if path in removed else f"b/{path}"
+            old_lines, new_lines = _text_lines(old), _text_lines(new)
+            if old_lines is None or new_lines is None:
+                yield f"Binary files {fromfile} and {tofile} differ\n"
+                continue
+
+            for line in difflib.unified_diff(
+                old_lines, new_lines, fromfile, tofile, n=context
+            ):
+                if line.endswith("\n"):
+                    yield line
+                else:
+                    yield line + "\n"
+                    yield "\\ No newline at end of file\n"
+
+
+def compare_tree(
+    files: t.Mapping[str, Content],
+    root: t.Union[str, Path],
+    excludes: t.Iterable[str] = (),
+    recorded: t.Iterable[str] = (),
+    untracked: bool = False,
+) -> TreeDiff:
+    """Compares the rendered `files` with the contents of `root`.
+
+    Files in `recorded` (usually the files in the manifest of `root`),
+    that were not rendered, are reported as removed. With `untracked` all
+    other files in `root` are reported as removed, too, except for
+    version control directories, the manifest and files matching one of
+    the `excludes` glob patterns.
+    """
+    diff = TreeDiff(Path(root), files)
+    for path, content in sorted(files.items()):
+        try:
+            existing = diff.root.joinpath(path).read_bytes()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            diff.added.append(path)
+            continue
+        if existing == encode_file(content):
+            diff.identical.append(path)
+        else:
+            diff.changed.append(path)
+
+    rules = PathRules(excludes=excludes)
+    removed: t.Set[str] = set()
+    for path in recorded:
+        if path not in files and not rules.excluded(path):
+            if diff.root.joinpath(path).is_file():
+                removed.add(path)
+    if untracked:
+        for dirpath, dirs, names in os.walk(diff.root):
+            rel_path = Path(dirpath).relative_to(diff.root)
+            prefix = "".join(f"{part}/" for part in rel_path.parts)
+            dirs[:] = [
+                name
+                for name in dirs
+                if name not in VCS_DIRS and not rules.excluded(prefix + name)
+            ]
+            for name in names:
+                path = prefix + name
+                if path == MANIFEST_FILE:
+                    continue
+                if path not in files and not rules.excluded(path):
+                    removed.add(path)
+    diff.removed = sorted(removed)
+    return diff
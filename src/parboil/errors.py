@@ -27,6 +27,10 @@ class ProjectConfigError(ProjectError):
     pass
 
 
+class DataFileError(ProjectError):
+    pass
+
+
 class RepositoryError(ParboilError):
     def __init__(self, msg, repository):
         self.repository = repository
@@ -42,6 +46,16 @@ class BoilerError(ParboilError):
     pass
 
 
+class PathCollisionError(BoilerError):
+    def __init__(self, path, sources):
+        self.path = path
+        self.sources = sources
+        super().__init__(
+            f"Multiple templates are written to {path}: "
+            + ", ".join(str(source) for source in sources)
+        )
+
+
 class TaskExecutionError(ParboilError):
     def __init__(self, task, msg: str = None):
         self.task = task
@@ -58,3 +72,20 @@ class TaskFailedError(ParboilError):
         if not msg:
             msg = f"Task exited with error code {task.returncode}: <{task.quoted()}>"
         super().__init__(msg)
+
+
+class TaskTimeoutError(TaskFailedError):
+    def __init__(self, task, msg: str = None):
+        if not msg:
+            msg = f"Task timed out after {task.stats.wall_time:.1f}s: <{task.quoted()}>"
+        super().__init__(task, msg)
+
+
+class ServerError(ParboilError):
+    def __init__(self, msg: str, status: int = 500):
+        self.status = status
+        super().__init__(msg)
+
+
+class ManifestError(ParboilError):
+    pass
@@ -7,26 +7,63 @@ import string
 import typing as t
 import unicodedata
 from datetime import datetime
-from functools import update_wrapper
+from functools import lru_cache, wraps
 
-from click import pass_context
 from jinja2 import nodes
 from jinja2.ext import Environment, Extension
 from jinja2.parser import Parser
 
+from .helpers import pass_tpldir  # noqa: F401 (moved to helpers)
 
-def pass_tpldir(f: t.Callable[..., t.Any]) -> t.Callable[..., t.Any]:
-    @pass_context
-    def new_func(ctx, *args, **kwargs):
-        if ctx.obj and "TPLDIR" in ctx.obj:
-            return ctx.invoke(f, ctx.obj["TPLDIR"], *args, **kwargs)
-        else:
-            return ctx.invoke(f, ctx.obj["TPLDIR"], *args, **kwargs)
+DEFAULT_REPLACE = dict(ä="ae", ö="oe", ü="ue", ß="ss")
 
-    return update_wrapper(new_func, f)
+# filters are called for every rendered value, so everything that doesn't
+# depend on the input is computed once
+_IS_WINDOWS = "windows" in platform.system().lower()
+
+_SLUG_STRIP = re.compile(r"[^\w\s-]")
+_SLUG_DASHES = re.compile(r"[-\s]+")
+# removes the ascii characters matched by _SLUG_STRIP and turns dashes
+# into spaces, so runs of both can be collapsed with str.split
+_SLUG_TABLE = {i: None for i in range(128) if _SLUG_STRIP.match(chr(i))}
+_SLUG_TABLE[ord("-")] = " "
+
+_ROMAN_NUMERALS = (
+    (1000, "M"),
+    (900, "CM"),
+    (500, "D"),
+    (400, "CD"),
+    (100, "C"),
+    (90, "XC"),
+    (50, "L"),
+    (40, "XL"),
+    (10, "X"),
+    (9, "IX"),
+    (5, "V"),
+    (4, "IV"),
+    (1, "I"),
+)
+
+
+def memoize(func: t.Callable[..., str], maxsize: int = 1024) -> t.Callable[..., str]:
+    """Caches the results of the filter `func` for repeated arguments.
+
+    Calls with unhashable arguments are passed to `func` directly.
+    """
+    cached = lru_cache(maxsize=maxsize, typed=True)(func)
 
+    @wraps(func)
+    def wrapper(*args: t.Any, **kwargs: t.Any) -> str:
+        try:
+            return cached(*args, **kwargs)
+        except TypeError:
+            # unhashable arguments (filters are pure, so a TypeError raised
+            # by `func` itself is simply raised again)
+            return func(*args, **kwargs)
 
-DEFAULT_REPLACE = dict(ä="ae", ö="oe", ü="ue", ß="ss")
+    wrapper.cache_info = cached.cache_info  # type: ignore
+    wrapper.cache_clear = cached.cache_clear  # type: ignore
+    return wrapper
 
 
 def jinja_filter_fileify(
@@ -48,9 +85,10 @@ def jinja_filter_fileify(
         s = s.replace(k, v)
 
     # keep only valid ascii chars
-    s = unicodedata.normalize("NFKD", s).encode("ASCII", "ignore").decode()
+    if not s.isascii():
+        s = unicodedata.normalize("NFKD", s).encode("ASCII", "ignore").decode()
 
-    if "windows" in platform.system().lower():
+    if _IS_WINDOWS:
         if len(s) > 255:
             s, ext = os.path.splitext(s)
             return s[: (char_limit - len(ext))] + ext
@@ -62,33 +100,33 @@ def jinja_filter_slugify(value: t.Any, allow_unicode: bool = False) -> str:
     Django util.text.slugify
     """
     value = str(value)
-    if allow_unicode:
-        value = unicodedata.normalize("NFKC", value)
+    if not value.isascii():
+        if allow_unicode:
+            value = unicodedata.normalize("NFKC", value)
+        else:
+            value = (
+                unicodedata.normalize("NFKD", value)
+                .encode("ascii", "ignore")
+                .decode("ascii")
+            )
+    value = value.lower()
+    if value.isascii():
+        value = "-".join(value.translate(_SLUG_TABLE).split())
     else:
-        value = (
-            unicodedata.normalize("NFKD", value)
-            .encode("ascii", "ignore")
-            .decode("ascii")
-        )
-    value = re.sub(r"[^\w\s-]", "", value.lower())
-    return re.sub(r"[-\s]+", "-", value).strip("-_")
+        value = _SLUG_DASHES.sub("-", _SLUG_STRIP.sub("", value))
+    return value.strip("-_")
 
 
 def jinja_filter_roman(value: t.Any) -> str:
     """Convert an integer to a Roman numeral.
     https://www.oreilly.com/library/view/python-cookbook/0596001673/ch03s24.html
     """
-
-    # if not isinstance(value, type(1)):
     if not isinstance(value, int):
         return str(value)
     if not 0 < value < 4000:
         return str(value)
-    ints = (1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1)
-    nums = ("M", "CM", "D", "CD", "C", "XC", "L", "XL", "X", "IX", "V", "IV", "I")
     result = []
-    for i in range(len(ints)):
-        count = int(value / ints[i])
-        result.append(nums[i] * count)
-        value -= ints[i] * count
+    for number, numeral in _ROMAN_NUMERALS:
+        count, value = divmod(value, number)
+        result.append(numeral * count)
     return "".join(result)
@@ -1,12 +1,27 @@
 import os
 import typing as t
+from functools import update_wrapper
 from pathlib import Path
 
+from click import pass_context
+
+
+def pass_tpldir(f: t.Callable[..., t.Any]) -> t.Callable[..., t.Any]:
+    @pass_context
+    def new_func(ctx, *args, **kwargs):
+        if ctx.obj and "TPLDIR" in ctx.obj:
+            return ctx.invoke(f, ctx.obj["TPLDIR"], *args, **kwargs)
+        else:
+            return ctx.invoke(f, ctx.obj["TPLDIR"], *args, **kwargs)
+
+    return update_wrapper(new_func, f)
+
 
 def load_files(dir: Path) -> t.Generator[Path, None, None]:
     for root, dirs, files in os.walk(dir):
+        dirs.sort()
         root_path = Path(root)
-        for name in files:
+        for name in sorted(files):
             yield root_path.relative_to(dir) / name
 
 
@@ -14,3 +29,26 @@ def eval_bool(
     value: t.Any, true_values: t.Sequence[str] = ("yes", "true", "y", "1", "ja", "on")
 ) -> bool:
     return str(value).lower() in true_values
+
+
+def git_head(path: t.Union[str, Path]) -> t.Optional[str]:
+    """Returns the commit checked out in the git repository at `path` or
+    `None`, if `path` is no repository.
+
+    The git metadata is read directly, so git does not need to be installed.
+    """
+    git_dir = Path(path) / ".git"
+    try:
+        head = (git_dir / "HEAD").read_text().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[5:]
+        ref_file = git_dir / ref
+        if ref_file.is_file():
+            return ref_file.read_text().strip()
+        for line in (git_dir / "packed-refs").read_text().splitlines():
+            if line.endswith(f" {ref}"):
+                return line.split(" ", 1)[0]
+    except OSError:
+        pass
+    return None
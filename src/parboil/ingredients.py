@@ -6,9 +6,6 @@ from collections.abc import MutableMapping
 from dataclasses import dataclass, field
 
 import click
-import rich
-import rich.prompt
-from rich import inspect
 
 import parboil.console as console
 
@@ -113,7 +110,7 @@ class Ingredient(t.Generic[VTYPE]):
         self.type = type
 
     def __templates__(self) -> t.Generator[str, str, None]:
-        for key in ["help", "default", "value", "condition"]:
+        for key in ["help", "default", "value"]:
             val = getattr(self, key, None)
             if val is not None and isinstance(val, str):
                 setattr(self, key, (yield val))
@@ -124,11 +121,20 @@ class Ingredient(t.Generic[VTYPE]):
 
         If the field already has a value, no prompt is shown. To force a prompt
         call `del field.value` first.
+
+        If `boiler` is not interactive, the default value is used instead.
         """
         if not self.value:
-            self._prompt(boiler)
+            if boiler.interactive:
+                self._prompt(boiler)
+            else:
+                self._use_default(boiler)
         return self.value
 
+    def _use_default(self, boiler: "Boiler") -> None:
+        """Store the default value in `self.value` without prompting the user."""
+        self.value = self.default
+
     def _prompt(self, boiler: "Boiler") -> None:
         """Actually prompt the user for an answer and store the
         result in `self.value`."""
@@ -160,6 +166,9 @@ class ConfirmIngredient(Ingredient):
             self.help,
             default=bool(self.default),
         )
+
+    def _use_default(self, boiler: "Boiler") -> None:
+        self.value = bool(self.default)
         # if bool(self.default):
         #     self.value = not console.confirm(
         #         self.help,
@@ -202,12 +211,31 @@ class ChoiceIngredient(Ingredient):
             boiler.context[f"{self.name}_index"] = 0
         else:
             self.value = None
+        self._selected(boiler)
+
+    def _use_default(self, boiler: "Boiler") -> None:
+        if len(self.choices) > 1:
+            # same answer console.choice would use as its default
+            index = 1
+            if isinstance(self.default, str) and self.default in self.choices:
+                index = self.choices.index(self.default) + 1
+            elif isinstance(self.default, int) and 0 < self.default < len(self.choices):
+                index = self.default
+            self.value = self.choices[index - 1]
+            boiler.context[f"{self.name}_index"] = index
+        elif len(self.choices) == 1:
+            self.value = self.choices[0]
+            boiler.context[f"{self.name}_index"] = 0
+        else:
+            self.value = None
+        self._selected(boiler)
 
+    def _selected(self, boiler: "Boiler") -> None:
+        """Called after a choice was made, either by the user or by default."""
 
-class FileselectIngredient(ChoiceIngredient):
-    def _prompt(self, boiler: "Boiler") -> None:
-        super()._prompt(boiler)
 
+class FileselectIngredient(ChoiceIngredient):
+    def _selected(self, boiler: "Boiler") -> None:
         if self.value:
             boiler.recipe.templates.append(f"includes:{self.value}")
             # optionally update file config with filename
@@ -230,9 +258,7 @@ class ChoiceDictIngredient(ChoiceIngredient):
         for i, val in enumerate(self._values):
             self._values[i] = yield val
 
-    def _prompt(self, boiler: "Boiler") -> None:
-        super()._prompt(boiler)
-
+    def _selected(self, boiler: "Boiler") -> None:
         if self.value:
             i = boiler.context[f"{self.name}_index"]
             boiler.context[f"{self.name}_key"] = self.value
@@ -254,6 +280,9 @@ class RecipeIngredient(Ingredient):
     def recipe_name(self) -> str:
         return self._recipe_name
 
+    def _use_default(self, boiler: "Boiler") -> None:
+        self._prompt(boiler)
+
     def _prompt(self, boiler: "Boiler") -> None:
         console.info(f'Including subrecipe "[recipe]{self.recipe_name}[/]"')
 
@@ -278,7 +307,13 @@ class RecipeIngredient(Ingredient):
                 from .recipes import Boiler
 
             subrecipe.load()
-            subboiler = Boiler(subrecipe, boiler.target_dir, prefilled)
+            subboiler = Boiler(
+                subrecipe,
+                boiler.target_dir,
+                prefilled,
+                sink=boiler.sink,
+                interactive=boiler.interactive,
+            )
             subboiler.fill()
             boiler.recipe.templates.append(subrecipe)
             boiler.context.maps.append({self.name: subrecipe.context})
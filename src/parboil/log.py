@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Deferred logging setup.
+
+`logging.config.dictConfig` creates all handlers right away. For parboil
+that means importing rich for the console handler and opening the error
+log on every start, even though most runs never log a single message.
+`setup` instead installs a `DeferredHandler` for each configured handler,
+which builds the real handler when the first record reaches it.
+
+Only the parts of the `dictConfig` schema used by
+[parboil.settings.LOGGING_CONFIG][] are supported.
+"""
+
+import importlib
+import logging
+import typing as t
+from pathlib import Path
+
+EXT_PREFIX = "ext://"
+
+
+def _resolve(name: str) -> t.Any:
+    """Imports the object with the dotted path `name`."""
+    module_name, _, attr = name.rpartition(".")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _value(value: t.Any) -> t.Any:
+    if isinstance(value, str) and value.startswith(EXT_PREFIX):
+        return _resolve(value[len(EXT_PREFIX) :])
+    return value
+
+
+class DeferredHandler(logging.Handler):
+    """Creates the handler described by `config` on first use.
+
+    `config` is a handler entry of a `dictConfig` configuration and
+    `formatters` the formatter entries it may refer to.
+    """
+
+    def __init__(
+        self,
+        config: t.Dict[str, t.Any],
+        formatters: t.Optional[t.Dict[str, t.Dict[str, t.Any]]] = None,
+    ):
+        super().__init__(config.get("level", logging.NOTSET))
+        self.config = config
+        self.formatters = formatters or dict()
+        self._handler: t.Optional[logging.Handler] = None
+
+    @property
+    def handler(self) -> logging.Handler:
+        if self._handler is None:
+            self._handler = self._create()
+        return self._handler
+
+    def _create(self) -> logging.Handler:
+        kwargs = {key: _value(value) for key, value in self.config.items()}
+        cls = _resolve(kwargs.pop("class"))
+        level = kwargs.pop("level", logging.NOTSET)
+        formatter = kwargs.pop("formatter", None)
+        if "filename" in kwargs:
+            Path(kwargs["filename"]).parent.mkdir(parents=True, exist_ok=True)
+
+        handler = cls(**kwargs)
+        handler.setLevel(level)
+        if formatter:
+            fmt = self.formatters[formatter]
+            handler.setFormatter(
+                logging.Formatter(fmt.get("format"), fmt.get("datefmt"))
+            )
+        return handler
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.handler.handle(record)
+
+    def flush(self) -> None:
+        if self._handler is not None:
+            self._handler.flush()
+
+    def close(self) -> None:
+        if self._handler is not None:
+            self._handler.close()
+        super().close()
+
+
+def _configure(
+    logger: logging.Logger,
+    config: t.Dict[str, t.Any],
+    handlers: t.Dict[str, DeferredHandler],
+) -> None:
+    if "level" in config:
+        logger.setLevel(config["level"])
+    for handler in logger.handlers[:]:
+        if isinstance(handler, DeferredHandler):
+            logger.removeHandler(handler)
+            handler.close()
+    for name in config.get("handlers", []):
+        logger.addHandler(handlers[name])
+
+
+def setup(config: t.Dict[str, t.Any], debug: bool = False) -> None:
+    """Configures logging from the `dictConfig` style `config` with
+    deferred handlers.
+
+    Calling `setup` again replaces the handlers of an earlier call.
+
+    Args:
+        config: The logging configuration.
+        debug: Set the level of the `parboil` logger to `DEBUG`.
+    """
+    formatters = config.get("formatters", dict())
+    handlers = {
+        name: DeferredHandler(cfg, formatters)
+        for name, cfg in config.get("handlers", dict()).items()
+    }
+    for name, cfg in config.get("loggers", dict()).items():
+        _configure(logging.getLogger(name), cfg, handlers)
+    if "root" in config:
+        _configure(logging.getLogger(), config["root"], handlers)
+    if debug:
+        logging.getLogger("parboil").setLevel(logging.DEBUG)
@@ -8,33 +8,62 @@ Run boil --help for more info.
 """
 
 import json
-import logging.config
+import logging
 import os
 import platform
 import re
 import shutil
-import subprocess
+import sys
 import time
 import typing as t
 from pathlib import Path
 
 import click
-import jsonc
-import rich
-from jinja2 import ChoiceLoader, Environment, FileSystemLoader, PrefixLoader
-from rich.panel import Panel
-from rich.syntax import Syntax
-from rich.table import Table
-from rich.tree import Tree
-from rich import inspect
 
 import parboil.console as console
 from parboil import __version__
 
-from .errors import ProjectError, ProjectExistsError, ProjectFileNotFoundError
-from .ext import pass_tpldir
+from . import log
+from .errors import (
+    ManifestError,
+    ProjectConfigError,
+    ProjectError,
+    ProjectFileNotFoundError,
+    ServerError,
+    TaskExecutionError,
+    TaskFailedError,
+)
+from .helpers import pass_tpldir
 from .recipes import Boiler, Recipe, Repository
-from .settings import CFG_DIR, CFG_FILE, LOGGING_CONFIG, TPL_DIR, DEFAULT_CONFIG
+from .sinks import (
+    ARCHIVE_FORMATS,
+    FSYNC_POLICIES,
+    AtomicDirectorySink,
+    ChecksumSink,
+    DirectorySink,
+    MemorySink,
+    remove_in_background,
+    source_date_epoch,
+)
+from .settings import (
+    CFG_FILE,
+    DATA_CACHE_DIR,
+    DEFAULT_CONFIG,
+    LOG_DIR,
+    LOGGING_CONFIG,
+    MANIFEST_FILE,
+    SERVER_SOCKET,
+    TPL_DIR,
+)
+
+# rich, jinja and the task machinery are imported by the commands that
+# need them, to keep the startup of the cli fast
+if t.TYPE_CHECKING:
+    from rich.table import Table
+    from rich.tree import Tree
+
+    from .cache import TaskCache
+    from .tasks import TaskResult
 
 logger = logging.getLogger("parboil")
 
@@ -68,9 +97,7 @@ def boil(
     ctx.ensure_object(dict)
 
     # Setup logging
-    logging.config.dictConfig(LOGGING_CONFIG)
-    if debug:
-        logger.setLevel(logging.DEBUG)
+    log.setup(LOGGING_CONFIG, debug=debug)
 
     logger.info(
         "Starting up [b]parboil[/] :rice:, version [bright_cyan bold]%s[/] (Python [bright_cyan bold]%s[/])",
@@ -83,6 +110,8 @@ def boil(
     ctx.obj = {**ctx.obj, **DEFAULT_CONFIG}
 
     if config:
+        import jsonc
+
         try:
             user_cfg = jsonc.load(config)
             ctx.obj = {**ctx.obj, **user_cfg}
@@ -115,8 +144,11 @@ def list(TPLDIR: Path, plain: bool) -> None:
         if len(repo) > 0:
             if plain:
                 for project_name in repo:
-                    console.out.print(project_name)
+                    click.echo(project_name)
             else:
+                import rich.box
+                from rich.table import Table
+
                 table = Table(
                     title=f"Recipes installed in [path]{TPLDIR}[/path]",
                     # expand=True,
@@ -130,7 +162,7 @@ def list(TPLDIR: Path, plain: bool) -> None:
                 )
 
                 for recipe in sorted(repo.recipes(), key=lambda t: t.name):
-                    recipe.load()
+                    recipe.load_meta()
 
                     name = recipe.name
                     created = "[white on red]unknown[/]"
@@ -314,6 +346,50 @@ def update(ctx: click.Context, recipe: str) -> None:
     is_flag=True,
     help="Force overwrite of existing output directory. If the directory OUT exists and is not empty, it will be deleted and newly created.",
 )
+@click.option(
+    "--atomic",
+    is_flag=True,
+    help="Render into a staging directory next to OUT and swap it into place when generation succeeded. On failure OUT is left untouched. Without --hard the existing files of OUT are linked or copied into the staging directory first, which takes longer for large directories.",
+)
+@click.option(
+    "--fsync",
+    type=click.Choice(FSYNC_POLICIES),
+    default="none",
+    show_default=True,
+    help="Flush written files to disk after each file or once at the end of the run.",
+)
+@click.option(
+    "--reproducible",
+    is_flag=True,
+    help="Give all files the timestamp from SOURCE_DATE_EPOCH (or 1980-01-01) and fixed permissions, so identical input produces identical trees and archives.",
+)
+@click.option(
+    "--plan",
+    is_flag=True,
+    help="Do not write any files or run tasks, but print a JSON manifest of the files, that would be created, overwritten or skipped.",
+)
+@click.option(
+    "--manifest",
+    is_flag=True,
+    help=f"Write the SHA-256 of each generated file to {MANIFEST_FILE} in OUT. Check the project later with boil verify.",
+)
+@click.option(
+    "--diff",
+    is_flag=True,
+    help="Render the project in memory and compare it with OUT without writing anything. Exits with 1, if there are differences.",
+)
+@click.option(
+    "--diff-format",
+    type=click.Choice(["unified", "json"]),
+    default="unified",
+    show_default=True,
+    help="Print a unified diff or a JSON summary of added, changed, removed and identical files.",
+)
+@click.option(
+    "--diff-untracked",
+    is_flag=True,
+    help="Report all files in OUT that the recipe doesn't create as removed, not only the files in its manifest.",
+)
 @click.option(
     "-v",
     "--value",
@@ -321,10 +397,48 @@ def update(ctx: click.Context, recipe: str) -> None:
     nargs=2,
     help="Sets a prefilled value for the recipe.",
 )
+@click.option(
+    "--format",
+    "archive_format",
+    type=click.Choice(sorted(ARCHIVE_FORMATS)),
+    help="Write the project as an archive to OUT instead of a directory. Use - as OUT to stream the archive to stdout.",
+)
+@click.option(
+    "--skip-tasks",
+    is_flag=True,
+    help="Do not run the pre- and post-run tasks of the recipe. Required to create archives from recipes with tasks.",
+)
+@click.option(
+    "--task-jobs",
+    type=click.IntRange(min=1),
+    help="Maximum number of tasks to run concurrently. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--task-timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Kill tasks after this many seconds, unless they set their own timeout.",
+)
+@click.option(
+    "--no-task-cache",
+    is_flag=True,
+    help="Always run tasks, even if their results are cached.",
+)
+@click.option(
+    "--no-input",
+    is_flag=True,
+    help="Do not ask for ingredients. Ingredients without a prefilled value use their defaults and unused ingredients are skipped.",
+)
+@click.option(
+    "--server",
+    envvar="BOIL_SERVER",
+    help="Let a running boil serve daemon at this address generate the project. Ingredients without a prefilled value use their defaults.",
+)
 @click.option("--dev", is_flag=True)
 @click.argument("recipe")
 @click.argument(
-    "out", default=".", type=click.Path(file_okay=False, dir_okay=True, writable=True)
+    "out",
+    default=".",
+    type=click.Path(file_okay=True, dir_okay=True, writable=True, allow_dash=True),
 )
 @click.pass_context
 def use(
@@ -333,6 +447,21 @@ def use(
     out: t.Union[str, Path],
     hard: bool,
     value: t.List[t.Tuple[str, str]],
+    atomic: bool = False,
+    fsync: str = "none",
+    reproducible: bool = False,
+    plan: bool = False,
+    manifest: bool = False,
+    diff: bool = False,
+    diff_format: str = "unified",
+    diff_untracked: bool = False,
+    archive_format: t.Optional[str] = None,
+    skip_tasks: bool = False,
+    task_jobs: t.Optional[int] = None,
+    task_timeout: t.Optional[float] = None,
+    no_task_cache: bool = False,
+    no_input: bool = False,
+    server: t.Optional[str] = None,
     dev: bool = False,
 ) -> None:
     """
@@ -340,13 +469,78 @@ def use(
 
     If OUT is given and a directory, the recipe is created there.
     Otherwise the cwd is used.
+
+    With --format the project is written as an archive to the file OUT
+    or, if OUT is -, streamed to stdout. No directory is created in this
+    case.
+
+    With --atomic the project is rendered into a staging directory, that
+    replaces OUT after all files were written and all tasks succeeded.
+
+    With --reproducible files are dated to SOURCE_DATE_EPOCH and get
+    fixed permissions. Files created by tasks are not changed.
+
+    With --plan nothing is written and no tasks are run. Instead a JSON
+    manifest of the planned files is printed to stdout.
+
+    With --diff the project is rendered in memory, without running tasks,
+    and compared with the contents of OUT. Only rendered files and files
+    in the manifest of OUT are compared, unless --diff-untracked is given.
     """
     cfg = ctx.obj
+
+    if (plan or diff) and server:
+        console.error("[cmd]--plan[/] and [cmd]--diff[/] can't be used with a server.")
+        ctx.exit(2)
+    if diff and archive_format:
+        console.error("[cmd]--diff[/] can only compare with a directory.")
+        ctx.exit(2)
+
+    to_stdout = out == "-"
+    if to_stdout or plan or diff:
+        # keep stdout clean for the archive, manifest or diff
+        console.out.stderr = True
+    if to_stdout:
+        if not archive_format:
+            console.error("Writing to stdout requires an archive [cmd]--format[/].")
+            ctx.exit(2)
+
+    ## Prepare prefilled values
+    prefilled = cfg["prefilled"] if "prefilled" in cfg else dict()
+    for key, val in value:
+        prefilled[key] = val
+
+    mtime: t.Optional[int] = None
+    if reproducible:
+        try:
+            mtime = source_date_epoch()
+        except ValueError as e:
+            console.error(str(e))
+            ctx.exit(2)
+
+    if server:
+        _use_server(
+            ctx,
+            server,
+            recipe,
+            out,
+            prefilled,
+            archive_format=archive_format,
+            hard=hard,
+            atomic=atomic,
+            fsync=fsync,
+            mtime=mtime,
+            run_tasks=not skip_tasks,
+        )
+        return
+
     logger.debug("Using recipe [recipe]%s[/]..", recipe)
 
     # Check template and read configuration
     repo = Repository(cfg["TPLDIR"])
     _recipe = repo.get_recipe(recipe)
+    # excluded files are skipped while the template directory is read
+    _recipe.excludes.extend(cfg["exclude"] if "exclude" in cfg else list())
 
     try:
         _recipe.load()
@@ -354,59 +548,444 @@ def use(
     except FileNotFoundError:
         console.warn(f"No valid recipe found for name [recipe]{recipe}[/]")
         ctx.exit(1)
+    except ProjectConfigError as e:
+        console.error(f"Invalid recipe [recipe]{recipe}[/]: {e}")
+        ctx.exit(1)
 
-    # Prepare output directory
-    # if out == ".":
-    #     out = Path.cwd()
-    # else:
-    #     out = Path(out)
-    out = Path(out).resolve()
-
-    if out.exists() and len(os.listdir(out)) > 0:
-        if hard:
-            shutil.rmtree(out)
-            out.mkdir(parents=True)
-            console.success(f"Cleared [path]{out}[/]")
-    elif not out.exists():
-        out.mkdir(parents=True)
-        console.success(f"Created [path]{out}[/]")
+    if plan:
+        _plan(_recipe, out, prefilled, archive_format, hard, no_input)
+        return
+    if diff:
+        excludes = cfg["exclude"] if "exclude" in cfg else []
+        ctx.exit(
+            _diff(
+                _recipe,
+                out,
+                prefilled,
+                diff_format,
+                no_input,
+                excludes,
+                untracked=diff_untracked,
+            )
+        )
 
-    ## Prepare prefilled values
-    prefilled = cfg["prefilled"] if "prefilled" in cfg else dict()
-    for key, val in value:
-        prefilled[key] = val
+    if skip_tasks:
+        _recipe.tasks = {hook: [] for hook in _recipe.tasks}
+    elif archive_format and any(_recipe.tasks.values()):
+        console.error(
+            [
+                f"Recipe [recipe]{recipe}[/] has tasks that need a working directory.",
+                "Use [cmd]--skip-tasks[/] to create an archive without running them.",
+            ]
+        )
+        ctx.exit(1)
+
+    # Prepare output
+    archive: t.Optional[t.BinaryIO] = None
+    if archive_format:
+        if to_stdout:
+            archive = sys.stdout.buffer
+            out_name = "<stdout>"
+        else:
+            archive = open(out, "wb")
+            out_name = str(out)
+        sink = ARCHIVE_FORMATS[archive_format](archive, mtime=mtime)
+        out = Path(_recipe.name)
+    else:
+        # if out == ".":
+        #     out = Path.cwd()
+        # else:
+        #     out = Path(out)
+        out = Path(out).resolve()
+        out_name = str(out)
+
+        if out.is_file():
+            console.error(f"[path]{out}[/] is not a directory.")
+            ctx.exit(2)
+        if atomic:
+            # the old contents are replaced after generation
+            # tasks may change the kept files in place, so they are copied
+            sink = AtomicDirectorySink(
+                out,
+                fsync=fsync,
+                clear=hard,
+                mtime=mtime,
+                link=not any(_recipe.tasks.values()),
+            )
+        else:
+            if out.exists() and len(os.listdir(out)) > 0:
+                if hard:
+                    remove_in_background(out)
+                    out.mkdir(parents=True)
+                    console.success(f"Cleared [path]{out}[/]")
+            elif not out.exists():
+                out.mkdir(parents=True)
+                console.success(f"Created [path]{out}[/]")
+            sink = DirectorySink(out, fsync=fsync, mtime=mtime)
+
+    if manifest:
+        sink = ChecksumSink(sink)
 
     ## Prepare project and read user answers
-    project = Boiler(_recipe, out, prefilled)
+    project = Boiler(
+        _recipe,
+        out,
+        prefilled,
+        sink=sink,
+        interactive=not no_input,
+        task_jobs=task_jobs,
+        task_cache=None if no_task_cache else _task_cache(),
+        task_timeout=task_timeout,
+        log_dir=LOG_DIR / f"{_recipe.name}-{time.strftime('%Y%m%d-%H%M%S')}",
+        data_cache=DATA_CACHE_DIR,
+    )
+    try:
+        # the sink is aborted, if anything fails
+        with sink:
+            project.fill()
+            logger.debug("  All ingredients filled  ✓")
+
+            for success, file_in, file_out in project.compile():
+                logger.info("%s -> %s (%s)", file_in, file_out, success)
+                if success:
+                    console.success(f"Created [path]{file_out}[/]")
+                else:
+                    console.warn(f"Skipped [path]{file_out}[/] due to empty content")
+            if isinstance(sink, ChecksumSink):
+                from .checksums import write_manifest
+
+                write_manifest(sink, project)
+                console.success(f"Created [path]{MANIFEST_FILE}[/]")
+    except (TaskFailedError, TaskExecutionError) as e:
+        from rich.markup import escape
+
+        console.error(escape(str(e)))
+        ctx.exit(1)
+    finally:
+        if archive is not None:
+            if to_stdout:
+                archive.flush()
+            else:
+                archive.close()
+        if project.task_results:
+            console.out.print(_task_report(project.task_results))
+
+    console.success(
+        f'Generated project for recipe "[recipe]{_recipe.name}[/]" in [path]{out_name}[/]'
+    )
+
+
+def _plan(
+    recipe: Recipe,
+    out: t.Union[str, Path],
+    prefilled: t.Dict[str, t.Any],
+    archive_format: t.Optional[str],
+    hard: bool,
+    no_input: bool,
+) -> None:
+    """Prints the manifest of `recipe` for `boil use --plan`."""
+    if archive_format:
+        target = Path(recipe.name)
+    else:
+        target = Path(out).resolve()
+    # archives and cleared directories start empty
+    sink = MemorySink() if archive_format or hard else DirectorySink(target)
+
+    project = Boiler(
+        recipe,
+        target,
+        prefilled,
+        sink=sink,
+        interactive=not no_input,
+        data_cache=DATA_CACHE_DIR,
+    )
     project.fill()
     logger.debug("  All ingredients filled  ✓")
+    click.echo(json.dumps(project.manifest(), indent=2))
+
+
+def _diff(
+    recipe: Recipe,
+    out: t.Union[str, Path],
+    prefilled: t.Dict[str, t.Any],
+    diff_format: str,
+    no_input: bool,
+    excludes: t.List[str],
+    untracked: bool = False,
+) -> int:
+    """Prints the differences between `recipe` and `out` for
+    `boil use --diff` and returns the exit code."""
+    from .checksums import read_manifest
+    from .diff import ShadowSink, compare_tree
+
+    target = Path(out).resolve()
+    # tasks need a working directory
+    recipe.tasks = {hook: [] for hook in recipe.tasks}
+    sink = ShadowSink(target)
+
+    project = Boiler(
+        recipe,
+        target,
+        prefilled,
+        sink=sink,
+        interactive=not no_input,
+        data_cache=DATA_CACHE_DIR,
+    )
+    with sink:
+        project.fill()
+        logger.debug("  All ingredients filled  ✓")
+        for success, file_in, file_out in project.compile():
+            logger.info("%s -> %s (%s)", file_in, file_out, success)
+
+    try:
+        recorded = sorted(read_manifest(target)["files"])
+    except ManifestError:
+        recorded = []
+    result = compare_tree(
+        sink.files, target, excludes, recorded=recorded, untracked=untracked
+    )
+    if diff_format == "json":
+        click.echo(json.dumps(result.summary(), indent=2))
+    else:
+        for line in result.unified():
+            click.echo(line, nl=False)
+    return 1 if result.has_changes else 0
+
+
+def _task_cache() -> "TaskCache":
+    from .cache import TaskCache
+
+    return TaskCache()
+
+
+def _task_report(task_results: t.Dict[str, t.List["TaskResult"]]) -> "Table":
+    """Creates a table with the status and resource usage of all tasks."""
+    import rich.box
+    from rich.filesize import decimal
+    from rich.markup import escape
+    from rich.table import Table
+
+    table = Table(
+        title="Tasks",
+        highlight=True,
+        box=rich.box.MINIMAL_DOUBLE_HEAD,
+    )
+    table.add_column("Hook", style="keyword")
+    table.add_column("Task", style="cmd")
+    table.add_column("Status")
+    table.add_column("Wall", justify="right")
+    table.add_column("CPU", justify="right")
+    table.add_column("Peak RSS", justify="right")
+
+    for hook, results in task_results.items():
+        for result in results:
+            task, stats = result.task, result.task.stats
+            if result.cancelled:
+                status = "[warn]cancelled[/]"
+            elif result.cached:
+                status = "[success]cached[/]"
+            elif task.timed_out:
+                status = "[error]timeout[/]"
+            elif result.success:
+                status = "[success]ok[/]"
+            else:
+                status = f"[error]failed ({task.returncode})[/]"
+
+            if stats is None or result.cached:
+                table.add_row(hook, escape(str(task)), status, "-", "-", "-")
+            else:
+                table.add_row(
+                    hook,
+                    escape(str(task)),
+                    status,
+                    f"{stats.wall_time:.2f}s",
+                    f"{stats.cpu_time:.2f}s" if stats.cpu_time is not None else "-",
+                    decimal(stats.max_rss) if stats.max_rss is not None else "-",
+                )
+    return table
+
+
+def _use_server(
+    ctx: click.Context,
+    server: str,
+    recipe: str,
+    out: t.Union[str, Path],
+    prefilled: t.Dict[str, t.Any],
+    archive_format: t.Optional[str],
+    hard: bool,
+    atomic: bool,
+    fsync: str,
+    mtime: t.Optional[int],
+    run_tasks: bool,
+) -> None:
+    """Thin client mode of `boil use` for a running `boil serve` daemon."""
+    from . import client
 
-    ## Set excludes
-    logger.debug("  Setting excludes")
-    patterns = cfg["exclude"] if "exclude" in cfg else list()
-    for pattern in patterns:
-        logger.debug("    Glob pattern %s", pattern)
-        files = _recipe.templates_dir.glob(pattern)
-        for filepath in files:
-            filename = str(filepath.relative_to(_recipe.templates_dir))
-            _recipe.files[filename] = {
-                "exclude": True,
-                **_recipe.files.get(filename, dict()),
-            }
-            logger.debug("    Added [path]%s[/] to excludes", filename)
-
-    for success, file_in, file_out in project.compile():
-        logger.info("%s -> %s (%s)", file_in, file_out, success)
-        if success:
-            console.success(f"Created [path]{file_out}[/]")
+    try:
+        if archive_format:
+            archive = sys.stdout.buffer if out == "-" else open(out, "wb")
+            try:
+                client.generate(
+                    server,
+                    recipe,
+                    prefilled,
+                    archive_format=archive_format,
+                    out=archive,
+                    mtime=mtime,
+                    run_tasks=run_tasks,
+                )
+            finally:
+                if out == "-":
+                    archive.flush()
+                else:
+                    archive.close()
+            out_name = "<stdout>" if out == "-" else str(out)
         else:
-            console.warn(f"Skipped [path]{file_out}[/] due to empty content")
+            out_name = str(Path(out).resolve())
+            result = client.generate(
+                server,
+                recipe,
+                prefilled,
+                target=out_name,
+                hard=hard,
+                atomic=atomic,
+                fsync=fsync,
+                mtime=mtime,
+                run_tasks=run_tasks,
+            )
+            for _file in result["files"]:
+                if _file["created"]:
+                    console.success(f"Created [path]{_file['target']}[/]")
+                else:
+                    console.warn(f"Skipped [path]{_file['source']}[/]")
+    except ServerError as e:
+        console.error(str(e))
+        ctx.exit(1)
 
     console.success(
-        f'Generated project for recipe "[recipe]{_recipe.name}[/]" in [path]{out}[/]'
+        f'Generated project for recipe "[recipe]{recipe}[/]" in [path]{out_name}[/]'
     )
 
 
+@boil.command(short_help="Run a warm generation server")
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help=f"Listen on this unix socket. Defaults to {SERVER_SOCKET}.",
+)
+@click.option(
+    "--port",
+    type=int,
+    help="Listen on this localhost port instead of a unix socket.",
+)
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option(
+    "--root",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Only generate projects in directories inside this directory. Defaults to the home directory.",
+)
+@pass_tpldir
+def serve(
+    TPLDIR: Path,
+    socket_path: t.Optional[Path],
+    port: t.Optional[int],
+    host: str,
+    root: t.Optional[Path],
+) -> None:
+    """
+    Keep the recipe repository loaded and generate projects on request.
+
+    Use the server with boil use --server ADDRESS or by setting
+    BOIL_SERVER. ADDRESS is the socket path or HOST:PORT.
+
+    Clients of a TCP server need a token. It is read from
+    BOIL_SERVER_TOKEN or generated and printed on startup.
+    """
+    import secrets
+
+    from .client import TOKEN_ENV
+    from .server import make_server
+
+    token = os.environ.get(TOKEN_ENV) or None
+    if port is not None:
+        address = f"{host}:{port}"
+        if token is None:
+            token = secrets.token_urlsafe(32)
+            console.info(f"Clients need to set [cmd]{TOKEN_ENV}={token}[/]")
+    else:
+        address = f"unix:{socket_path or SERVER_SOCKET}"
+
+    httpd = make_server(address, TPLDIR, token=token, root=root)
+    console.info(f"Serving recipes from [path]{TPLDIR}[/] on [path]{address}[/]")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+@boil.command(short_help="Verify a generated project against its manifest")
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="Number of files to hash in parallel. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    help="Print the result as JSON.",
+)
+@click.argument(
+    "directory",
+    default=".",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+)
+@click.pass_context
+def verify(
+    ctx: click.Context, directory: Path, jobs: t.Optional[int], as_json: bool
+) -> None:
+    """
+    Check the files in DIRECTORY against the checksums in its manifest.
+
+    The manifest is written by boil use --manifest. Exits with 1, if any
+    file changed or is missing.
+    """
+    from .checksums import verify as verify_checksums
+
+    try:
+        result = verify_checksums(directory, jobs=jobs)
+    except ManifestError as e:
+        console.error(str(e))
+        ctx.exit(2)
+
+    if as_json:
+        click.echo(
+            json.dumps(
+                dict(
+                    recipe=result.manifest.get("recipe"),
+                    verified=result.verified,
+                    changed=result.changed,
+                    missing=result.missing,
+                ),
+                indent=2,
+            )
+        )
+    else:
+        for path in result.changed:
+            console.error(f"[path]{path}[/] changed")
+        for path in result.missing:
+            console.error(f"[path]{path}[/] is missing")
+        if result.ok:
+            console.success(
+                f"Verified {len(result.verified)} files of recipe [recipe]{result.manifest.get('recipe')}[/]"
+            )
+    if not result.ok:
+        ctx.exit(1)
+
+
 @boil.command(short_help="Show information about an installed recipe")
 @click.option(
     "--conf",
@@ -418,9 +997,22 @@ def use(
     is_flag=True,
     help="Print the full recipe tree.",
 )
+@click.option(
+    "--unused",
+    is_flag=True,
+    help="List ingredients and context values the recipe never uses.",
+)
 @click.argument("recipe")
 @click.pass_context
-def info(ctx: click.Context, recipe: str, conf: bool, tree: bool) -> None:
+def info(
+    ctx: click.Context, recipe: str, conf: bool, tree: bool, unused: bool
+) -> None:
+    import rich.box
+    from rich.panel import Panel
+    from rich.syntax import Syntax
+    from rich.table import Table
+    from rich.tree import Tree
+
     cfg = ctx.obj
 
     repo = Repository(cfg["TPLDIR"])
@@ -457,9 +1049,26 @@ def info(ctx: click.Context, recipe: str, conf: bool, tree: bool) -> None:
             _syntax_panel = Panel(_syntax, title=str(_recipe.recipe_file))
             console.out.print(_syntax_panel)
 
+    if unused:
+        _recipe.load()
+        usage = _recipe.usage
+        if usage.dynamic:
+            console.warn(
+                f"Recipe [recipe]{_recipe.name}[/] uses variables dynamically. Can't detect unused ingredients."
+            )
+            return
+        names = [i.name for i in _recipe.ingredients] + sorted(_recipe.context)
+        dead = usage.dead(names)
+        if dead:
+            for name in dead:
+                console.warn(f"Ingredient [ingredient]{name}[/] is never used.")
+        else:
+            console.success(f"All ingredients of [recipe]{_recipe.name}[/] are used.")
+
 
-def _walk_directory(directory: Path, tree: Tree) -> None:
+def _walk_directory(directory: Path, tree: "Tree") -> None:
     """Recursively build a Tree with directory contents."""
+    import rich.text
     from rich.filesize import decimal
     from rich.markup import escape
 
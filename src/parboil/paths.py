@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Path rules for the template files of a recipe.
+
+The `_files` entries of a recipe may be keyed by a relative path or by a
+glob pattern. Together with the exclude patterns from the configuration,
+they are compiled into a single matcher:
+
+- Exact keys are looked up in a dict.
+- All glob keys are combined into one regular expression. The first
+  matching pattern (in the order of the project file) provides the
+  config. An exact entry for the same path updates the glob config.
+- Exclude patterns and glob keys with `"exclude": true` are combined into
+  a second regular expression, that is applied while the template
+  directory is walked. Excluded directories are not descended into.
+
+The template directory is not walked when a recipe is loaded. The recipe
+only holds a [parboil.paths.TemplateDir][], whose files are read while
+the boiler renders them, so the files of large recipes are never all in
+memory at once.
+
+Directories can have a condition, either as the `condition` of their
+`_files` entry or as the contents of a `.parboil-if` file in the
+directory. Conditional directories are not descended into by the walk.
+Instead a [parboil.paths.ConditionalDir][] is returned, which the boiler
+only reads if the condition is true for the filled ingredients.
+
+Globs follow the rules of [pathlib.Path.glob][]: `*` and `?` match within
+one path segment, `**` matches any number of directories and patterns are
+anchored at the template directory. A pattern that matches a directory
+matches all files in it.
+"""
+
+import os
+import re
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from .settings import CONDITION_FILE
+
+GLOB_CHARS = frozenset("*?[")
+
+Config = t.Dict[str, t.Any]
+
+
+def is_glob(pattern: str) -> bool:
+    """Checks if `pattern` contains any glob syntax."""
+    return any(char in GLOB_CHARS for char in pattern)
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translates the glob `pattern` into a regular expression.
+
+    The expression also matches everything below a matched directory.
+    """
+    pattern = pattern.strip("/")
+    if pattern.endswith("/**"):
+        # matches the directory itself and everything below
+        pattern = pattern[:-3]
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2 :]:
+            end = pattern.index("]", i + 2)
+            chars = pattern[i + 1 : end]
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            parts.append("[" + chars.replace("\\", "\\\\") + "]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts) + "(?:/.*)?"
+
+
+def _combine(patterns: t.Sequence[str]) -> t.Optional[t.Pattern[str]]:
+    if not patterns:
+        return None
+    return re.compile(
+        "|".join(
+            f"(?P<g{i}>{glob_to_regex(pattern)})" for i, pattern in enumerate(patterns)
+        ),
+        re.S,
+    )
+
+
+@dataclass(frozen=True)
+class TemplateDir:
+    """A template directory, whose files are read when they are used.
+
+    `path` is relative to the template directory.
+    """
+
+    path: Path
+
+
+@dataclass(frozen=True)
+class ConditionalDir(TemplateDir):
+    """A template directory that is only used if `condition` is true."""
+
+    condition: t.Any
+
+
+class PathRules:
+    """Compiled `_files` entries and exclude patterns.
+
+    Args:
+        files: The `_files` entries of a recipe. Exact keys are looked up
+            in this mapping directly, so entries added later are found.
+            Glob keys are compiled once.
+        excludes: Glob patterns of files to exclude.
+    """
+
+    def __init__(
+        self,
+        files: t.Optional[t.Mapping[str, Config]] = None,
+        excludes: t.Iterable[str] = (),
+    ):
+        self.files = files if files is not None else dict()
+
+        globs = [(key, cfg) for key, cfg in self.files.items() if is_glob(key)]
+        self._glob_configs = [cfg for _, cfg in globs]
+        self._globs = _combine([key for key, _ in globs])
+
+        self.excludes = list(excludes) + [
+            key for key, cfg in globs if cfg.get("exclude", False)
+        ]
+        self._excludes = _combine(self.excludes)
+
+    def config(self, path: str) -> Config:
+        """Returns the config for the file at the relative posix `path`."""
+        exact = self.files.get(path)
+        match = self._globs.fullmatch(path) if self._globs else None
+        if match is None:
+            return exact if exact is not None else dict()
+        config = self._glob_configs[int(match.lastgroup[1:])]  # type: ignore
+        if exact is not None:
+            return {**config, **exact}
+        return config
+
+    def excluded(self, path: str) -> bool:
+        """Checks if the file or directory at `path` is excluded."""
+        if self._excludes is not None and self._excludes.fullmatch(path):
+            return True
+        exact = self.files.get(path)
+        return exact is not None and bool(exact.get("exclude", False))
+
+    def condition(self, root: t.Union[str, Path], path: str) -> t.Any:
+        """Returns the condition of the directory `path` below `root` or
+        `None`, if it has none."""
+        config = self.config(path)
+        if "condition" in config:
+            return config["condition"]
+        try:
+            with open(os.path.join(root, path, CONDITION_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def walk(
+        self, root: t.Union[str, Path], start: t.Union[str, Path] = ""
+    ) -> t.Generator[t.Union[Path, ConditionalDir], None, None]:
+        """Yields the paths of all files below `root` (or the subdirectory
+        `start` of it) that are not excluded, relative to `root`.
+
+        Directories with a condition are yielded as `ConditionalDir`
+        without walking them. Paths are yielded in sorted order, so the
+        order does not depend on the filesystem.
+        """
+        for dirpath, dirs, files in os.walk(os.path.join(root, start)):
+            rel_path = Path(dirpath).relative_to(root)
+            prefix = "".join(f"{part}/" for part in rel_path.parts)
+
+            walk_dirs = []
+            for name in sorted(dirs):
+                path = prefix + name
+                if self.excluded(path):
+                    continue
+                condition = self.condition(root, path)
+                if condition is None:
+                    walk_dirs.append(name)
+                else:
+                    yield ConditionalDir(rel_path / name, condition)
+            dirs[:] = walk_dirs
+
+            for name in sorted(files):
+                if name != CONDITION_FILE and not self.excluded(prefix + name):
+                    yield rel_path / name
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Lazy registries for jinja filters and tests.
+
+Besides the jinja builtins and parboil's own filters, recipes may use the
+filters of [jinja2-ansible-filters](https://pypi.org/project/jinja2-ansible-filters/)
+and filters or tests provided by other packages through the entry point
+groups `parboil.filters` and `parboil.tests`:
+
+```toml
+[tool.poetry.plugins."parboil.filters"]
+"camelcase" = "my_package.filters:camelcase"
+```
+
+Filters are resolved when a template using them is compiled. The module
+providing a filter is imported the first time any template references
+it. Installed entry points are only scanned for names that are not known
+otherwise.
+"""
+
+import logging
+import threading
+import typing as t
+from functools import lru_cache, partial
+
+logger = logging.getLogger(__name__)
+
+FILTERS_GROUP = "parboil.filters"
+TESTS_GROUP = "parboil.tests"
+
+# names of the filters in jinja2_ansible_filters.core_filters
+ANSIBLE_FILTERS = (
+    "ans_groupby",
+    "ans_random",
+    "b64decode",
+    "b64encode",
+    "basename",
+    "bool",
+    "checksum",
+    "combine",
+    "comment",
+    "dirname",
+    "expanduser",
+    "expandvars",
+    "extract",
+    "fileglob",
+    "flatten",
+    "from_json",
+    "from_yaml",
+    "from_yaml_all",
+    "hash",
+    "mandatory",
+    "md5",
+    "quote",
+    "random_mac",
+    "realpath",
+    "regex_escape",
+    "regex_findall",
+    "regex_replace",
+    "regex_search",
+    "relpath",
+    "sha1",
+    "shuffle",
+    "splitext",
+    "strftime",
+    "subelements",
+    "ternary",
+    "to_datetime",
+    "to_json",
+    "to_nice_json",
+    "to_nice_yaml",
+    "to_uuid",
+    "to_yaml",
+    "type_debug",
+    "win_basename",
+    "win_dirname",
+    "win_splitdrive",
+)
+
+
+@lru_cache(maxsize=None)
+def ansible_filters() -> t.Dict[str, t.Callable[..., t.Any]]:
+    """Imports and returns all filters of jinja2_ansible_filters."""
+    from jinja2_ansible_filters.core_filters import FilterModule
+
+    return FilterModule().filters()
+
+
+def _ansible_filter(name: str) -> t.Callable[..., t.Any]:
+    return ansible_filters()[name]
+
+
+def entry_points(group: str) -> t.List[t.Any]:
+    """Returns the installed entry points in `group`."""
+    from importlib.metadata import entry_points as _entry_points
+
+    eps = _entry_points()
+    if hasattr(eps, "select"):
+        return list(eps.select(group=group))
+    # Python < 3.10 returns a dict of groups
+    return list(eps.get(group, []))  # type: ignore
+
+
+class LazyRegistry(dict):
+    """A dict of filters or tests that loads entries on first lookup.
+
+    `loaders` maps names to functions that import and return the filter.
+    Unknown names are looked up in the entry point `group`. Names that are
+    already registered take precedence over both.
+
+    Only entries that were loaded are part of iterations over the registry.
+    """
+
+    def __init__(
+        self,
+        initial: t.Mapping[str, t.Any],
+        loaders: t.Optional[t.Mapping[str, t.Callable[[], t.Any]]] = None,
+        group: t.Optional[str] = None,
+    ):
+        super().__init__(initial)
+        self._loaders = {
+            name: loader
+            for name, loader in (loaders or dict()).items()
+            if not dict.__contains__(self, name)
+        }
+        self._group = group
+        self._lock = threading.RLock()
+
+    def _scan(self) -> None:
+        if self._group is None:
+            return
+        for ep in entry_points(self._group):
+            if dict.__contains__(self, ep.name) or ep.name in self._loaders:
+                logger.warning(
+                    "Ignoring %s entry point %s, the name is already in use",
+                    self._group,
+                    ep.name,
+                )
+            else:
+                self._loaders[ep.name] = ep.load
+        self._group = None
+
+    def _load(self, name: t.Any) -> bool:
+        if not isinstance(name, str):
+            return False
+        with self._lock:
+            if dict.__contains__(self, name):
+                return True
+            if name not in self._loaders:
+                self._scan()
+            loader = self._loaders.pop(name, None)
+            if loader is None:
+                return False
+            logger.debug("Loading %s", name)
+            dict.__setitem__(self, name, loader())
+            return True
+
+    def __missing__(self, name: str) -> t.Any:
+        if self._load(name):
+            return dict.__getitem__(self, name)
+        raise KeyError(name)
+
+    def __contains__(self, name: object) -> bool:
+        return dict.__contains__(self, name) or self._load(name)
+
+    def get(self, name: str, default: t.Any = None) -> t.Any:
+        if name in self:
+            return dict.__getitem__(self, name)
+        return default
+
+    def names(self) -> t.Set[str]:
+        """Returns the names of all loaded and loadable entries."""
+        with self._lock:
+            self._scan()
+            return set(self) | set(self._loaders)
+
+
+def create_filters(initial: t.Mapping[str, t.Any]) -> LazyRegistry:
+    """Creates a registry with the filters in `initial`, the ansible filters
+    and the filters from the `parboil.filters` entry points."""
+    loaders = {name: partial(_ansible_filter, name) for name in ANSIBLE_FILTERS}
+    return LazyRegistry(initial, loaders, FILTERS_GROUP)
+
+
+def create_tests(initial: t.Mapping[str, t.Any]) -> LazyRegistry:
+    """Creates a registry with the tests in `initial` and the tests from the
+    `parboil.tests` entry points."""
+    return LazyRegistry(initial, group=TESTS_GROUP)
@@ -7,47 +7,56 @@ templates into a specific target directory).
 """
 
 
+import copy
+import itertools
 import json
 import logging
 import os
-import re
 import shutil
-import subprocess
-import sys
-import tempfile
 import time
 import typing as t
 from collections import ChainMap
-from collections.abc import Mapping, MutableMapping, Sequence
-from contextlib import contextmanager
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from functools import cached_property
 from pathlib import Path
 
-import click
-import jsonc
-from rich import inspect
-
 import parboil.console as console
 
 from .errors import (
+    BoilerError,
+    PathCollisionError,
     ProjectError,
     ProjectExistsError,
     ProjectFileNotFoundError,
     RecipeNotInstalledError,
     TaskExecutionError,
     TaskFailedError,
+    TaskTimeoutError,
 )
-from .helpers import eval_bool, load_files
-from .ingredients import Ingredient, get_ingredient
-from .renderer import ParboilRenderer
-from .settings import META_FILE, PRJ_FILE
-from .tasks import Task
+from .helpers import load_files
+from .paths import ConditionalDir, PathRules, TemplateDir
+from .settings import DATA_PREFIX, META_FILE, PRJ_FILE
+from .sinks import DirectorySink, Sink
+
+# jinja, the renderer and the task runner are imported where they are
+# needed, so that commands like `boil list` start quickly
+if t.TYPE_CHECKING:
+    from jinja2 import Environment
+
+    from .analysis import Usage
+    from .cache import TaskCache
+    from .ingredients import Ingredient
+    from .renderer import ParboilRenderer, TemplateCache
+    from .tasks import Task, TaskResult, TaskRunner
 
 logger = logging.getLogger(__name__)
 
 RESERVED_KEYS = ("_tasks", "_files", "_context", "_settings")
 
+PLAN_CHUNK = 512
+"""Number of files whose output paths are planned and rendered together."""
+
 
 @dataclass(init=False)
 class Recipe:
@@ -71,16 +80,21 @@ class Recipe:
     meta_file: Path
     templates_dir: Path
     includes_dir: Path
+    data_dir: Path
 
     meta: t.Dict[str, t.Any] = field(default_factory=dict)
+    settings: t.Dict[str, t.Any] = field(default_factory=dict)
     files: t.Dict[str, t.Dict[str, t.Any]] = field(default_factory=dict)
-    templates: t.List[t.Union[str, Path, "Recipe"]] = field(default_factory=list)
+    excludes: t.List[str] = field(default_factory=list)
+    templates: t.List[t.Union[str, Path, TemplateDir, "Recipe"]] = field(
+        default_factory=list
+    )
     includes: t.List[Path] = field(default_factory=list)
 
-    ingredients: t.List[Ingredient] = field(default_factory=list)
+    ingredients: t.List["Ingredient"] = field(default_factory=list)
     context: t.ChainMap[str, t.Any] = field(default_factory=ChainMap)
 
-    tasks: t.Dict[str, t.List[Task]] = field(default_factory=dict)
+    tasks: t.Dict[str, t.List["Task"]] = field(default_factory=dict)
 
     def __init__(
         self,
@@ -100,9 +114,12 @@ class Recipe:
         self.meta_file = self.root / META_FILE
         self.templates_dir = self.root / "template"
         self.includes_dir = self.root / "includes"
+        self.data_dir = self.root / "data"
 
         self.meta = dict()
+        self.settings = dict()
         self.files = dict()
+        self.excludes = list()
         self.templates = list()
         self.includes = list()
         self.ingredients = list()
@@ -130,9 +147,7 @@ class Recipe:
 
     def load(self) -> None:
         """Loads the project file and some metadata."""
-        # Load files form template folder
-        self.templates.extend(load_files(self.templates_dir))
-        self.includes.extend(load_files(self.includes_dir))
+        import jsonc
 
         # Load config
         config: t.Dict[str, t.Any] = dict()
@@ -144,12 +159,19 @@ class Recipe:
         except json.JSONDecodeError as e:
             raise ProjectError("Malformed project file.") from e
 
+        self.settings = {**config.get("_settings", {})}
         if "_files" in config:
             for file, data in config["_files"].items():
                 if isinstance(data, str):
                     self.files[file] = dict(filename=data)
                 else:
                     self.files[file] = data
+        # compile the rules with the loaded entries
+        self.__dict__.pop("rules", None)
+
+        # the template folder is read lazily, when files are planned
+        self.templates.append(TemplateDir(Path("")))
+        self.includes.extend(load_files(self.includes_dir))
 
         # Parse config
         self._load_ingredients(config)
@@ -158,7 +180,10 @@ class Recipe:
         if "_context" in config:
             self.context.maps.append({**config["_context"]})
 
-        # Load metafile
+        self.load_meta()
+
+    def load_meta(self) -> None:
+        """Loads the meta file of an installed recipe."""
         if self.meta_file.is_file():
             with open(self.meta_file) as f:
                 self.meta = {**self.meta, **json.load(f)}
@@ -167,13 +192,33 @@ class Recipe:
         """
         Parse `fields` key from `config` into `Ingredient` objects
         and stores them in the `ingredients` attribute.
+
+        All template strings of the ingredients are compiled into the
+        `template_cache`.
         """
+        from .ingredients import get_ingredient
+
         for k, v in config.items():
             if k not in RESERVED_KEYS:
                 self.ingredients.append(get_ingredient(k, v))
 
+        for ingredient in self.ingredients:
+            templates = ingredient.__templates__()
+            try:
+                # send the sources back unchanged, just compile them
+                source = next(templates)
+                while True:
+                    self.template_cache.template(source)
+                    source = templates.send(source)
+            except StopIteration:
+                pass
+            if isinstance(ingredient.condition, str):
+                self.template_cache.condition(ingredient.condition)
+
     def _load_tasks(self, config: t.Dict[str, t.Any]) -> None:
         """Parse ``tasks`` key from ``config`` into :class:`Task` objects and stores them in the ``tasks`` attribute."""
+        from .tasks import Task, task_graph
+
         if "_tasks" in config:
             for hook in self.tasks.keys():
                 if hook in config["_tasks"]:
@@ -182,6 +227,80 @@ class Recipe:
                             self.tasks[hook].append(Task(task_def))
                         elif isinstance(task_def, dict):
                             self.tasks[hook].append(Task(**task_def))
+                    # validate dependencies early
+                    task_graph(self.tasks[hook])
+
+    @cached_property
+    def rules(self) -> PathRules:
+        """The compiled `_files` entries and exclude patterns.
+
+        See [parboil.paths.PathRules][].
+        """
+        return PathRules(self.files, self.excludes)
+
+    def walk_templates(self) -> t.Generator[t.Any, None, None]:
+        """Yields the entries of `templates` with the files of template
+        directories read one by one. Conditional directories are yielded
+        without reading them."""
+        for _file in self.templates:
+            if type(_file) is TemplateDir:
+                yield from self.rules.walk(self.templates_dir, _file.path)
+            else:
+                yield _file
+
+    def file_config(self, name: t.Union[str, Path]) -> t.Dict[str, t.Any]:
+        """Returns the `_files` config for the template file `name`."""
+        return self.rules.config(Path(name).as_posix())
+
+    @cached_property
+    def environment(self) -> "Environment":
+        """The jinja environment for this recipe.
+
+        The environment is created on first access and shared by all
+        copies of this recipe.
+        """
+        from .renderer import create_environment
+
+        return create_environment(self)
+
+    @cached_property
+    def template_cache(self) -> "TemplateCache":
+        """Compiled string templates for this recipe, shared by all copies."""
+        from .renderer import TemplateCache
+
+        return TemplateCache(self.environment)
+
+    @cached_property
+    def usage(self) -> "Usage":
+        """The variables used by this recipe, shared by all copies.
+
+        See [parboil.analysis.analyze][].
+        """
+        from .analysis import analyze
+
+        return analyze(self)
+
+    def copy(self) -> "Recipe":
+        """Creates a copy of this recipe to use for a new generation.
+
+        Loaded ingredients, tasks, files and context are copied, since they
+        are modified while a project is generated. The jinja environment is
+        shared with the copy.
+        """
+        recipe = Recipe(self.name, self.repository)
+        recipe.meta = copy.deepcopy(self.meta)
+        recipe.settings = copy.deepcopy(self.settings)
+        recipe.files = copy.deepcopy(self.files)
+        recipe.excludes = list(self.excludes)
+        recipe.templates = list(self.templates)
+        recipe.includes = list(self.includes)
+        recipe.ingredients = copy.deepcopy(self.ingredients)
+        recipe.context = copy.deepcopy(self.context)
+        recipe.tasks = copy.deepcopy(self.tasks)
+        for shared in ("environment", "template_cache", "usage"):
+            if shared in self.__dict__:
+                recipe.__dict__[shared] = self.__dict__[shared]
+        return recipe
 
     def save(self) -> None:
         """Saves the current meta file to disk."""
@@ -355,6 +474,8 @@ class Repository(Mapping[str, Recipe]):
 
             # do git clone
             # TODO: Does this work on windows?
+            import subprocess
+
             git = subprocess.Popen(["git", "clone", url, str(project.root)])
             git.wait(30)
 
@@ -369,6 +490,9 @@ class Repository(Mapping[str, Recipe]):
             self.load()
             return [project]
         else:
+            import subprocess
+            import tempfile
+
             projects = list()  # return list of installed projects
 
             # do git clone into temp folder
@@ -419,6 +543,8 @@ class Repository(Mapping[str, Recipe]):
             )
 
         if recipe.meta["source_type"] == "github":
+            import subprocess
+
             git = subprocess.Popen(["git", "pull", "--rebase"], cwd=recipe.root)
             git.wait(30)
         elif recipe.meta["source_type"] == "local":
@@ -458,6 +584,38 @@ class Repository(Mapping[str, Recipe]):
         return diff
 
 
+@dataclass
+class PlannedFile:
+    """A template file of a recipe and the path it is written to.
+
+    Attributes:
+        template: The name of the template for the jinja loader.
+        source: The path of the template relative to its directory.
+        target: The rendered output path.
+        config: The `_files` config of the template.
+        variables: The `BOIL` variables for the template.
+        skip: Why the file is skipped (`"excluded"` or `"condition"`) or
+            `None`, if it is rendered.
+        bindings: Variables bound for this file only, like the loop
+            variable of a `foreach` file.
+    """
+
+    template: t.Union[str, Path]
+    source: Path
+    target: str
+    config: t.Dict[str, t.Any]
+    variables: t.Dict[str, t.Any]
+    skip: t.Optional[str] = None
+    bindings: t.Dict[str, t.Any] = field(default_factory=dict)
+
+    def boil_vars(self) -> t.ChainMap[str, t.Any]:
+        """Returns the `BOIL` variables for rendering the contents."""
+        return ChainMap(
+            dict(FILENAME=Path(self.target).name, FILEPATH=self.target),
+            self.variables,
+        )
+
+
 @dataclass
 class Boiler:
     """A `Boiler` renders a [Recipe][parboil.recipes.Recipe] into a `target_dir`.
@@ -478,6 +636,30 @@ class Boiler:
             A dicttionary with already defined variable values.
         context:
             A dictionary with context variables to use for template rendering.
+        sink:
+            The [parboil.sinks.Sink][] rendered files are written to. Defaults
+            to a [parboil.sinks.DirectorySink][] for `target_dir`.
+        interactive:
+            If `False`, the user is never prompted. Ingredients without a
+            prefilled value use their default value instead.
+        task_jobs:
+            Maximum number of tasks to run concurrently. Defaults to the
+            number of CPUs.
+        task_cache:
+            The [parboil.cache.TaskCache][] for tasks with a `cache`
+            option. If `None`, cached tasks always run.
+        task_timeout:
+            Seconds after which tasks without a `timeout` of their own
+            are killed.
+        log_dir:
+            Directory for the output of quiet tasks. If `None`, the output
+            is discarded.
+        data_cache:
+            Directory to cache parsed data files of the context in (see
+            [parboil.data][]). If `None`, they are only cached in memory.
+        task_results:
+            The [parboil.tasks.TaskResult][]s for each hook after the
+            tasks finished.
     """
 
     recipe: Recipe
@@ -486,33 +668,97 @@ class Boiler:
     prefilled: t.Dict[str, t.Any]
     context: t.ChainMap[str, t.Any] = field(default_factory=ChainMap)
 
+    sink: t.Optional[Sink] = None
+    interactive: bool = True
+    task_jobs: t.Optional[int] = None
+    task_cache: t.Optional["TaskCache"] = None
+    task_timeout: t.Optional[float] = None
+    log_dir: t.Optional[Path] = None
+    data_cache: t.Optional[Path] = None
+
+    task_results: t.Dict[str, t.List["TaskResult"]] = field(
+        init=False, default_factory=dict
+    )
+
+    def __post_init__(self) -> None:
+        if self.sink is None:
+            self.sink = DirectorySink(self.target_dir)
+
     def fill(self) -> None:
         """
         Get field values either from the prefilled values or read user input.
-        """
-        for _field in self.recipe.ingredients:
-            self.renderer.render_obj(_field, INGREDIENT=_field)
 
-            if not eval_bool(_field.condition or True):
+        If the boiler is not interactive, only ingredients and context
+        values that are used by the recipe are evaluated (see
+        [parboil.analysis.analyze][]). They are evaluated after the
+        ingredients they use, even if these are defined later.
+
+        Raises:
+            ProjectConfigError: If ingredients of a non-interactive boiler
+                depend on each other.
+        """
+        needed: t.Optional[t.Set[str]] = None
+        ingredients = self.recipe.ingredients
+        if not self.interactive and not self.recipe.usage.dynamic:
+            from .analysis import value_dependencies
+
+            # prefilled values are templates and may use other variables
+            prefilled = value_dependencies(self.recipe, self.prefilled)
+            if prefilled is not None:
+                usage = self.recipe.usage
+                needed = usage.needed(prefilled)
+                order = usage.order(
+                    [i.name for i in ingredients if i.name in needed], prefilled
+                )
+                by_name = {i.name: i for i in ingredients}
+                ingredients = [
+                    *(by_name[name] for name in order),
+                    *(i for i in ingredients if i.name not in needed),
+                ]
+
+        for _field in ingredients:
+            if needed is not None and _field.name not in needed:
+                console.info(
+                    f'Skipped field "[ingredient]{_field.name}[/]" since it is never used'
+                )
+                continue
+            if not self.renderer.eval_condition(_field.condition, INGREDIENT=_field):
                 console.info(
                     f'Skipped field "[ingredient]{_field.name}[/]" due to failed condition'
                 )
                 continue
-            elif _field.name in self.prefilled:
+
+            if _field.name in self.prefilled:
                 self.context[_field.name] = _field.value = self.renderer.render_string(
                     self.prefilled[_field.name], INGREDIENT=_field
                 )
                 console.info(f'Used prefilled value for "[ingredient]{_field.name}[/]"')
             else:
+                self.renderer.render_obj(_field, INGREDIENT=_field)
                 self.context[_field.name] = _field.prompt(self)
 
+        data: t.Dict[str, Path] = dict()
         for key, descr in self.recipe.context.items():
-            self.context[key] = self.renderer.render_string(descr)
+            if needed is not None and key not in needed:
+                continue
+            if isinstance(descr, str) and descr.startswith(DATA_PREFIX):
+                path = self.renderer.render_string(descr[len(DATA_PREFIX) :])
+                data[key] = self.recipe.data_dir / path
+            elif isinstance(descr, str):
+                self.context[key] = self.renderer.render_string(descr)
+            else:
+                # lists and other data are used as they are
+                self.context[key] = descr
+        if data:
+            from .data import DataContext
+
+            # data files are loaded when a template uses them
+            self.context.maps.append(DataContext(data, self.data_cache))
 
     def compile(self) -> t.Generator[t.Tuple[bool, Path, t.Optional[Path]], None, None]:
         """Compile the recipe into the target directory.
 
-        Attempts to compile every file in `self.templates` with [jinja2](#) and to save it to its final location in the target directory.
+        Attempts to compile every file in `self.templates` with [jinja2](#) and to save it to its final location in `self.sink`.
 
         Yields a tuple with three values for each template file:
 
@@ -524,110 +770,536 @@ class Boiler:
                 1. `True`, if an output file was generated, `False` otherwise,
                 2. the original file.
                 3. The output file after compilation or `None`, if no file was rendered.
+
+        Raises:
+            BoilerError: If the recipe has tasks, but `self.sink` has no
+                working directory.
+            PathCollisionError: If two templates with content are written
+                to the same path. For collisions in the first
+                [PLAN_CHUNK][parboil.recipes.PLAN_CHUNK] files nothing is
+                written, otherwise the error is raised before the second
+                template is written.
         """
+        if self.sink.root is None and any(self.recipe.tasks.values()):
+            raise BoilerError(
+                f"Recipe {self.recipe.name} has tasks, but the output has no working directory."
+            )
+
+        ## Plan the first chunk of files and check it for colliding output
+        ## paths, before anything is written
+        targets: t.Dict[str, t.Tuple[Path, t.Optional[Path]]] = dict()
+        chunks = self._checked_chunks(targets)
+        first = next(chunks, None)
+        if first is not None:
+            chunks = itertools.chain([first], chunks)
+
         ## Create target directory
-        self.target_dir.mkdir(parents=True, exist_ok=True)
+        if self.sink.root:
+            self.sink.root.mkdir(parents=True, exist_ok=True)
 
         ## Execute pre-run tasks
-        self.execute_tasks("pre-run")
+        pre_run = self.start_tasks("pre-run")
+        if pre_run is not None:
+            # rendering only waits for pre-run tasks, that are not concurrent
+            blocking = [
+                i for i, task in enumerate(pre_run.tasks) if task.stage != "concurrent"
+            ]
+            pre_run.wait(blocking)
+            if not all(pre_run.results[i].success for i in blocking):
+                pre_run.cancel()
+                self.finish_tasks("pre-run", pre_run)
+
+        ## Start post-run tasks, that may run while rendering
+        post_run = self.start_tasks("post-run", pipelined=True)
+        try:
+            yield from self._compile_files(chunks, targets, post_run)
+            # post-run tasks expect all files on disk
+            self.sink.flush()
+        except BaseException:
+            for runner in (pre_run, post_run):
+                if runner is not None:
+                    # don't wait for running tasks to finish
+                    runner.cancel(kill=True)
+                    runner.join()
+            raise
+
+        self.finish_tasks("pre-run", pre_run)
+        self.finish_tasks("post-run", post_run)
+
+    def _expand_templates(
+        self, templates: t.Iterable[t.Any]
+    ) -> t.Generator[t.Union[str, Path, "Recipe"], None, None]:
+        """Yields `templates` with the files of template directories and
+        of conditional directories, whose condition is true."""
+        for _file in templates:
+            if isinstance(_file, ConditionalDir) and not self.renderer.eval_condition(
+                _file.condition
+            ):
+                logger.debug(
+                    "  Skipped directory [path]%s[/] since its condition is false",
+                    _file.path,
+                )
+            elif isinstance(_file, TemplateDir):
+                yield from self._expand_templates(
+                    self.recipe.rules.walk(self.recipe.templates_dir, _file.path)
+                )
+            else:
+                yield _file
 
-        # TODO Error handling
-        for _file in self.recipe.templates:
+    def _planned_files(self) -> t.Generator[t.Union[PlannedFile, "Recipe"], None, None]:
+        """Yields the planned files with their unrendered output paths.
+
+        Files with a `foreach` option are planned once for each item.
+        """
+        for _file in self._expand_templates(self.recipe.templates):
             if isinstance(_file, Recipe):
-                # TODO refactor subproject inclusion (field and compilation to tighly coupled)
-                subproject = Boiler(_file, self.target_dir, self.prefilled)
-                yield from subproject.compile()
-            else:
-                logger.debug("  Working on file [path]%s[/]", _file)
-                _file = Path(_file)
-                file_in = Path(str(_file).removeprefix("includes:"))
-                file_out = str(file_in)
-                file_cfg: t.Dict[str, t.Any] = self.recipe.files.get(
-                    str(file_in), dict()
+                yield _file
+                continue
+
+            file_in = Path(str(_file).removeprefix("includes:"))
+            file_cfg = self.recipe.file_config(file_in)
+            rel_path = file_in.parent
+            variables = dict(
+                RELDIR="" if rel_path.name == "" else str(rel_path),
+                ABSDIR=str(self.target_dir / rel_path),
+                OUTDIR=str(self.target_dir),
+                OUTNAME=str(self.target_dir.name),
+            )
+            target = file_cfg.get("filename", str(file_in))
+            condition = file_cfg.get("condition")
+
+            if file_cfg.get("exclude", False):
+                yield PlannedFile(
+                    _file, file_in, target, file_cfg, variables, skip="excluded"
                 )
-                file_out = file_cfg.get("filename", file_out)
+            elif "foreach" in file_cfg:
+                name = file_cfg.get("as", "item")
+                items = self.renderer.eval_items(file_cfg["foreach"])
+                for index, item in enumerate(items):
+                    bindings = {name: item}
+                    planned = PlannedFile(
+                        _file,
+                        file_in,
+                        target,
+                        file_cfg,
+                        dict(variables, INDEX=index),
+                        bindings=bindings,
+                    )
+                    if not self.renderer.eval_condition(condition, **bindings):
+                        planned.skip = "condition"
+                    yield planned
+            else:
+                planned = PlannedFile(_file, file_in, target, file_cfg, variables)
+                if not self.renderer.eval_condition(condition):
+                    planned.skip = "condition"
+                yield planned
+
+    def plan_files(self) -> t.Generator[t.Union[PlannedFile, "Recipe"], None, None]:
+        """Plans which template files are written to which path.
+
+        Template directories are read while the plan is consumed. Files
+        are planned in chunks of [PLAN_CHUNK][parboil.recipes.PLAN_CHUNK]:
+        conditions are evaluated and the output paths of all files in a
+        chunk are rendered, before the contents of any file in the chunk
+        are rendered. Subrecipes are yielded as is.
+        """
+        for chunk in self._plan_chunks():
+            yield from chunk
 
-                rel_path = file_in.parent
-                abs_path = self.target_dir / rel_path
+    def _plan_chunks(
+        self,
+    ) -> t.Generator[t.List[t.Union[PlannedFile, "Recipe"]], None, None]:
+        chunk: t.List[t.Union[PlannedFile, "Recipe"]] = list()
+        for planned in self._planned_files():
+            chunk.append(planned)
+            if len(chunk) >= PLAN_CHUNK:
+                self._render_targets(chunk)
+                yield chunk
+                chunk = list()
+        if chunk:
+            self._render_targets(chunk)
+            yield chunk
+
+    def _render_targets(self, chunk: t.List[t.Union[PlannedFile, "Recipe"]]) -> None:
+        from jinja2 import TemplateError
+
+        from .renderer import has_template_syntax
+
+        env = self.recipe.environment
+        for planned in chunk:
+            if not isinstance(planned, PlannedFile) or planned.skip is not None:
+                continue
+            # literal paths are never rendered, filename patterns are
+            # compiled once per recipe (see Recipe.template_cache)
+            if not has_template_syntax(env, planned.target):
+                continue
+            try:
+                planned.target = self.renderer.render_string(
+                    planned.target, BOIL=planned.variables, **planned.bindings
+                )
+            except TemplateError as e:
+                raise BoilerError(
+                    f"Could not render the output path of {planned.source}: {e}"
+                ) from e
+
+    def manifest(self) -> t.Dict[str, t.Any]:
+        """Plans the generation of the recipe without writing any files or
+        running tasks.
+
+        For each template file the manifest lists the `action` (`create`,
+        `overwrite` or `skip`), the `reason` for skipped files
+        (`excluded`, `condition`, `exists`, `empty` or `keep`) and the
+        `size` of the output. Templates are only rendered, if their
+        emptiness decides if the file is created. For all other files the
+        size of the template is given as an `estimated` size.
+
+        Returns:
+            A JSON serializable dict with the `files`, a `summary` of the
+            actions, the number of `tasks` for each hook and the targets
+            with `collisions` (see [parboil.errors.PathCollisionError][]).
+        """
+        files = self._manifest_files(set())
+
+        summary = {"create": 0, "overwrite": 0, "skip": 0}
+        sources: t.Dict[str, t.List[str]] = dict()
+        for entry in files:
+            summary[entry["action"]] += 1
+            if entry["action"] != "skip":
+                sources.setdefault(entry["target"], []).append(entry["source"])
+        return dict(
+            recipe=self.recipe.name,
+            target=str(self.target_dir),
+            files=files,
+            summary=summary,
+            tasks={hook: len(tasks) for hook, tasks in self.recipe.tasks.items()},
+            collisions={
+                target: paths for target, paths in sources.items() if len(paths) > 1
+            },
+        )
 
-                # Set some dynamic values
-                boil_vars = dict(
-                    RELDIR="" if rel_path.name == "" else str(rel_path),
-                    ABSDIR=str(abs_path),
-                    OUTDIR=str(self.target_dir),
-                    OUTNAME=str(self.target_dir.name),
+    def _manifest_files(self, created: t.Set[str]) -> t.List[t.Dict[str, t.Any]]:
+        from .renderer import has_static_content
+
+        entries: t.List[t.Dict[str, t.Any]] = list()
+        for planned in self.plan_files():
+            if isinstance(planned, Recipe):
+                subproject = Boiler(
+                    planned,
+                    self.target_dir,
+                    self.prefilled,
+                    sink=self.sink,
+                    interactive=self.interactive,
                 )
-                path_render = self.renderer.render_string(file_out, BOIL=boil_vars)
-                logger.debug("    Filename rendererd to [path]%s[/] ✓", path_render)
+                entries.extend(subproject._manifest_files(created))
+                continue
 
-                # Is file excluded?
-                if file_cfg.get("exclude", False):
-                    logger.debug(
-                        "    [path]%s[/] is excluded from rendering", path_render
-                    )
-                    yield (False, file_in, None)
-                    continue
+            entry: t.Dict[str, t.Any] = dict(
+                source=str(planned.source),
+                target=None,
+                action="skip",
+                reason=planned.skip,
+                size=None,
+                estimated=False,
+                rendered=False,
+            )
+            entries.append(entry)
+            if planned.skip is not None:
+                continue
 
-                # Should existsing file be overwritten?
-                if Path(path_render).exists() and not file_cfg.get("overwrite", True):
-                    logger.debug(
-                        "    [path]%s[/] exists and will not be overwritten",
-                        path_render,
+            target, file_cfg = planned.target, planned.config
+            entry["target"] = target
+            exists = target in created or self.sink.exists(target)
+            if exists and not file_cfg.get("overwrite", True):
+                entry["reason"] = "exists"
+                continue
+
+            keep = file_cfg.get("keep")
+            if not file_cfg.get("render", True):
+                path = self.recipe.templates_dir.joinpath(planned.template)
+                if keep is None:
+                    content = path.read_bytes()
+                    entry["size"], empty = len(content), not content.strip()
+                else:
+                    entry["size"], empty = path.stat().st_size, False
+            else:
+                source = self.renderer.template_source(planned.template)
+                if keep is not None or has_static_content(
+                    self.recipe.environment, source
+                ):
+                    entry["size"], empty = len(source.encode("utf-8")), False
+                    entry["estimated"] = True
+                else:
+                    content = self.renderer.render_file(
+                        planned.template,
+                        BOIL=planned.boil_vars(),
+                        **planned.bindings,
                     )
-                    yield (False, file_in, None)
+                    entry["rendered"] = True
+                    entry["size"] = len(content.encode("utf-8"))
+                    empty = not content.strip()
+
+            if keep is False:
+                entry["reason"] = "keep"
+            elif keep is None and empty:
+                entry["reason"] = "empty"
+            else:
+                entry["action"] = "overwrite" if exists else "create"
+                entry["reason"] = None
+                created.add(target)
+        return entries
+
+    def _checked_chunks(
+        self, targets: t.Dict[str, t.Tuple[Path, t.Optional[Path]]]
+    ) -> t.Generator[
+        t.Tuple[t.List[t.Union[PlannedFile, "Recipe"]], t.Dict[int, str]], None, None
+    ]:
+        """Plans the files in chunks and checks each chunk for output paths,
+        that are shared with another template, before it is written.
+
+        `targets` maps each output path to the first template written to
+        it and the template, that has content, if any. It is updated by
+        [parboil.recipes.Boiler._compile_files][] for written files. It is
+        the only state of a compile, that grows with the number of files.
+
+        Yields:
+            The planned files of each chunk and the rendered contents of
+            the files with shared paths by `id`.
+
+        Raises:
+            PathCollisionError: If two templates with content are written
+                to the same path.
+        """
+        for chunk in self._plan_chunks():
+            files = [p for p in chunk if isinstance(p, PlannedFile) and p.skip is None]
+            counts: t.Dict[str, int] = dict()
+            for planned in files:
+                counts[planned.target] = counts.get(planned.target, 0) + 1
+
+            contents: t.Dict[int, str] = dict()
+            for planned in files:
+                path = planned.target
+                if counts[path] == 1 and path not in targets:
+                    targets[path] = (planned.source, None)
                     continue
+                # templates with shared paths are rendered before any file
+                # of the chunk is written
+                first, filled = targets.get(path, (planned.source, None))
+                if planned.config.get("overwrite", True) or not self.sink.exists(
+                    path
+                ):
+                    content = contents[id(planned)] = self._render_content(planned)
+                    if self._has_content(planned, content):
+                        if filled is not None:
+                            raise PathCollisionError(path, [filled, planned.source])
+                        filled = planned.source
+                targets[path] = (first, filled)
+            yield chunk, contents
+
+    def _render_content(self, planned: PlannedFile) -> str:
+        if planned.config.get("render", True):
+            return self.renderer.render_file(
+                planned.template, BOIL=planned.boil_vars(), **planned.bindings
+            )
+        return self.recipe.templates_dir.joinpath(planned.template).read_text()
 
-                boil_vars["FILENAME"] = Path(path_render).name
-                boil_vars["FILEPATH"] = path_render
+    def _has_content(self, planned: PlannedFile, content: str) -> bool:
+        # empty files are only created with `keep`
+        return bool(planned.config.get("keep", bool(content.strip())))
 
-                if file_cfg.get("render", True):
-                    # Render template
-                    tpl_render = self.renderer.render_file(_file, BOIL=boil_vars)
-                else:
-                    tpl_render = self.recipe.templates_dir.joinpath(_file).read_text()
+    def _compile_files(
+        self,
+        chunks: t.Iterable[
+            t.Tuple[t.List[t.Union[PlannedFile, "Recipe"]], t.Dict[int, str]]
+        ],
+        targets: t.Dict[str, t.Tuple[Path, t.Optional[Path]]],
+        post_run: t.Optional["TaskRunner"],
+    ) -> t.Generator[t.Tuple[bool, Path, t.Optional[Path]], None, None]:
+        """Renders the planned files of the recipe into the sink.
+
+        `chunks` and `targets` are from
+        [parboil.recipes.Boiler._checked_chunks][].
+        """
+        # TODO Error handling
+        for planned, contents in (
+            (planned, contents) for chunk, contents in chunks for planned in chunk
+        ):
+            if isinstance(planned, Recipe):
+                # TODO refactor subproject inclusion (field and compilation to tighly coupled)
+                subproject = Boiler(
+                    planned,
+                    self.target_dir,
+                    self.prefilled,
+                    sink=self.sink,
+                    interactive=self.interactive,
+                    task_jobs=self.task_jobs,
+                    task_cache=self.task_cache,
+                    task_timeout=self.task_timeout,
+                    log_dir=self.log_dir,
+                    data_cache=self.data_cache,
+                )
+                yield from subproject.compile()
+                continue
 
-                generate_file = bool(tpl_render.strip())  # empty?
-                generate_file = file_cfg.get("keep", generate_file)
+            _file, file_in, file_cfg = planned.template, planned.source, planned.config
+            logger.debug("  Working on file [path]%s[/]", _file)
 
-                if generate_file:
-                    path_render_abs = self.target_dir / path_render
-                    path_render_abs.parent.mkdir(parents=True, exist_ok=True)
-                    path_render_abs.write_text(tpl_render)
+            if planned.skip == "excluded":
+                logger.debug("    [path]%s[/] is excluded from rendering", file_in)
+                yield (False, file_in, None)
+                continue
+            elif planned.skip == "condition":
+                logger.debug(
+                    "    [path]%s[/] skipped since its condition is false", file_in
+                )
+                yield (False, file_in, None)
+                continue
 
-                    yield (True, _file, Path(path_render))
-                else:
-                    yield (False, _file, Path(path_render))
+            path_render = planned.target
+            logger.debug("    Filename rendererd to [path]%s[/] ✓", path_render)
+            first = targets[path_render][0]
+            if first != file_in:
+                logger.warning(
+                    "Templates %s and %s are both rendered to %s. Only one of "
+                    "them may have content.",
+                    first,
+                    file_in,
+                    path_render,
+                )
+
+            # Should existsing file be overwritten?
+            if not file_cfg.get("overwrite", True) and self.sink.exists(path_render):
+                logger.debug(
+                    "    [path]%s[/] exists and will not be overwritten",
+                    path_render,
+                )
+                yield (False, file_in, None)
+                continue
 
-        # Execute post-run tasks
-        self.execute_tasks("post-run")
+            tpl_render = contents.get(id(planned))
+            if tpl_render is None:
+                tpl_render = self._render_content(planned)
+            if self._has_content(planned, tpl_render):
+                targets[path_render] = (first, file_in)
+                self.sink.write(path_render, tpl_render)
+                if post_run is not None and post_run.waits_for(path_render):
+                    # the file may still be buffered by the sink
+                    self.sink.flush()
+                    post_run.notify(path_render)
+
+                yield (True, Path(_file), Path(path_render))
+            else:
+                yield (False, Path(_file), Path(path_render))
 
     def execute_tasks(self, hook: str) -> None:
-        if hook not in self.recipe.tasks:
-            return
+        """Executes all tasks for `hook` with the sinks root as working directory.
+
+        Raises:
+            BoilerError: If there are tasks to run, but the sink has no
+                working tree on disk.
+        """
+        self.finish_tasks(hook, self.start_tasks(hook))
+
+    def start_tasks(
+        self, hook: str, pipelined: bool = False
+    ) -> t.Optional["TaskRunner"]:
+        """Renders the tasks for `hook` and starts running them in the
+        background.
+
+        Returns:
+            The [parboil.tasks.TaskRunner][] or `None`, if there are no tasks.
+
+        Raises:
+            BoilerError: If there are tasks to run, but the sink has no
+                working tree on disk.
+        """
+        from rich.markup import escape
+
+        from .tasks import TaskRunner, task_name
+
+        if not self.recipe.tasks.get(hook):
+            return None
+        if self.sink.root is None:
+            raise BoilerError(
+                f"Recipe {self.recipe.name} has {hook} tasks, but the output has no working directory."
+            )
 
         logger.debug("  Executing %s hook..", hook)
-        total_tasks = len(self.recipe.tasks[hook])
-        with self.cwd():
-            for i, task in enumerate(self.recipe.tasks[hook]):
-                self.renderer.render_obj(task, TASK=task)
+        tasks = self.recipe.tasks[hook]
+        total_tasks = len(tasks)
+        for task in tasks:
+            self.renderer.render_obj(task, TASK=task)
+
+        def on_start(i: int, task: "Task") -> None:
+            console.info(
+                f"Running [keyword]{hook}[/] task {i+1} of {total_tasks}: [cmd]{escape(str(task))}[/]"
+            )
+
+        def output(i: int, task: "Task", line: str) -> None:
+            console.out.print(
+                f"[keyword]\\[{escape(task_name(task, i))}][/] {escape(line)}",
+                highlight=False,
+            )
+
+        return TaskRunner(
+            tasks,
+            cwd=self.sink.root,
+            jobs=self.task_jobs,
+            on_start=on_start,
+            output=output,
+            cache=self.task_cache,
+            pipelined=pipelined,
+            timeout=self.task_timeout,
+            log_dir=self.log_dir / hook if self.log_dir else None,
+        ).start()
+
+    def finish_tasks(self, hook: str, runner: t.Optional["TaskRunner"]) -> None:
+        """Waits for the tasks of `hook` started by `runner` and reports
+        the results.
+
+        Raises:
+            TaskFailedError: If a task exited with a returncode other than zero.
+            TaskExecutionError: If a task fails execution.
+        """
+        from rich.markup import escape
+
+        if runner is None:
+            return
+        results = runner.join()
+        self.task_results[hook] = results
+        total_tasks = len(results)
+
+        failed = None
+        for i, result in enumerate(results):
+            if result.cached:
+                console.success(
+                    f"Restored [keyword]{hook}[/] task {i+1} of {total_tasks} from cache: [cmd]{escape(str(result.task))}[/]"
+                )
+            elif result.cached is False:
+                console.info(
+                    f"Cache miss for [keyword]{hook}[/] task {i+1} of {total_tasks}: [cmd]{escape(str(result.task))}[/]"
+                )
+
+            if result.log_file is not None:
                 console.info(
-                    f"Running [keyword]{hook}[/] task {i+1} of {total_tasks}: [cmd]{task}[/]"
+                    f"Output of [keyword]{hook}[/] task {i+1} of {total_tasks} written to [path]{result.log_file}[/]"
                 )
-                try:
-                    if not task.execute():
-                        raise TaskFailedError(task)
-                except Exception as e:
-                    raise TaskExecutionError(task) from e
+
+            if result.cancelled:
+                console.warn(
+                    f"Cancelled [keyword]{hook}[/] task {i+1} of {total_tasks}: [cmd]{escape(str(result.task))}[/]"
+                )
+            elif not result.success and failed is None:
+                failed = result
+        if failed is not None:
+            if failed.error is not None:
+                raise TaskExecutionError(failed.task) from failed.error
+            if failed.task.timed_out:
+                raise TaskTimeoutError(failed.task)
+            raise TaskFailedError(failed.task)
         logger.debug("    done  ✓")
 
     @cached_property
-    def renderer(self) -> ParboilRenderer:
-        return ParboilRenderer(self)
+    def renderer(self) -> "ParboilRenderer":
+        from .renderer import ParboilRenderer
 
-    @contextmanager
-    def cwd(self) -> t.Iterator[Path]:
-        """Change working dir to `self.target_dir` for task execution."""
-        _current = Path.cwd()
-        os.chdir(self.target_dir)
-        yield self.target_dir
-        os.chdir(_current)
+        return ParboilRenderer(self)
@@ -6,23 +6,44 @@ from files or strings.
 
 
 import os
+import re
 import sys
+import threading
+from collections import ChainMap, OrderedDict
 from collections.abc import MutableSequence
 from dataclasses import dataclass
-from functools import cached_property
 from pathlib import Path
-from typing import TYPE_CHECKING, Generator, Protocol, Union
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Generator,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Union,
+)
 
-import jinja2_ansible_filters
 from jinja2 import ChoiceLoader, Environment, FileSystemLoader, PrefixLoader
 from jinja2 import Template as JinjaTemplate
+from jinja2 import TemplateSyntaxError, Undefined, nodes
+from jinja2.parser import Parser
 from jinja2.sandbox import SandboxedEnvironment
-from rich import inspect
+from jinja2.utils import consume
 
-from .ext import jinja_filter_fileify, jinja_filter_roman, jinja_filter_slugify
+from .ext import (
+    jinja_filter_fileify,
+    jinja_filter_roman,
+    jinja_filter_slugify,
+    memoize,
+)
+from .helpers import eval_bool
+from .plugins import create_filters, create_tests
 
 if TYPE_CHECKING:
-    from parboil.recipe import Boiler
+    from parboil.recipes import Boiler, Recipe
 
 
 class ParboilRenderable(Protocol):
@@ -58,53 +79,301 @@ def renderable(cls=None, *attrs, strict: bool = True, render_empty: bool = False
     return wrapper(cls)
 
 
+def create_environment(
+    recipe: "Recipe", memoize_filters: Optional[bool] = None
+) -> Environment:
+    """Creates a jinja Environment to render the templates of `recipe`.
+
+    With `memoize_filters` the results of the `fileify`, `slugify` and
+    `roman` filters are cached for repeated values. Defaults to the
+    `memoize_filters` setting of the recipe (`True`, if not set).
+    """
+    env = SandboxedEnvironment(
+        loader=ChoiceLoader(
+            [
+                FileSystemLoader(recipe.templates_dir),
+                PrefixLoader(
+                    {"includes": FileSystemLoader(recipe.includes_dir)},
+                    delimiter=":",
+                ),
+            ]
+        ),
+    )
+    if memoize_filters is None:
+        memoize_filters = bool(recipe.settings.get("memoize_filters", True))
+    if memoize_filters:
+        # templates often filter the same values over and over
+        env.filters["fileify"] = memoize(jinja_filter_fileify)
+        env.filters["slugify"] = memoize(jinja_filter_slugify)
+        env.filters["roman"] = memoize(jinja_filter_roman)
+    else:
+        env.filters["fileify"] = jinja_filter_fileify
+        env.filters["slugify"] = jinja_filter_slugify
+        env.filters["roman"] = jinja_filter_roman
+    # ansible and plugin filters are loaded when a template uses them
+    env.filters = create_filters(env.filters)
+    env.tests = create_tests(env.tests)
+
+    return env
+
+
+# literal conditions, that are not evaluated as an expression
+_BOOL_WORDS = ("yes", "no", "y", "n", "ja", "nein", "on", "off")
+
+# matches conditions written as a single expression, like "{{ Flag }}"
+_SINGLE_EXPRESSION = re.compile(
+    r"\s*\{\{(?P<expr>(?:(?!\}\}|\{\{).)*)\}\}\s*", re.S
+)
+
+
+def has_template_syntax(env: Environment, source: str) -> bool:
+    """Checks if `source` contains any jinja syntax and needs to be rendered."""
+    line_prefixes = (env.line_statement_prefix, env.line_comment_prefix)
+    return (
+        env.variable_start_string in source
+        or env.block_start_string in source
+        or env.comment_start_string in source
+        or any(prefix and prefix in source for prefix in line_prefixes)
+    )
+
+
+def has_static_content(env: Environment, source: str) -> bool:
+    """Checks if the template `source` renders to some non-whitespace text
+    in any case, because it has text outside of all blocks and tags.
+
+    `False` means, that the template has to be rendered to know.
+    """
+    template = env.parse(source)
+    if template.find(nodes.Extends) is not None:
+        # text outside of blocks is ignored by child templates
+        return False
+    return any(
+        isinstance(child, nodes.TemplateData) and child.data.strip()
+        for node in template.body
+        if isinstance(node, nodes.Output)
+        for child in node.nodes
+    )
+
+
+@dataclass(frozen=True)
+class Expression:
+    """A compiled jinja expression.
+
+    The expression is compiled into a `template`, that assigns its value
+    to the template variable `result`. Literal conditions like `yes` have
+    no template, their `value` is used instead.
+    """
+
+    template: Optional[JinjaTemplate] = None
+    value: Any = None
+
+
+def compile_expression(env: Environment, source: str) -> Expression:
+    """Compiles the jinja expression `source`.
+
+    The expression is parsed like `Environment.compile_expression` does,
+    but the compiled template is kept, so it can be rendered with a shared
+    context instead of a copy of all variables.
+
+    Raises:
+        TemplateSyntaxError: If `source` is not a single expression.
+    """
+    parser = Parser(env, source, state="variable")
+    try:
+        expr = parser.parse_expression()
+        if not parser.stream.eos:
+            raise TemplateSyntaxError(
+                "chunk after expression", parser.stream.current.lineno, None, None
+            )
+        expr.set_environment(env)
+    except TemplateSyntaxError:
+        env.handle_exception(source=source)
+    body = [nodes.Assign(nodes.Name("result", "store"), expr, lineno=1)]
+    return Expression(env.from_string(nodes.Template(body, lineno=1)))
+
+
+class TemplateCache:
+    """Compiles string templates and conditions once and caches them.
+
+    Strings without template syntax are never compiled. The cache is shared
+    between all copies of a recipe and is safe to use from multiple
+    threads. At most `maxsize` templates and expressions are kept.
+    """
+
+    def __init__(self, env: Environment, maxsize: int = 1024):
+        self._env = env
+        self._maxsize = maxsize
+        self._cache: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: Any, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = factory()
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+        return value
+
+    def template(self, source: str) -> Optional[JinjaTemplate]:
+        """Returns the compiled template for `source` or `None`, if `source`
+        has no template syntax."""
+
+        def compile() -> Optional[JinjaTemplate]:
+            if has_template_syntax(self._env, source):
+                return self._env.from_string(source)
+            return None
+
+        return self._get(("template", source), compile)
+
+    def expression(self, source: str) -> Expression:
+        """Returns `source` compiled as a jinja expression."""
+        return self._get(
+            ("expression", source), lambda: compile_expression(self._env, source)
+        )
+
+    def condition(self, source: str) -> Optional[Expression]:
+        """Returns `source` compiled as an expression.
+
+        Conditions may be a bare expression (`Flag and Lang == "py"`) or a
+        single expression in braces (`{{ Flag }}`). Words like `yes` or `no`
+        are taken literally. For any other template syntax `None` is
+        returned and the condition needs to be rendered.
+        """
+
+        def compile() -> Optional[Expression]:
+            match = _SINGLE_EXPRESSION.fullmatch(source)
+            if match:
+                expr = match.group("expr")
+            elif has_template_syntax(self._env, source):
+                return None
+            elif source.strip().lower() in _BOOL_WORDS:
+                # plain words like "yes" are no variable names
+                return Expression(value=eval_bool(source.strip()))
+            else:
+                expr = source
+            return compile_expression(self._env, expr)
+
+        return self._get(("condition", source), compile)
+
+
 # TODO Exception handling
 class ParboilRenderer:
+    """Renders templates with the context of a [parboil.recipes.Boiler][].
+
+    The render context is built once: a chain of the fixed variables
+    (`ENV`, `BOILER`, `RECIPE` and the default `BOIL`) and the context of
+    the boiler. Values filled into the boiler context later are seen
+    without rebuilding anything. The keyword arguments of a single call
+    are layered on top of it.
+    """
+
     def __init__(self, boiler: "Boiler"):
         self._boiler = boiler
-        self._environ = os.environ.copy()
-
-    @cached_property
-    def env(self) -> Environment:
-        """Creates a jinja Environment for this project and caches it"""
-        env = SandboxedEnvironment(
-            loader=ChoiceLoader(
-                [
-                    FileSystemLoader(self._boiler.recipe.templates_dir),
-                    PrefixLoader(
-                        {
-                            "includes": FileSystemLoader(
-                                self._boiler.recipe.includes_dir
-                            )
-                        },
-                        delimiter=":",
-                    ),
-                ]
+        self._boil = dict(TPLNAME=boiler.recipe.name, RUNTIME=sys.executable)
+        self._context: ChainMap = ChainMap(
+            dict(
+                ENV=MappingProxyType(os.environ),
+                BOILER=boiler,
+                RECIPE=boiler.recipe,
+                BOIL=self._boil,
             ),
-            extensions=[jinja2_ansible_filters.AnsibleCoreFiltersExtension],
+            boiler.context,
         )
-        env.filters["fileify"] = jinja_filter_fileify
-        env.filters["slugify"] = jinja_filter_slugify
-        env.filters["roman"] = jinja_filter_roman
 
-        return env
+    @property
+    def env(self) -> Environment:
+        """The jinja Environment of the recipe rendered by the boiler."""
+        return self._boiler.recipe.environment
+
+    @property
+    def cache(self) -> TemplateCache:
+        """The cache of compiled string templates of the recipe."""
+        return self._boiler.recipe.template_cache
+
+    def _boil_vars(self, boil: Optional[Mapping] = None) -> Mapping:
+        if boil is None:
+            return self._boil
+        return ChainMap(boil, self._boil)
+
+    def _render_vars(self, template: JinjaTemplate, kwargs: dict) -> Mapping:
+        if "BOIL" in kwargs:
+            kwargs["BOIL"] = self._boil_vars(kwargs["BOIL"])
+        return ChainMap(kwargs, self._context, template.globals)
 
     def _render_template(self, template: JinjaTemplate, **kwargs) -> str:
-        if "BOIL" not in kwargs:
-            kwargs["BOIL"] = dict()
-        kwargs["BOIL"]["TPLNAME"] = self._boiler.recipe.name
-        kwargs["BOIL"]["RUNTIME"] = sys.executable
-
-        return template.render(
-            **self._boiler.context,
-            **kwargs,
-            ENV=self._environ,
-            BOILER=self._boiler,
-            RECIPE=self._boiler.recipe
+        # the chain is passed as a shared context, jinja would copy it
+        # into a new dict otherwise
+        context = template.new_context(
+            self._render_vars(template, kwargs), shared=True
         )
+        try:
+            return self.env.concat(template.root_render_func(context))  # type: ignore
+        except Exception:
+            self.env.handle_exception()
+
+    def _evaluate(self, expr: Expression, **kwargs) -> Any:
+        template = expr.template
+        if template is None:
+            # literal conditions like "yes"
+            return expr.value
+        context = template.new_context(
+            self._render_vars(template, kwargs), shared=True
+        )
+        consume(template.root_render_func(context))
+        result = context.vars.get("result")
+        return None if isinstance(result, Undefined) else result
 
     def render_string(self, template: str, **kwargs) -> str:
-        return self._render_template(self.env.from_string(str(template)), **kwargs)
+        """Renders the string `template`.
+
+        Compiled templates are cached and strings without template syntax
+        are returned unchanged."""
+        template = str(template)
+        compiled = self.cache.template(template)
+        if compiled is None:
+            return template
+        return self._render_template(compiled, **kwargs)
+
+    def eval_condition(self, condition: Any, **kwargs) -> bool:
+        """Evaluates `condition` to a boolean.
+
+        `None` counts as `True`. Strings are evaluated as a jinja expression.
+        If the result is a string (e.g. a prefilled value like `"no"`), it is
+        interpreted by [parboil.helpers.eval_bool][].
+        """
+        if condition is None:
+            return True
+        if not isinstance(condition, str):
+            return bool(condition)
+
+        expr = self.cache.condition(condition)
+        if expr is None:
+            result = self.render_string(condition, **kwargs)
+        else:
+            result = self._evaluate(expr, **kwargs)
+        if isinstance(result, str):
+            return eval_bool(result)
+        return bool(result)
+
+    def eval_items(self, source: Any, **kwargs) -> List[Any]:
+        """Evaluates the `foreach` option of a file to a list of items.
+
+        Strings are evaluated as a jinja expression, other values are used
+        as is. If the result is a string (e.g. a prefilled value like
+        `"api, web"`), it is split at commas. `None` and undefined values
+        give no items.
+        """
+        if isinstance(source, str):
+            source = self._evaluate(self.cache.expression(source), **kwargs)
+        if source is None:
+            return []
+        if isinstance(source, str):
+            return [item.strip() for item in source.split(",") if item.strip()]
+        return list(source)
 
     def render_strings(
         self, templates: MutableSequence[str], **kwargs
@@ -125,6 +394,10 @@ class ParboilRenderer:
         except StopIteration:
             templates.close()
 
+    def template_source(self, filename: Union[str, Path]) -> str:
+        """Returns the source of the template file `filename`."""
+        return self.env.loader.get_source(self.env, str(filename))[0]  # type: ignore
+
     def render_file(
         self, filename: Union[str, Path], render_filename: bool = False, **kwargs
     ) -> str:
@@ -136,4 +409,4 @@ class ParboilRenderer:
         else:
             filename = str(filename)
 
-        return self._render_template(self.env.get_template(filename))
+        return self._render_template(self.env.get_template(filename), **kwargs)
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""Warm generation server for `boil serve`.
+
+The server keeps the repository, loaded recipes and their jinja
+environments in memory and answers generation requests over a unix socket
+or a localhost TCP port. Cached recipes are reloaded as soon as the
+modification time or size of their project or meta file or of any
+template or include directory changes, which notices added, removed and
+renamed files. Templates and includes edited in place are noticed at most
+[RECHECK_INTERVAL][parboil.server.RECHECK_INTERVAL] seconds later.
+
+The protocol is plain HTTP with JSON bodies:
+
+- `GET /recipes` lists the recipes in the repository.
+- `GET /status` returns the server version and the cached recipes.
+- `POST /generate` generates a project. The body holds the `recipe`
+  name, `answers`, and either an archive `format` or a `target`
+  directory. Directories may be written `atomic`ally with an `fsync`
+  policy (see [parboil.sinks.AtomicDirectorySink][]). An `mtime`
+  makes the output reproducible (see [parboil.sinks][]). Archives are returned in the response body, otherwise a
+  JSON summary of the generated files is returned.
+
+The unix socket is only accessible by the user running the server. TCP
+ports are open to all local users, so TCP servers need a token, that
+clients send as `Authorization: Bearer <token>`. Target directories need
+to be inside the `root` directory of the server (the home directory by
+default). The root itself can't be a target.
+"""
+
+import hmac
+import http.server
+import json
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from . import __version__
+from .client import parse_address
+from .errors import ParboilError, ProjectFileNotFoundError, ServerError
+from .recipes import Boiler, Recipe, Repository
+from .sinks import (
+    ARCHIVE_FORMATS,
+    AtomicDirectorySink,
+    DirectorySink,
+    Sink,
+    remove_in_background,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TYPES = {
+    "tar": "application/x-tar",
+    "tgz": "application/gzip",
+    "zip": "application/zip",
+}
+
+# archives up to this size are kept in memory before they are sent
+SPOOL_SIZE = 16 * 1024 * 1024
+
+RECHECK_INTERVAL = 1.0
+"""Seconds after which the template files of a cached recipe are checked
+for changes again."""
+
+
+def _mtime(path: t.Union[str, Path]) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _stat(path: t.Union[str, Path]) -> t.Tuple[int, int]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (0, -1)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def recipe_stamp(recipe: Recipe, files: bool = True) -> t.Tuple[int, ...]:
+    """Collects the modification times and sizes that invalidate a loaded
+    `recipe`.
+
+    The project and meta file and the template and include directories
+    are checked. With `files` all template and include files are checked,
+    too. The usage analysis of a recipe depends on the contents of its
+    templates, so templates edited in place need to reload the recipe.
+    """
+    stamp = [*_stat(recipe.recipe_file), *_stat(recipe.meta_file)]
+    for directory in (recipe.templates_dir, recipe.includes_dir):
+        for root, _, names in os.walk(directory):
+            stamp.extend(_stat(root))
+            if files:
+                for name in sorted(names):
+                    stamp.extend(_stat(os.path.join(root, name)))
+    return tuple(stamp)
+
+
+class RecipeCache:
+    """Keeps a repository and its loaded recipes in memory."""
+
+    def __init__(self, root: t.Union[str, Path]):
+        self._root = Path(root)
+        self._lock = threading.Lock()
+        self._repository: t.Optional[Repository] = None
+        self._repository_stamp = 0
+        # the stamps of the directories and files of each recipe, when the
+        # files were last checked and the loaded recipe
+        self._recipes: t.Dict[
+            str, t.Tuple[t.Tuple[int, ...], t.Tuple[int, ...], float, Recipe]
+        ] = dict()
+
+    @property
+    def repository(self) -> Repository:
+        """The repository, reloaded if recipes were installed or removed."""
+        stamp = _mtime(self._root)
+        with self._lock:
+            if self._repository is None or stamp != self._repository_stamp:
+                self._repository = Repository(self._root)
+                self._repository_stamp = stamp
+            return self._repository
+
+    def cached(self) -> t.List[str]:
+        with self._lock:
+            return sorted(self._recipes)
+
+    def get(self, name: str) -> Recipe:
+        """Returns a copy of the loaded recipe `name` for a new generation.
+
+        Raises:
+            ProjectFileNotFoundError: If there is no valid recipe `name`.
+        """
+        recipe = Recipe(name, self.repository)
+        if not recipe.is_valid():
+            raise ProjectFileNotFoundError(f"No valid recipe found for name {name}.")
+
+        stamp = recipe_stamp(recipe, files=False)
+        with self._lock:
+            cached = self._recipes.get(name)
+        files = None
+        if cached is not None and cached[0] == stamp:
+            if time.monotonic() - cached[2] < RECHECK_INTERVAL:
+                return cached[3].copy()
+            # the files are only checked once in a while, since that needs
+            # to stat every template
+            files = recipe_stamp(recipe)
+            if files == cached[1]:
+                with self._lock:
+                    self._recipes[name] = (stamp, files, time.monotonic(), cached[3])
+                return cached[3].copy()
+
+        logger.info("Loading recipe %s", name)
+        if files is None:
+            files = recipe_stamp(recipe)
+        recipe.load()
+        # analyse the recipe once, so all copies share the results
+        recipe.usage
+        with self._lock:
+            self._recipes[name] = (stamp, files, time.monotonic(), recipe)
+        return recipe.copy()
+
+
+def generate(
+    recipe: Recipe, target_dir: Path, answers: t.Dict[str, t.Any], sink: Sink
+) -> t.List[t.Dict[str, t.Any]]:
+    """Generates `recipe` into `sink` and returns a summary for each file."""
+    boiler = Boiler(recipe, target_dir, answers, sink=sink, interactive=False)
+    boiler.fill()
+    return [
+        dict(
+            source=str(file_in),
+            target=str(file_out) if file_out else None,
+            created=success,
+        )
+        for success, file_in, file_out in boiler.compile()
+    ]
+
+
+class GenerationHandler(http.server.BaseHTTPRequestHandler):
+    server_version = f"parboil/{__version__}"
+
+    server: "GenerationServer"
+
+    def address_string(self) -> str:
+        # unix sockets have no client address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix"
+
+    def log_message(self, format: str, *args: t.Any) -> None:
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def send_json(self, status: int, data: t.Any) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self) -> bool:
+        """Checks the token of the request and sends an error, if it is
+        missing or wrong."""
+        token = self.server.token
+        if token is None:
+            return True
+        scheme, _, value = self.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(
+            value.strip().encode(), token.encode()
+        ):
+            return True
+        self.send_json(401, dict(error="Missing or invalid server token"))
+        return False
+
+    def do_GET(self) -> None:
+        if not self.authorized():
+            return
+        if self.path == "/recipes":
+            self.send_json(200, dict(recipes=sorted(self.server.cache.repository)))
+        elif self.path == "/status":
+            self.send_json(
+                200, dict(version=__version__, cached=self.server.cache.cached())
+            )
+        else:
+            self.send_json(404, dict(error=f"Unknown path {self.path}"))
+
+    def do_POST(self) -> None:
+        if not self.authorized():
+            return
+        if self.path != "/generate":
+            self.send_json(404, dict(error=f"Unknown path {self.path}"))
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            self.generate(request)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, dict(error=f"Malformed request: {e}"))
+        except ProjectFileNotFoundError as e:
+            self.send_json(404, dict(error=str(e)))
+        except ServerError as e:
+            self.send_json(e.status, dict(error=str(e)))
+        except ParboilError as e:
+            self.send_json(422, dict(error=str(e)))
+        except Exception as e:
+            logger.exception("Error while generating a project")
+            self.send_json(500, dict(error=str(e)))
+
+    def generate(self, request: t.Dict[str, t.Any]) -> None:
+        recipe = self.server.cache.get(request["recipe"])
+        if not request.get("run_tasks", True):
+            recipe.tasks = {hook: [] for hook in recipe.tasks}
+        answers = dict(request.get("answers") or {})
+        mtime = request.get("mtime")
+        if mtime is not None and not isinstance(mtime, int):
+            raise ValueError("mtime needs to be an integer timestamp")
+
+        archive_format = request.get("format")
+        if archive_format:
+            if archive_format not in ARCHIVE_FORMATS:
+                raise ValueError(f"unknown archive format {archive_format}")
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as archive:
+                sink = ARCHIVE_FORMATS[archive_format](archive, mtime=mtime)
+                files = generate(recipe, Path(recipe.name), answers, sink)
+                sink.close()
+
+                size = archive.tell()
+                archive.seek(0)
+                self.send_response(200)
+                self.send_header("Content-Type", ARCHIVE_TYPES[archive_format])
+                self.send_header("Content-Length", str(size))
+                self.send_header(
+                    "X-Parboil-Created", str(sum(f["created"] for f in files))
+                )
+                self.end_headers()
+                shutil.copyfileobj(archive, self.wfile)
+        else:
+            target = Path(request["target"])
+            if not target.is_absolute():
+                raise ValueError("target needs to be an absolute path")
+            target = self.server.confine(target)
+            fsync = request.get("fsync", "none")
+            if request.get("atomic"):
+                sink: Sink = AtomicDirectorySink(
+                    target,
+                    fsync=fsync,
+                    clear=bool(request.get("hard")),
+                    mtime=mtime,
+                    link=not any(recipe.tasks.values()),
+                )
+            else:
+                if request.get("hard") and target.is_dir():
+                    remove_in_background(target)
+                target.mkdir(parents=True, exist_ok=True)
+                sink = DirectorySink(target, fsync=fsync, mtime=mtime)
+
+            with sink:
+                files = generate(recipe, target, answers, sink)
+            self.send_json(
+                200,
+                dict(
+                    target=str(target),
+                    created=sum(f["created"] for f in files),
+                    files=files,
+                ),
+            )
+
+
+class GenerationServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Threaded HTTP server on a localhost TCP port.
+
+    Requests need to send `token`. Projects are only generated inside
+    `root`.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: t.Tuple[str, int],
+        cache: RecipeCache,
+        token: t.Optional[str],
+        root: Path,
+    ):
+        self.cache = cache
+        self.token = token
+        self.root = root.resolve()
+        super().__init__(address, GenerationHandler)
+
+    def confine(self, target: Path) -> Path:
+        """Resolves `target` and checks that it is a directory inside
+        `root`.
+
+        Raises:
+            ServerError: If `target` is not inside `root`.
+        """
+        resolved = target.resolve()
+        if self.root not in resolved.parents:
+            raise ServerError(
+                f"Target {target} is outside of the server root {self.root}",
+                status=403,
+            )
+        return resolved
+
+
+class UnixGenerationServer(GenerationServer):
+    """Threaded HTTP server on a unix domain socket."""
+
+    address_family = socket.AF_UNIX
+
+    def __init__(
+        self, path: str, cache: RecipeCache, token: t.Optional[str], root: Path
+    ):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, cache, token, root)  # type: ignore
+
+    def server_bind(self) -> None:
+        # the socket is created with the permissions of the umask, so it
+        # is never accessible by other users
+        umask = os.umask(0o177)
+        try:
+            socketserver.TCPServer.server_bind(self)
+        finally:
+            os.umask(umask)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def make_server(
+    address: str,
+    repository: t.Union[str, Path],
+    token: t.Optional[str] = None,
+    root: t.Optional[t.Union[str, Path]] = None,
+) -> GenerationServer:
+    """Creates a server for `repository` listening on `address`.
+
+    See [parboil.client][] for the address format. Clients need to send
+    `token`, if given. Projects are only generated in directories inside
+    `root`, that defaults to the home directory.
+
+    Raises:
+        ServerError: If `address` is a TCP port, but no `token` is given.
+    """
+    cache = RecipeCache(repository)
+    root = Path(root) if root is not None else Path.home()
+    addr = parse_address(address)
+    if isinstance(addr, tuple):
+        if not token:
+            raise ServerError("Servers on a TCP port need a token.")
+        return GenerationServer(addr, cache, token, root)
+    Path(addr).parent.mkdir(parents=True, exist_ok=True)
+    return UnixGenerationServer(addr, cache, token, root)
@@ -2,16 +2,21 @@
 
 from pathlib import Path
 
-from .console import out
-
 CFG_DIR = Path("~/.config/parboil").expanduser()
 CFG_FILE = CFG_DIR / "config.json"
 TPL_DIR = CFG_DIR / "templates"
 
 PRJ_FILE = "parboil.json"
 META_FILE = ".parboil"
+CONDITION_FILE = ".parboil-if"
+MANIFEST_FILE = ".parboil-manifest.json"
+DATA_PREFIX = "data:"
 
 ERROR_LOG_FILENAME = CFG_DIR / "parboil-errors.log"
+SERVER_SOCKET = CFG_DIR / "boil.sock"
+CACHE_DIR = CFG_DIR / "cache"
+DATA_CACHE_DIR = CACHE_DIR / "data"
+LOG_DIR = CFG_DIR / "logs"
 
 DEFAULT_CONFIG = {"exclude": ["**/.DS_Store", "**/Thumbs.db"]}
 
@@ -44,7 +49,7 @@ LOGGING_CONFIG = {
             "formatter": "simple",
             "rich_tracebacks": True,
             "tracebacks_suppress": ["click"],
-            "console": out,
+            "console": "ext://parboil.console.out",
             "show_time": False,
         },
     },
@@ -0,0 +1,666 @@
+# -*- coding: utf-8 -*-
+"""Output backends for compiled recipes.
+
+A [parboil.recipes.Boiler][] does not write files on its own but hands the
+rendered contents to a `Sink`. Sinks decide where the files end up: in a
+directory on disk, in memory or in a (streamed) archive.
+
+Sinks never change the working directory of the process and only touch
+the paths they are given, so multiple boilers can render into separate
+sinks concurrently.
+
+Directory sinks can stage the output: an [parboil.sinks.AtomicDirectorySink][]
+renders into a hidden directory next to the target and renames it into
+place once generation succeeded. If generation fails, the target is left
+untouched.
+
+Directory sinks keep the number of filesystem calls low, since each one
+is a round trip on network filesystems: directories are created once,
+existing files are looked up in one listing per directory and small
+files are collected and written in batches by a few threads.
+
+All sinks accept an `mtime` for reproducible output. If it is given,
+every file gets this modification time and fixed permissions, so the
+same recipe and answers produce byte-identical archives and trees with
+identical metadata. [parboil.sinks.source_date_epoch][] reads the
+timestamp from `SOURCE_DATE_EPOCH` like other reproducible build tools.
+"""
+
+import errno
+import hashlib
+import io
+import locale
+import os
+import secrets
+import shutil
+import sys
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+# tarfile and zipfile are imported by the archive sinks on first use
+
+Content = t.Union[str, bytes]
+
+FSYNC_POLICIES = ("none", "file", "end")
+"""When directory sinks flush written files to disk: never, after each
+file or once when the sink is closed."""
+
+SMALL_FILE = 64 * 1024
+"""Files smaller than this many bytes are written in batches."""
+
+BATCH_SIZE = 1024 * 1024
+"""Default number of bytes of small files to collect before writing them."""
+
+WRITE_THREADS = 8
+"""Number of threads writing a batch of files."""
+
+REPRODUCIBLE_EPOCH = 315532800
+"""Timestamp of reproducible output, if `SOURCE_DATE_EPOCH` is not set:
+1980-01-01 00:00 UTC, the earliest date zip archives can store."""
+
+FILE_MODE = 0o644
+"""Permissions of files in reproducible output."""
+
+DIR_MODE = 0o755
+"""Permissions of directories in reproducible output."""
+
+# the encoding of files opened in text mode
+_ENCODING = locale.getpreferredencoding(False)
+
+
+def encode_file(content: Content) -> bytes:
+    """Returns the bytes a [parboil.sinks.DirectorySink][] writes to disk
+    for `content`.
+
+    Strings are encoded like by a file opened in text mode.
+    """
+    if isinstance(content, bytes):
+        return content
+    if os.linesep != "\n":
+        content = content.replace("\n", os.linesep)
+    return content.encode(_ENCODING)
+
+
+def source_date_epoch() -> int:
+    """Returns the timestamp for reproducible output.
+
+    This is the value of the `SOURCE_DATE_EPOCH` environment variable or
+    [REPRODUCIBLE_EPOCH][parboil.sinks.REPRODUCIBLE_EPOCH], if it is not set.
+
+    Raises:
+        ValueError: If `SOURCE_DATE_EPOCH` is no non-negative integer.
+    """
+    value = os.environ.get("SOURCE_DATE_EPOCH", "").strip()
+    if not value:
+        return REPRODUCIBLE_EPOCH
+    if not value.isdigit():
+        raise ValueError(f"SOURCE_DATE_EPOCH is no valid timestamp: {value!r}")
+    return int(value)
+
+
+def _to_bytes(content: Content) -> bytes:
+    if isinstance(content, str):
+        return content.encode("utf-8")
+    return content
+
+
+def _normalize(path: t.Union[str, Path]) -> str:
+    """Normalize `path` to a relative posix path without leading `./`."""
+    return Path(path).as_posix().lstrip("/")
+
+
+class Sink:
+    """Base class for output backends.
+
+    Attributes:
+        root:
+            The directory on disk the sink writes to or `None`, if the output
+            does not end up in a working tree (e.g. archives). Tasks can only
+            be executed for sinks with a `root`.
+    """
+
+    root: t.Optional[Path] = None
+
+    def exists(self, path: t.Union[str, Path]) -> bool:
+        """Checks if a file at the relative `path` already exists in the output."""
+        return False
+
+    def encode(self, content: Content) -> bytes:
+        """Returns the bytes the sink stores for `content`."""
+        return _to_bytes(content)
+
+    def write(self, path: t.Union[str, Path], content: Content) -> None:
+        """Writes `content` to the relative `path`."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Writes buffered files, if the sink buffers any."""
+
+    def close(self) -> None:
+        """Finishes the output. No writes are allowed afterwards."""
+
+    def abort(self) -> None:
+        """Finishes the output after generation failed. Defaults to
+        [close][parboil.sinks.Sink.close]."""
+        self.close()
+
+    def __enter__(self) -> "Sink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _fsync(path: Path, directory: bool = False) -> None:
+    if directory and os.name == "nt":
+        # directories can't be opened on windows
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# permissions and timestamps are set through the open file, if possible
+_STAMP_FD = os.chmod in os.supports_fd and os.utime in os.supports_fd
+
+
+def _stamp(target: t.Union[int, Path], mode: int, mtime: int) -> None:
+    """Sets the permissions and timestamps of the file or file descriptor
+    `target`."""
+    os.chmod(target, mode)
+    os.utime(target, (mtime, mtime))
+
+
+def _sibling(path: Path, kind: str) -> Path:
+    """Returns a hidden, unused path next to `path`."""
+    return path.with_name(f".{path.name}.{secrets.token_hex(4)}.parboil-{kind}")
+
+
+# renameat2 flag to swap two paths and the fd for the working directory
+_RENAME_EXCHANGE = 2
+_AT_FDCWD = -100
+_renameat2: t.Optional[t.Callable[..., int]] = None
+
+
+def _exchange(a: Path, b: Path) -> bool:
+    """Atomically swaps the paths `a` and `b` with `renameat2` on linux.
+
+    Returns `False`, if the platform or filesystem doesn't support it.
+    """
+    global _renameat2
+    if not sys.platform.startswith("linux"):
+        return False
+    import ctypes
+
+    if _renameat2 is None:
+        try:
+            _renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+        except AttributeError:
+            # glibc before 2.28
+            return False
+        _renameat2.argtypes = [  # type: ignore
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint,
+        ]
+    result = _renameat2(
+        _AT_FDCWD, os.fsencode(a), _AT_FDCWD, os.fsencode(b), _RENAME_EXCHANGE
+    )
+    if result == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+        return False
+    raise OSError(err, os.strerror(err), str(a), None, str(b))
+
+
+def _remove_tree(path: Path) -> threading.Thread:
+    thread = threading.Thread(
+        target=shutil.rmtree,
+        args=(path,),
+        kwargs=dict(ignore_errors=True),
+        name=f"remove {path.name}",
+    )
+    thread.start()
+    return thread
+
+
+def remove_in_background(path: t.Union[str, Path]) -> t.Optional[threading.Thread]:
+    """Moves the directory `path` out of the way and deletes it in a
+    background thread.
+
+    `path` is free to be recreated as soon as this function returns. The
+    thread is no daemon, so the process waits for the deletion before it
+    exits. If `path` can't be renamed, it is deleted right away.
+
+    Returns:
+        The thread deleting the directory or `None`, if it was deleted
+        right away.
+    """
+    path = Path(path)
+    trash = _sibling(path, "trash")
+    try:
+        os.replace(path, trash)
+    except OSError:
+        shutil.rmtree(path)
+        return None
+    return _remove_tree(trash)
+
+
+class DirectorySink(Sink):
+    """Writes files into a directory on disk.
+
+    Directories are created once and the contents of existing directories
+    are listed once to answer [exists][parboil.sinks.Sink.exists].
+    Files smaller than [SMALL_FILE][parboil.sinks.SMALL_FILE] are
+    collected until `batch_size` bytes are buffered (or
+    [flush][parboil.sinks.Sink.flush] is called) and then written by
+    multiple threads. A `batch_size` of `0` writes every file right away.
+
+    `fsync` is one of the [FSYNC_POLICIES][parboil.sinks.FSYNC_POLICIES].
+    With `"file"` each file is flushed to disk right after it was written,
+    with `"end"` all files are flushed when the sink is closed. In both
+    cases the directories of the written files are flushed on close.
+
+    If `mtime` is given, written files get this timestamp and
+    [FILE_MODE][parboil.sinks.FILE_MODE] regardless of the umask. The
+    directories of written files get the timestamp and
+    [DIR_MODE][parboil.sinks.DIR_MODE] when the sink is closed.
+    """
+
+    def __init__(
+        self,
+        root: t.Union[str, Path],
+        fsync: str = "none",
+        batch_size: int = BATCH_SIZE,
+        mtime: t.Optional[int] = None,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}")
+        self.root = Path(root)
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.mtime = mtime
+        self._unsynced: t.List[Path] = list()
+        self._dirs: t.Set[Path] = set()
+
+        self._batch: t.Dict[Path, bytes] = dict()
+        self._batched = 0
+        # directories known to exist and cached directory listings
+        self._made: t.Set[Path] = set()
+        self._listings: t.Dict[Path, t.Set[str]] = dict()
+
+    def _listing(self, path: Path) -> t.Set[str]:
+        if path not in self._listings:
+            try:
+                self._listings[path] = set(os.listdir(path))
+            except (FileNotFoundError, NotADirectoryError):
+                self._listings[path] = set()
+        return self._listings[path]
+
+    def _added(self, path: Path) -> None:
+        listing = self._listings.get(path.parent)
+        if listing is not None:
+            listing.add(path.name)
+
+    def _mkdir(self, path: Path) -> None:
+        if path in self._made:
+            return
+        path.mkdir(parents=True, exist_ok=True)
+        while path not in self._made and path != self.root.parent:
+            self._made.add(path)
+            self._added(path)
+            path = path.parent
+
+    def _write_file(self, path: Path, data: bytes) -> None:
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        fd = os.open(path, flags, 0o666)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view) :]
+            if self.mtime is not None and _STAMP_FD:
+                _stamp(fd, FILE_MODE, self.mtime)
+            if self.fsync == "file":
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        if self.mtime is not None and not _STAMP_FD:
+            _stamp(path, FILE_MODE, self.mtime)
+        if self.fsync == "end":
+            self._unsynced.append(path)
+        if self.fsync != "none":
+            self._dirs.add(path.parent)
+
+    def encode(self, content: Content) -> bytes:
+        return encode_file(content)
+
+    def exists(self, path: t.Union[str, Path]) -> bool:
+        target = self.root / path
+        return target in self._batch or target.name in self._listing(target.parent)
+
+    def write(self, path: t.Union[str, Path], content: Content) -> None:
+        target = self.root / path
+        content = encode_file(content)
+
+        self._batched -= len(self._batch.pop(target, b""))
+        if len(content) < SMALL_FILE and self.batch_size > 0:
+            self._batch[target] = content
+            self._batched += len(content)
+            if self._batched >= self.batch_size:
+                self.flush()
+        else:
+            self._mkdir(target.parent)
+            self._write_file(target, content)
+        self._added(target)
+
+    def flush(self) -> None:
+        """Writes all buffered files."""
+        if not self._batch:
+            return
+        batch, self._batch, self._batched = self._batch, dict(), 0
+        for path in sorted({path.parent for path in batch}):
+            self._mkdir(path)
+
+        if len(batch) == 1:
+            self._write_file(*batch.popitem())
+            return
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(min(WRITE_THREADS, len(batch))) as pool:
+            for _ in pool.map(lambda item: self._write_file(*item), batch.items()):
+                pass
+
+    def sync(self) -> None:
+        """Writes buffered files and flushes all written files and their
+        directories to disk."""
+        self.flush()
+        for path in self._unsynced:
+            _fsync(path)
+        for path in self._dirs:
+            _fsync(path, directory=True)
+        self._unsynced.clear()
+        self._dirs.clear()
+
+    def _stamp_dirs(self) -> None:
+        # writing a file changes the timestamp of its directory, so
+        # directories are stamped last and from the bottom up
+        for path in sorted(self._made, key=lambda p: len(p.parts), reverse=True):
+            _stamp(path, DIR_MODE, self.mtime)  # type: ignore[arg-type]
+
+    def close(self) -> None:
+        self.flush()
+        if self.mtime is not None:
+            self._stamp_dirs()
+        self.sync()
+
+
+class AtomicDirectorySink(DirectorySink):
+    """Writes files into a staging directory, that replaces `target` when
+    the sink is closed.
+
+    The staging directory is created next to `target`, so it is on the same
+    filesystem and can be moved into place by renaming it. On linux the
+    staging directory and `target` are swapped in one atomic `renameat2`
+    call. Elsewhere the old contents of `target` are renamed away first,
+    so for a moment `target` does not exist. The old contents are deleted
+    in the background. If the sink is aborted, the staging directory is
+    removed and `target` is left as it was.
+
+    Unless `clear` is set, the staging directory starts with the current
+    contents of `target`, so files that are not generated are kept like
+    with a [parboil.sinks.DirectorySink][]. With `link` these files are
+    hard linked instead of copied, if possible. Generated files never
+    write through the links, but tasks may change files in place, so
+    `link` should be disabled for recipes with tasks. The whole tree of
+    `target` is linked or copied, so the cost of staging grows with the
+    size of `target`, not only with the generated files. This keeps the
+    swap atomic: only the staging directory is renamed into place.
+
+    `root` is the staging directory. Tasks run there, so their results
+    are part of the swap, too.
+    """
+
+    def __init__(
+        self,
+        target: t.Union[str, Path],
+        fsync: str = "none",
+        clear: bool = False,
+        mtime: t.Optional[int] = None,
+        link: bool = True,
+    ):
+        self.target = Path(target)
+        self.target.parent.mkdir(parents=True, exist_ok=True)
+        staging = _sibling(self.target, "staging")
+        staging.mkdir()
+        super().__init__(staging, fsync=fsync, mtime=mtime)
+
+        # files in the staging directory, that are hard links
+        self._links: t.Set[Path] = set()
+        if not clear and self.target.is_dir():
+            shutil.copytree(
+                self.target,
+                staging,
+                symlinks=True,
+                copy_function=self._link_or_copy if link else shutil.copy2,
+                dirs_exist_ok=True,
+            )
+        elif self.target.is_dir():
+            shutil.copymode(self.target, staging)
+        self._closed = False
+
+    def _write_file(self, path: Path, data: bytes) -> None:
+        if path in self._links:
+            # never write through a hard link into the old target
+            path.unlink()
+            self._links.discard(path)
+        super()._write_file(path, data)
+
+    def _link_or_copy(self, src: str, dst: str) -> None:
+        try:
+            os.link(src, dst)
+            self._links.add(Path(dst))
+        except OSError:
+            shutil.copy2(src, dst)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        super().close()
+
+        old = None
+        if self.target.is_dir() and _exchange(self.root, self.target):
+            # the staging path holds the old contents now
+            old = self.root
+        else:
+            if self.target.exists():
+                old = _sibling(self.target, "trash")
+                os.replace(self.target, old)
+            try:
+                os.replace(self.root, self.target)
+            except OSError:
+                if old is not None:
+                    os.replace(old, self.target)
+                raise
+        self.root = self.target
+        if self.fsync != "none":
+            _fsync(self.target.parent, directory=True)
+        if old is not None:
+            _remove_tree(old)
+
+    def abort(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._batch.clear()
+        _remove_tree(self.root)
+
+
+class ChecksumSink(Sink):
+    """Passes all files on to `sink` and computes their SHA-256 on the way.
+
+    The digests are computed from the bytes handed to `sink`, so files are
+    never read back. `checksums` maps the relative posix path of each file
+    to its hex digest and size.
+    """
+
+    def __init__(self, sink: Sink):
+        self.sink = sink
+        self.checksums: t.Dict[str, t.Tuple[str, int]] = dict()
+
+    @property  # type: ignore[override]
+    def root(self) -> t.Optional[Path]:
+        return self.sink.root
+
+    def encode(self, content: Content) -> bytes:
+        return self.sink.encode(content)
+
+    def exists(self, path: t.Union[str, Path]) -> bool:
+        return self.sink.exists(path)
+
+    def write(self, path: t.Union[str, Path], content: Content) -> None:
+        data = self.sink.encode(content)
+        self.checksums[_normalize(path)] = (hashlib.sha256(data).hexdigest(), len(data))
+        self.sink.write(path, data)
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+    def close(self) -> None:
+        self.sink.close()
+
+    def abort(self) -> None:
+        self.sink.abort()
+
+
+class MemorySink(Sink):
+    """Collects all files in the `files` dictionary.
+
+    Keys are relative posix paths, values the rendered contents.
+    """
+
+    def __init__(self) -> None:
+        self.files: t.Dict[str, Content] = dict()
+
+    def exists(self, path: t.Union[str, Path]) -> bool:
+        return _normalize(path) in self.files
+
+    def write(self, path: t.Union[str, Path], content: Content) -> None:
+        self.files[_normalize(path)] = content
+
+
+class ZipSink(Sink):
+    """Streams files into a zip archive.
+
+    `file` may be a path or a binary file object. The file object does not
+    need to be seekable, so the archive can be streamed to stdout or a
+    socket.
+
+    Entries are dated with the local time, unless `mtime` is given. Zip
+    archives store no time zone, so `mtime` is stored as UTC.
+    """
+
+    def __init__(
+        self, file: t.Union[str, Path, t.BinaryIO], mtime: t.Optional[int] = None
+    ):
+        import zipfile
+
+        self.mtime = mtime
+        self._zip = zipfile.ZipFile(file, mode="w", compression=zipfile.ZIP_DEFLATED)
+        self._names: t.Set[str] = set()
+
+    def exists(self, path: t.Union[str, Path]) -> bool:
+        return _normalize(path) in self._names
+
+    def write(self, path: t.Union[str, Path], content: Content) -> None:
+        import zipfile
+
+        name = _normalize(path)
+        if self.mtime is None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        else:
+            date_time = time.gmtime(max(self.mtime, REPRODUCIBLE_EPOCH))[:6]
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            # the default depends on the platform
+            info.create_system = 3
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = FILE_MODE << 16
+        self._zip.writestr(info, _to_bytes(content))
+        self._names.add(name)
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class TarSink(Sink):
+    """Streams files into a tar archive.
+
+    `file` may be a path or a binary file object. The archive is written in
+    stream mode, so the file object does not need to be seekable.
+    `compression` is one of `""`, `"gz"`, `"bz2"` or `"xz"`.
+
+    Members are dated with the current time, unless `mtime` is given.
+    """
+
+    def __init__(
+        self,
+        file: t.Union[str, Path, t.BinaryIO],
+        compression: str = "",
+        mtime: t.Optional[int] = None,
+    ):
+        import tarfile
+
+        self.mtime = mtime
+        # files opened by the sink and closed after the archive
+        self._files: t.List[t.BinaryIO] = list()
+        if isinstance(file, (str, Path)):
+            file = open(file, "wb")
+            self._files.append(file)
+        if compression == "gz" and mtime is not None:
+            import gzip
+
+            # tarfile stamps the gzip header with the current time
+            file = gzip.GzipFile(filename="", mode="wb", fileobj=file, mtime=mtime)
+            self._files.insert(0, file)  # type: ignore[arg-type]
+            compression = ""
+        self._tar = tarfile.open(fileobj=file, mode=f"w|{compression}")
+        self._names: t.Set[str] = set()
+
+    def exists(self, path: t.Union[str, Path]) -> bool:
+        return _normalize(path) in self._names
+
+    def write(self, path: t.Union[str, Path], content: Content) -> None:
+        import tarfile
+
+        name = _normalize(path)
+        data = _to_bytes(content)
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time()) if self.mtime is None else self.mtime
+        info.mode = FILE_MODE
+        self._tar.addfile(info, io.BytesIO(data))
+        self._names.add(name)
+
+    def close(self) -> None:
+        self._tar.close()
+        for file in self._files:
+            file.close()
+
+
+ARCHIVE_FORMATS: t.Dict[str, t.Callable[..., Sink]] = {
+    "tar": TarSink,
+    "tgz": lambda f, **kwargs: TarSink(f, compression="gz", **kwargs),
+    "zip": ZipSink,
+}
+"""Archive sinks by format name. The sinks are called with the archive
+file and optional keyword arguments like `mtime`."""
@@ -2,27 +2,98 @@
 
 import os
 import shlex
+import signal
 import subprocess
+import sys
+import threading
+import time
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from pathlib import Path
 
-from jinja2 import Environment
-from rich.live import Live
-from rich.panel import Panel
-from rich.text import Text
+from .errors import ProjectConfigError
+
+if t.TYPE_CHECKING:
+    from parboil.cache import TaskCache
+
+
+# seconds to wait for a process to exit after it was terminated
+KILL_GRACE = 5.0
+
+# guards the running processes of tasks
+_proc_lock = threading.Lock()
+
+
+@dataclass
+class TaskStats:
+    """Resource usage of an executed task.
+
+    Attributes:
+        wall_time: Seconds the task was running.
+        cpu_time:
+            User and system CPU seconds of the task and its children or
+            `None`, if not available on this platform.
+        max_rss:
+            Peak resident set size in bytes of the largest process or
+            `None`, if not available on this platform.
+    """
+
+    wall_time: float
+    cpu_time: t.Optional[float] = None
+    max_rss: t.Optional[int] = None
 
 
 @dataclass
 class Task:
-    """Stores and esecutes commands to run before or after compiling a recipe."""
+    """Stores and esecutes commands to run before or after compiling a recipe.
+
+    Attributes:
+        id:
+            Name of the task for `needs` and output prefixes. Defaults to
+            the position of the task in its hook, starting at 1.
+        needs:
+            Ids of tasks that need to finish before this task is run.
+        parallel:
+            If `True`, the task may run concurrently with the preceding
+            tasks and only waits for the last task that is not parallel.
+        cache:
+            Enables caching of the task's results with the glob patterns
+            of its `inputs` and `outputs`. See [parboil.cache][].
+        stage:
+            With `concurrent` the task runs while the recipe is rendered.
+            Pre-run tasks don't block rendering and post-run tasks start
+            as soon as rendering starts.
+        files:
+            Paths of generated files a post-run task needs. The task
+            starts as soon as these are written. Glob patterns are
+            available after rendering finished.
+        timeout:
+            Seconds after which the task is killed.
+    """
 
     cmd: t.Union[str, t.List[str]]
     env: t.Optional[dict] = None
     quiet: bool = False
+    id: t.Optional[str] = None
+    needs: t.Optional[t.List[str]] = None
+    parallel: bool = False
+    cache: t.Optional[t.Dict[str, t.List[str]]] = None
+    stage: t.Optional[str] = None
+    files: t.Optional[t.List[str]] = None
+    timeout: t.Optional[float] = None
 
     returncode: int = field(init=False, default=-1)
+    timed_out: bool = field(init=False, default=False)
+    stats: t.Optional["TaskStats"] = field(init=False, default=None)
 
     _shell: bool = field(default=False, init=False)
+    # the running process and if it was started in a new session
+    _proc: t.Optional[subprocess.Popen] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _detached: bool = field(default=False, init=False, repr=False, compare=False)
+    _terminated: bool = field(default=False, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         # make sure command is a list
@@ -30,6 +101,24 @@ class Task:
             self._shell = True
             self.cmd = [self.cmd]
             # self.cmd = shlex.split(self.cmd)
+        if isinstance(self.needs, str):
+            self.needs = [self.needs]
+        if self.id is not None:
+            self.id = str(self.id)
+        if isinstance(self.files, str):
+            self.files = [self.files]
+        if self.stage not in (None, "concurrent"):
+            raise ProjectConfigError(
+                f"Unknown stage {self.stage} for task {self.quoted()}."
+            )
+        if self.cache is not None:
+            if not isinstance(self.cache, dict) or not self.cache.get("outputs"):
+                raise ProjectConfigError(
+                    f"Cache option of task {self.quoted()} needs a list of outputs."
+                )
+            for key in ("inputs", "outputs"):
+                if isinstance(self.cache.get(key), str):
+                    self.cache[key] = [self.cache[key]]
 
     @classmethod
     def from_dict(self, descr: t.Dict[str, t.Any]) -> "Task":
@@ -46,25 +135,561 @@ class Task:
             for i, c in enumerate(self.cmd):
                 self.cmd[i] = yield c
 
-    def execute(self) -> bool:
+    def execute(
+        self,
+        cwd: t.Optional[t.Union[str, Path]] = None,
+        output: t.Optional[t.Callable[[str], None]] = None,
+        timeout: t.Optional[float] = None,
+        log_file: t.Optional[t.Union[str, Path]] = None,
+        stdin: bool = True,
+    ) -> bool:
+        """Runs the command in the working directory `cwd`.
+
+        The working directory of the current process is never changed, so
+        tasks for different targets can run concurrently. If `output` is
+        given, the output of the command is captured and passed to `output`
+        line by line. Output of quiet tasks is written to `log_file` or
+        discarded.
+
+        The command is killed after `timeout` seconds, unless the task
+        has a `timeout` of its own. Without `stdin` the command can't read
+        from the terminal. The resource usage is stored in `stats`.
+
+        Commands with a timeout are started in a process group of their
+        own on POSIX, so the command and all its subprocesses are killed
+        on timeouts. Commands that can't read from the terminal are started
+        in a new session. Commands that may read from the terminal stay in
+        its session and are made the foreground process group while they
+        run, so they receive input and signals like Ctrl-C. Commands without
+        a timeout stay in the process group of parboil.
+        """
+        environ = os.environ.copy()
         if self.env:
-            environ = os.environ.copy().update(self.env)
+            environ.update(self.env)
+        if self.timeout is not None:
+            timeout = self.timeout
+
+        log = None
+        if self.quiet:
+            if log_file:
+                log = open(log_file, "wb")
+                stdout = log
+            else:
+                stdout = subprocess.DEVNULL
+        elif output is not None:
+            stdout = subprocess.PIPE
         else:
-            environ = os.environ.copy()
-
-        result = subprocess.run(
-            self.cmd,
-            shell=self._shell,
-            # check=True,
-            env=environ,
-            stdout=subprocess.DEVNULL if self.quiet else None,
-            stderr=subprocess.STDOUT,
+            stdout = None
+
+        self.timed_out = False
+        self._detached = os.name == "posix" and timeout is not None
+        group: t.Dict[str, t.Any] = dict()
+        if self._detached:
+            # allows to kill the whole process group on timeouts
+            if not stdin:
+                group["start_new_session"] = True
+            elif sys.version_info >= (3, 11):
+                group["process_group"] = 0
+            else:
+                group["preexec_fn"] = os.setpgrp
+        start = time.monotonic()
+        try:
+            proc = subprocess.Popen(
+                self.cmd,
+                shell=self._shell,
+                cwd=cwd,
+                env=environ,
+                stdin=None if stdin else subprocess.DEVNULL,
+                stdout=stdout,
+                stderr=subprocess.STDOUT if stdout is not None else None,
+                **group,
+            )
+        finally:
+            if log is not None:
+                log.close()
+        terminal = None
+        if self._detached and stdin:
+            terminal = _hand_terminal(proc.pid)
+        with _proc_lock:
+            self._proc = proc
+            terminated = self._terminated
+        if terminated:
+            # terminated while the process was started
+            self.terminate()
+
+        reader = None
+        if proc.stdout is not None:
+            reader = threading.Thread(
+                target=_read_lines, args=(proc.stdout, output), daemon=True
+            )
+            reader.start()
+
+        waiter = _Waiter(proc)
+        if not waiter.wait(timeout):
+            self.timed_out = True
+            _terminate(proc, self._detached)
+            if not waiter.wait(KILL_GRACE):
+                _kill(proc, self._detached)
+                waiter.wait()
+        if terminal is not None:
+            _take_terminal(terminal)
+        if reader is not None:
+            # subprocesses that left the process group may keep the pipe
+            # open after a timeout
+            reader.join(KILL_GRACE if self.timed_out else None)
+            if not reader.is_alive():
+                proc.stdout.close()  # type: ignore
+
+        with _proc_lock:
+            self._proc = None
+            self._terminated = False
+        self.returncode = proc.returncode
+        self.stats = TaskStats(
+            wall_time=time.monotonic() - start,
+            cpu_time=waiter.cpu_time,
+            max_rss=waiter.max_rss,
         )
-        self.returncode = result.returncode
-        return result.returncode == 0
+        return self.returncode == 0 and not self.timed_out
+
+    def terminate(self) -> None:
+        """Terminates the command (and its process group, if it was started
+        in a process group of its own), if it is running. The command is killed, if it
+        did not exit after `KILL_GRACE` seconds."""
+        with _proc_lock:
+            self._terminated = True
+            proc = self._proc
+        if proc is None or proc.returncode is not None:
+            return
+        _terminate(proc, self._detached)
+
+        def kill() -> None:
+            if proc.returncode is None:
+                _kill(proc, self._detached)
+
+        timer = threading.Timer(KILL_GRACE, kill)
+        timer.daemon = True
+        timer.start()
 
     def quoted(self):
         return " ".join(shlex.quote(c) for c in self.cmd)
 
     def __str__(self):
         return self.quoted()
+
+
+def _read_lines(
+    stream: t.IO[bytes], output: t.Optional[t.Callable[[str], None]]
+) -> None:
+    for line in iter(stream.readline, b""):
+        if output is not None:
+            output(line.decode(errors="replace").rstrip("\r\n"))
+
+
+class _Waiter:
+    """Waits for a process and collects its resource usage.
+
+    On POSIX the process is reaped with `os.wait4` in a background thread,
+    so waiting can time out while the resource usage is still available.
+    """
+
+    def __init__(self, proc: subprocess.Popen):
+        self.proc = proc
+        self.cpu_time: t.Optional[float] = None
+        self.max_rss: t.Optional[int] = None
+        self._thread: t.Optional[threading.Thread] = None
+        if hasattr(os, "wait4"):
+            self._thread = threading.Thread(target=self._wait4, daemon=True)
+            self._thread.start()
+
+    def _wait4(self) -> None:
+        _, status, usage = os.wait4(self.proc.pid, 0)
+        self.proc.returncode = os.waitstatus_to_exitcode(status)
+        self.cpu_time = usage.ru_utime + usage.ru_stime
+        # linux reports kilobytes, macOS bytes
+        self.max_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    def wait(self, timeout: t.Optional[float] = None) -> bool:
+        """Waits up to `timeout` seconds and returns `True`, if the process
+        exited."""
+        if self._thread is None:
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                return False
+            return True
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+
+def _hand_terminal(pgid: int) -> t.Optional[int]:
+    """Makes the process group `pgid` the foreground process group of the
+    terminal, if parboil is in the foreground.
+
+    Returns:
+        The file descriptor of the terminal or `None`.
+    """
+    try:
+        fd = sys.stdin.fileno()
+        if not os.isatty(fd) or os.tcgetpgrp(fd) != os.getpgrp():
+            return None
+        os.tcsetpgrp(fd, pgid)
+    except (AttributeError, OSError, ValueError):
+        return None
+    # resume the command, if it was stopped reading from the terminal early
+    try:
+        os.killpg(pgid, signal.SIGCONT)
+    except (ProcessLookupError, PermissionError):
+        pass
+    return fd
+
+
+def _take_terminal(fd: int) -> None:
+    """Makes parboil the foreground process group of the terminal again."""
+    # changing the foreground group from the background raises SIGTTOU
+    blocked = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTTOU})
+    try:
+        os.tcsetpgrp(fd, os.getpgrp())
+    except OSError:
+        pass
+    finally:
+        signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+
+
+def _terminate(proc: subprocess.Popen, group: bool) -> None:
+    try:
+        if group:
+            os.killpg(proc.pid, signal.SIGTERM)
+        else:
+            proc.terminate()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _kill(proc: subprocess.Popen, group: bool) -> None:
+    try:
+        if group:
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def task_graph(tasks: t.List[Task]) -> t.List[t.Set[int]]:
+    """Builds the dependency graph for a list of tasks of one hook.
+
+    Tasks without `needs` wait for the preceding task, so by default
+    tasks run one after another. Tasks marked `parallel` only wait for the
+    last task that is not parallel and tasks with `needs` only wait for
+    the listed tasks. A task that is not parallel waits for all tasks
+    since the last task that is not parallel.
+
+    Returns:
+        The indices of the tasks each task depends on.
+
+    Raises:
+        ProjectConfigError: If ids are not unique, `needs` references an
+            unknown task or the dependencies contain a cycle.
+    """
+    ids: t.Dict[str, int] = dict()
+    for i, task in enumerate(tasks):
+        task_id = task_name(task, i)
+        if task_id in ids:
+            raise ProjectConfigError(f"Duplicate task id {task_id}.")
+        ids[task_id] = i
+
+    graph: t.List[t.Set[int]] = list()
+    last_serial: t.Optional[int] = None
+    group: t.List[int] = list()
+    for i, task in enumerate(tasks):
+        if task.needs is not None:
+            deps = set()
+            for need in task.needs:
+                if need not in ids:
+                    raise ProjectConfigError(
+                        f"Task {task_name(task, i)} needs unknown task {need}."
+                    )
+                deps.add(ids[need])
+            group.append(i)
+        elif task.parallel:
+            deps = {last_serial} if last_serial is not None else set()
+            group.append(i)
+        else:
+            deps = set(group)
+            last_serial = i
+            group = [i]
+        graph.append(deps)
+
+    # check for cycles
+    done: t.Set[int] = set()
+    while len(done) < len(tasks):
+        ready = [i for i, deps in enumerate(graph) if i not in done and deps <= done]
+        if not ready:
+            cycle = ", ".join(
+                task_name(tasks[i], i) for i in range(len(tasks)) if i not in done
+            )
+            raise ProjectConfigError(f"Tasks have cyclic dependencies: {cycle}")
+        done.update(ready)
+    return graph
+
+
+def task_name(task: Task, index: int) -> str:
+    """The id of `task` at position `index` in its hook."""
+    return task.id if task.id is not None else str(index + 1)
+
+
+@dataclass
+class TaskResult:
+    """Outcome of running a task with [parboil.tasks.run_tasks][]."""
+
+    task: Task
+    success: bool = False
+    cancelled: bool = False
+    error: t.Optional[BaseException] = None
+    # None, if the task is not cached, else if the results were restored
+    cached: t.Optional[bool] = None
+    log_file: t.Optional[Path] = None
+
+
+class TaskRunner:
+    """Runs `tasks` in the order given by [parboil.tasks.task_graph][].
+
+    Tasks that are ready run concurrently with at most `jobs` tasks at a
+    time (defaults to the number of CPUs). The output of each task is
+    streamed to `output` with the index of the task. If tasks can only run
+    one after another, they may read from the terminal. Output of quiet
+    tasks is written to a log file in `log_dir`, if given.
+
+    Tasks without a `timeout` of their own are killed after `timeout`
+    seconds.
+
+    A task that fails cancels all tasks that depend on it. Independent
+    tasks keep running.
+
+    If a `cache` is given, the outputs of tasks with a `cache` option are
+    restored from the cache instead of running the task, if possible.
+
+    With `pipelined` the runner is started while the recipe is rendered.
+    Tasks with `stage: concurrent` start right away, tasks with `files`
+    start as soon as these files were reported with
+    [parboil.tasks.TaskRunner.notify][] and all other tasks wait for
+    [parboil.tasks.TaskRunner.rendered][].
+    """
+
+    def __init__(
+        self,
+        tasks: t.List[Task],
+        cwd: t.Optional[t.Union[str, Path]] = None,
+        jobs: t.Optional[int] = None,
+        on_start: t.Optional[t.Callable[[int, Task], None]] = None,
+        output: t.Optional[t.Callable[[int, Task, str], None]] = None,
+        cache: t.Optional["TaskCache"] = None,
+        pipelined: bool = False,
+        timeout: t.Optional[float] = None,
+        log_dir: t.Optional[Path] = None,
+    ):
+        self.tasks = tasks
+        self.cwd = cwd
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.on_start = on_start
+        self.output = output
+        self.cache = cache
+        self.timeout = timeout
+        self.log_dir = log_dir
+
+        self.graph = task_graph(tasks)
+        self.results = [TaskResult(task) for task in tasks]
+
+        # files each task waits for, None waits for the end of rendering
+        self._waiting: t.List[t.Optional[t.Set[str]]] = list()
+        for task in tasks:
+            if not pipelined or task.stage == "concurrent":
+                self._waiting.append(set())
+            elif task.files:
+                self._waiting.append(set(task.files))
+            else:
+                self._waiting.append(None)
+        self._rendered = not pipelined
+
+        # tasks that can't overlap with each other or with rendering may
+        # read from the terminal
+        self.serial = self.jobs == 1 or (
+            all(
+                deps == ({i - 1} if i > 0 else set())
+                for i, deps in enumerate(self.graph)
+            )
+            and not any(task.stage or task.files for task in tasks)
+        )
+
+        self._cond = threading.Condition()
+        self._pending = set(range(len(tasks)))
+        self._running: t.Set[int] = set()
+        self._finished: t.Set[int] = set()
+        self._executor: t.Optional[ThreadPoolExecutor] = None
+        self._thread: t.Optional[threading.Thread] = None
+
+    def start(self) -> "TaskRunner":
+        """Starts scheduling tasks in a background thread."""
+        if self.tasks and self._thread is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1 if self.serial else self.jobs
+            )
+            self._thread = threading.Thread(target=self._schedule, daemon=True)
+            self._thread.start()
+        return self
+
+    def waits_for(self, path: t.Union[str, Path]) -> bool:
+        """Checks if any task waits for `path` (relative to `cwd`)."""
+        path = Path(path).as_posix()
+        with self._cond:
+            return any(waiting and path in waiting for waiting in self._waiting)
+
+    def notify(self, path: t.Union[str, Path]) -> None:
+        """Reports that `path` (relative to `cwd`) was written."""
+        path = Path(path).as_posix()
+        with self._cond:
+            changed = False
+            for waiting in self._waiting:
+                if waiting and path in waiting:
+                    waiting.discard(path)
+                    changed = True
+            if changed:
+                self._cond.notify_all()
+
+    def rendered(self) -> None:
+        """Reports that all files were written."""
+        with self._cond:
+            self._rendered = True
+            self._cond.notify_all()
+
+    def cancel(self, kill: bool = False) -> None:
+        """Cancels all tasks that did not start yet.
+
+        With `kill` the running tasks are terminated, too.
+        """
+        with self._cond:
+            for i in self._pending:
+                self.results[i].cancelled = True
+            self._pending.clear()
+            if kill:
+                for i in self._running:
+                    self.results[i].cancelled = True
+                    self.tasks[i].terminate()
+            self._rendered = True
+            self._cond.notify_all()
+
+    def wait(self, indices: t.Optional[t.Iterable[int]] = None) -> None:
+        """Waits until the tasks `indices` (or all tasks) are done."""
+        indices = set(range(len(self.tasks)) if indices is None else indices)
+        with self._cond:
+            self._cond.wait_for(lambda: not (indices & (self._pending | self._running)))
+
+    def join(self) -> t.List[TaskResult]:
+        """Waits for all tasks and returns their results."""
+        self.rendered()
+        if self._thread is not None:
+            self._thread.join()
+            self._executor.shutdown()  # type: ignore
+        return self.results
+
+    def _ready(self, index: int) -> bool:
+        waiting = self._waiting[index]
+        if waiting is None or waiting:
+            # glob patterns and files, that are never written, are
+            # available after rendering
+            if not self._rendered:
+                return False
+        return self.graph[index] <= self._finished
+
+    def _schedule(self) -> None:
+        with self._cond:
+            while self._pending or self._running:
+                for i in sorted(self._pending):
+                    if self._ready(i):
+                        self._pending.discard(i)
+                        self._running.add(i)
+                        self._executor.submit(self._run, i)  # type: ignore
+                self._cond.wait()
+
+    def _run(self, index: int) -> None:
+        result = self.results[index]
+        try:
+            result.success = self._execute(index)
+        except Exception as e:
+            result.error = e
+        with self._cond:
+            self._running.discard(index)
+            if result.success:
+                self._finished.add(index)
+            else:
+                self._cancel_dependents(index)
+            self._cond.notify_all()
+
+    def _execute(self, index: int) -> bool:
+        task, cwd, cache = self.tasks[index], self.cwd, self.cache
+        key = None
+        if cache is not None and task.cache is not None and cwd is not None:
+            key = cache.key(task, cwd)
+            self.results[index].cached = cache.restore(key, cwd)
+            if self.results[index].cached:
+                task.returncode = 0
+                return True
+
+        log_file = None
+        if task.quiet and self.log_dir is not None:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            log_file = self.log_dir / f"{task_name(task, index)}.log"
+            self.results[index].log_file = log_file
+
+        if self.on_start:
+            self.on_start(index, task)
+        output = self.output
+        success = task.execute(
+            cwd=cwd,
+            output=(lambda line: output(index, task, line)) if output else None,
+            timeout=self.timeout,
+            log_file=log_file,
+            stdin=self.serial,
+        )
+
+        if success and key is not None:
+            cache.store(key, cwd, task.cache["outputs"])  # type: ignore
+        return success
+
+    def _cancel_dependents(self, failed: int) -> None:
+        """Cancels all pending tasks that depend on the task `failed`."""
+        stack = [failed]
+        while stack:
+            index = stack.pop()
+            for i in list(self._pending):
+                if index in self.graph[i]:
+                    self._pending.discard(i)
+                    self.results[i].cancelled = True
+                    stack.append(i)
+
+
+def run_tasks(
+    tasks: t.List[Task],
+    cwd: t.Optional[t.Union[str, Path]] = None,
+    jobs: t.Optional[int] = None,
+    on_start: t.Optional[t.Callable[[int, Task], None]] = None,
+    output: t.Optional[t.Callable[[int, Task, str], None]] = None,
+    cache: t.Optional["TaskCache"] = None,
+    timeout: t.Optional[float] = None,
+    log_dir: t.Optional[Path] = None,
+) -> t.List[TaskResult]:
+    """Runs `tasks` and waits for them to finish.
+
+    See [parboil.tasks.TaskRunner][] for details.
+    """
+    runner = TaskRunner(
+        tasks,
+        cwd=cwd,
+        jobs=jobs,
+        on_start=on_start,
+        output=output,
+        cache=cache,
+        timeout=timeout,
+        log_dir=log_dir,
+    )
+    return runner.start().join()
@@ -8,7 +8,7 @@ import pytest
 from click.testing import CliRunner
 
 from parboil.parboil import boil
-from parboil.project import META_FILE
+from parboil.settings import META_FILE
 
 
 def pytest_configure(config):
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import sys
+import tarfile
+import threading
+import zipfile
+
+import pytest
+
+from parboil.api import generate
+from parboil.errors import BoilerError, TaskFailedError
+from parboil.recipes import Repository
+from parboil.sinks import (
+    SMALL_FILE,
+    AtomicDirectorySink,
+    DirectorySink,
+    MemorySink,
+    TarSink,
+    ZipSink,
+    _exchange,
+)
+
+
+@pytest.fixture()
+def api_repo(repo_path):
+    """Create a repository with a small recipe for api tests."""
+    recipe = repo_path / "api"
+    recipe.joinpath("template", "sub").mkdir(parents=True)
+    recipe.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Name": "World",
+                "Lang": ["py", "js"],
+                "_files": {"sub/name.txt": "sub/{{ Name|lower }}.txt"},
+            }
+        )
+    )
+    recipe.joinpath("template", "hello.txt").write_text("Hello {{ Name }}!")
+    recipe.joinpath("template", "sub", "name.txt").write_text("{{ Lang }}")
+    return Repository(repo_path)
+
+
+def test_generate_memory(api_repo):
+    sink = generate("api", {"Name": "Bob"}, repository=api_repo)
+
+    assert isinstance(sink, MemorySink)
+    assert sink.files == {"hello.txt": "Hello Bob!", "sub/bob.txt": "py"}
+
+
+def test_generate_archives(api_repo):
+    buf = io.BytesIO()
+    generate("api", {"Lang": "js"}, ZipSink(buf), repository=api_repo)
+    with zipfile.ZipFile(io.BytesIO(buf.getvalue())) as zf:
+        assert sorted(zf.namelist()) == ["hello.txt", "sub/world.txt"]
+        assert zf.read("sub/world.txt") == b"js"
+
+    buf = io.BytesIO()
+    generate("api", {}, TarSink(buf), repository=api_repo)
+    with tarfile.open(fileobj=io.BytesIO(buf.getvalue())) as tf:
+        assert tf.extractfile("hello.txt").read() == b"Hello World!"
+
+
+def test_generate_directory_keeps_cwd(api_repo, out_path):
+    cwd = os.getcwd()
+    generate("api", {"Name": "Bob"}, DirectorySink(out_path), repository=api_repo)
+
+    assert os.getcwd() == cwd
+    assert out_path.joinpath("hello.txt").read_text() == "Hello Bob!"
+    assert out_path.joinpath("sub", "bob.txt").is_file()
+
+
+def test_generate_tasks(api_repo, out_path):
+    cfg = api_repo.root / "api" / "parboil.json"
+    cfg.write_text(
+        json.dumps({"Name": "World", "_tasks": {"post-run": ["echo task > task.txt"]}})
+    )
+
+    with pytest.raises(BoilerError):
+        generate("api", repository=api_repo)
+
+    sink = generate("api", repository=api_repo, run_tasks=False)
+    assert "hello.txt" in sink.files
+
+    generate("api", sink=DirectorySink(out_path), repository=api_repo)
+    assert out_path.joinpath("task.txt").read_text().strip() == "task"
+
+
+def wait_for_removal():
+    for thread in threading.enumerate():
+        if thread.name.startswith("remove "):
+            thread.join()
+
+
+def test_generate_atomic(api_repo, out_path):
+    out_path = out_path / "project"
+    out_path.mkdir()
+    out_path.joinpath("old.txt").write_text("old")
+    out_path.joinpath("hello.txt").write_text("Hello old!")
+    backup = out_path.parent / "hello.bak"
+    os.link(out_path / "hello.txt", backup)
+
+    sink = AtomicDirectorySink(out_path, fsync="end")
+    assert sink.root.parent == out_path.parent
+    generate("api", {"Name": "Bob"}, sink, repository=api_repo)
+    wait_for_removal()
+
+    assert sink.root == out_path
+    assert sorted(os.listdir(out_path)) == ["hello.txt", "old.txt", "sub"]
+    assert out_path.joinpath("hello.txt").read_text() == "Hello Bob!"
+    # files in the old target are not written through hard links
+    assert backup.read_text() == "Hello old!"
+    assert sorted(os.listdir(out_path.parent)) == ["hello.bak", out_path.name]
+
+    generate("api", sink=AtomicDirectorySink(out_path, clear=True), repository=api_repo)
+    assert sorted(os.listdir(out_path)) == ["hello.txt", "sub"]
+
+
+def test_atomic_keeps_untouched_files(api_repo, out_path):
+    out_path = out_path / "project"
+    out_path.joinpath("docs", "deep").mkdir(parents=True)
+    out_path.joinpath("docs", "deep", "notes.txt").write_text("notes")
+    out_path.joinpath("empty").mkdir()
+    os.symlink("docs/deep/notes.txt", out_path / "notes")
+    inode = os.stat(out_path / "docs" / "deep" / "notes.txt").st_ino
+
+    generate("api", sink=AtomicDirectorySink(out_path), repository=api_repo)
+    wait_for_removal()
+
+    assert sorted(os.listdir(out_path)) == [
+        "docs",
+        "empty",
+        "hello.txt",
+        "notes",
+        "sub",
+    ]
+    assert out_path.joinpath("docs", "deep", "notes.txt").read_text() == "notes"
+    assert os.readlink(out_path / "notes") == "docs/deep/notes.txt"
+    # untouched files are hard linked into the staging directory
+    assert os.stat(out_path / "docs" / "deep" / "notes.txt").st_ino == inode
+
+
+def test_generate_atomic_rollback(api_repo, out_path):
+    cfg = api_repo.root / "api" / "parboil.json"
+    cfg.write_text(json.dumps({"Name": "World", "_tasks": {"post-run": ["exit 1"]}}))
+    out_path = out_path / "project"
+    out_path.mkdir()
+    out_path.joinpath("hello.txt").write_text("Hello old!")
+
+    with pytest.raises(TaskFailedError):
+        generate(
+            "api", sink=AtomicDirectorySink(out_path, clear=True), repository=api_repo
+        )
+    wait_for_removal()
+
+    assert os.listdir(out_path) == ["hello.txt"]
+    assert out_path.joinpath("hello.txt").read_text() == "Hello old!"
+    assert os.listdir(out_path.parent) == [out_path.name]
+
+
+def test_generate_atomic_tasks(api_repo, out_path):
+    cfg = api_repo.root / "api" / "parboil.json"
+    cfg.write_text(
+        json.dumps({"Name": "World", "_tasks": {"post-run": ["echo new >> keep.txt"]}})
+    )
+    out_path = out_path / "project"
+    out_path.mkdir()
+    out_path.joinpath("keep.txt").write_text("old\n")
+    backup = out_path.parent / "keep.bak"
+    os.link(out_path / "keep.txt", backup)
+
+    # tasks change kept files in place, so they are copied
+    sink = AtomicDirectorySink(out_path, link=False)
+    generate("api", sink=sink, repository=api_repo)
+    wait_for_removal()
+    assert out_path.joinpath("keep.txt").read_text() == "old\nnew\n"
+    assert backup.read_text() == "old\n"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="linux only")
+def test_atomic_exchange(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+    a.joinpath("a.txt").touch()
+    b.joinpath("b.txt").touch()
+    assert _exchange(a, b)
+    assert os.listdir(a) == ["b.txt"]
+    assert os.listdir(b) == ["a.txt"]
+
+
+def test_directory_sink_batches(out_path, monkeypatch):
+    out_path.joinpath("a").mkdir()
+    out_path.joinpath("a", "old.txt").write_text("old")
+
+    made = []
+    mkdir = os.mkdir
+    monkeypatch.setattr(
+        os, "mkdir", lambda path, *args: made.append(path) or mkdir(path, *args)
+    )
+
+    sink = DirectorySink(out_path, batch_size=100)
+    for i in range(8):
+        sink.write(f"a/b/{i}.txt", "x" * 20)
+    assert sink.exists("a/old.txt")
+    assert sink.exists("a/b/7.txt")
+    assert not sink.exists("a/new.txt")
+    # the first five files were written as one batch
+    assert sorted(os.listdir(out_path / "a" / "b"))[-1] == "4.txt"
+
+    sink.write("a/b/large.txt", "x" * SMALL_FILE)
+    sink.close()
+    assert len(os.listdir(out_path / "a" / "b")) == 9
+    assert made == [out_path / "a" / "b"]
+    assert not os.stat(out_path / "a" / "b" / "0.txt").st_mode & 0o111
+
+
+def test_generate_pipelined_tasks(api_repo, out_path):
+    cfg = api_repo.root / "api" / "parboil.json"
+    tasks = [
+        {"cmd": "cp hello.txt copy.txt", "files": ["hello.txt"]},
+        {"cmd": "echo started > concurrent.txt", "stage": "concurrent"},
+        "ls > listing.txt",
+    ]
+    cfg.write_text(json.dumps({"Name": "World", "_tasks": {"post-run": tasks}}))
+
+    generate("api", sink=DirectorySink(out_path), repository=api_repo)
+    assert out_path.joinpath("copy.txt").read_text() == "Hello World!"
+    assert out_path.joinpath("concurrent.txt").is_file()
+    assert "hello.txt" in out_path.joinpath("listing.txt").read_text().split()
+
+
+def test_generate_concurrent(api_repo):
+    results = dict()
+
+    def run(name):
+        results[name] = generate("api", {"Name": name}, repository=api_repo)
+
+    threads = [threading.Thread(target=run, args=(f"n{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for name, sink in results.items():
+        assert sink.files["hello.txt"] == f"Hello {name}!"
+        assert f"sub/{name}.txt" in sink.files
@@ -1,5 +1,15 @@
+import hashlib
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
 from click.testing import CliRunner
+
+import parboil.console as console
 from parboil.parboil import boil
+from parboil.settings import MANIFEST_FILE
 
 
 def test_boil_use():
@@ -13,3 +23,283 @@ def test_boil_use():
     result = runner.invoke(boil, ["use", "--help"])
     assert result.exit_code == 0
     assert "Usage: boil use" in result.output
+
+
+@pytest.fixture()
+def archive_repo(repo_path):
+    recipe = repo_path / "archive"
+    recipe.joinpath("template").mkdir(parents=True)
+    recipe.joinpath("parboil.json").write_text(json.dumps({"Name": "World"}))
+    recipe.joinpath("template", "hello.txt").write_text("Hello {{ Name }}!")
+    return repo_path
+
+
+def test_boil_use_stdout(monkeypatch, boil_runner, archive_repo, tmp_path):
+    monkeypatch.setattr(console.out, "stderr", False)
+    monkeypatch.chdir(tmp_path)
+
+    # stdout needs a format
+    result = boil_runner("--repo", str(archive_repo), "use", "archive", "-")
+    assert result.exit_code == 2
+
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", "-", "--format", "tar",
+        "-v", "Name", "Bob",
+    )
+    assert result.exit_code == 0
+    with tarfile.open(fileobj=io.BytesIO(result.stdout_bytes)) as tf:
+        assert tf.getnames() == ["hello.txt"]
+        assert tf.extractfile("hello.txt").read() == b"Hello Bob!"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["home", "repository"]
+
+
+def test_boil_use_archive_tasks(monkeypatch, boil_runner, archive_repo, tmp_path):
+    monkeypatch.setattr(console.out, "stderr", False)
+    cfg = archive_repo / "archive" / "parboil.json"
+    cfg.write_text(json.dumps({"Name": "World", "_tasks": {"post-run": ["touch x"]}}))
+    out = tmp_path / "out.zip"
+
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", str(out), "--format", "zip"
+    )
+    assert result.exit_code == 1
+    assert "--skip-tasks" in result.output
+
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", str(out), "--format", "zip",
+        "--skip-tasks", "-v", "Name", "Bob",
+    )
+    assert result.exit_code == 0
+    with zipfile.ZipFile(out) as zf:
+        assert zf.namelist() == ["hello.txt"]
+
+
+def test_boil_use_atomic(boil_runner, archive_repo, tmp_path):
+    cfg = archive_repo / "archive" / "parboil.json"
+    out = tmp_path / "out"
+    out.mkdir()
+    out.joinpath("old.txt").write_text("old")
+
+    cfg.write_text(json.dumps({"Name": "World", "_tasks": {"post-run": ["exit 3"]}}))
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", str(out), "--no-input",
+        "--atomic", "--hard", "--fsync", "end",
+    )
+    assert result.exit_code == 1
+    assert [p.name for p in out.iterdir()] == ["old.txt"]
+
+    cfg.write_text(json.dumps({"Name": "World"}))
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", str(out), "--no-input",
+        "--atomic", "--hard", "--fsync", "file",
+    )
+    assert result.exit_code == 0
+    assert [p.name for p in out.iterdir()] == ["hello.txt"]
+
+
+def test_boil_use_plan(monkeypatch, boil_runner, archive_repo, tmp_path):
+    monkeypatch.setattr(console.out, "stderr", False)
+    recipe = archive_repo / "archive"
+    templates = {
+        "maybe.txt": "{% if Flag %}flag{% endif %}",
+        "static.txt": "{% if Flag %}flag{% endif %}\nAlways here",
+        "base.txt": "{% block body %}{% endblock %}",
+        "child.txt": '{% extends "base.txt" %}Not rendered',
+        "keep.txt": "{{ Name }}",
+        "exists.txt": "{{ Name }}",
+    }
+    for name, content in templates.items():
+        recipe.joinpath("template", name).write_text(content)
+    recipe.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Name": "World",
+                "Flag": False,
+                "_files": {
+                    "keep.txt": {"keep": True},
+                    "exists.txt": {"overwrite": False},
+                    "base.txt": {"exclude": True},
+                },
+                "_tasks": {"post-run": ["touch task.txt"]},
+            }
+        )
+    )
+    out = tmp_path / "out"
+    out.mkdir()
+    out.joinpath("exists.txt").write_text("old")
+    out.joinpath("hello.txt").write_text("old")
+
+    renders = []
+    monkeypatch.setattr(
+        "parboil.renderer.ParboilRenderer.render_file",
+        lambda self, name, **kwargs: renders.append(str(name)) or "",
+    )
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", str(out), "--plan",
+        "--no-input",
+    )
+    assert result.exit_code == 0
+    manifest = json.loads(result.stdout)
+
+    files = {entry["source"]: entry for entry in manifest["files"]}
+    assert {name: (f["action"], f["reason"]) for name, f in files.items()} == {
+        "hello.txt": ("overwrite", None),
+        "maybe.txt": ("skip", "empty"),
+        "static.txt": ("create", None),
+        "child.txt": ("skip", "empty"),
+        "keep.txt": ("create", None),
+        "exists.txt": ("skip", "exists"),
+    }
+    # excluded files are never listed
+    assert "base.txt" not in files
+    assert files["static.txt"]["estimated"]
+    assert sorted(renders) == ["child.txt", "maybe.txt"]
+    assert manifest["summary"] == {"create": 2, "overwrite": 1, "skip": 3}
+    assert manifest["tasks"] == {"pre-run": 0, "post-run": 1}
+    assert sorted(p.name for p in out.iterdir()) == ["exists.txt", "hello.txt"]
+    assert out.joinpath("hello.txt").read_text() == "old"
+
+
+def test_boil_use_diff(monkeypatch, boil_runner, archive_repo, tmp_path):
+    monkeypatch.setattr(console.out, "stderr", False)
+    recipe = archive_repo / "archive"
+    # jinja removes a single trailing newline
+    recipe.joinpath("template", "same.txt").write_text("same\n")
+    recipe.joinpath("template", "new.txt").write_text("new")
+    out = tmp_path / "out"
+    out.joinpath("build").mkdir(parents=True)
+    out.joinpath("hello.txt").write_text("Hello World!\nBye\n")
+    out.joinpath("same.txt").write_text("same")
+    out.joinpath("old.txt").write_text("old\n")
+    out.joinpath("build", "x.o").write_bytes(b"\x00")
+    out.joinpath(".git").mkdir()
+    out.joinpath(".git", "HEAD").write_text("ref: refs/heads/main\n")
+    # only files in the manifest are reported as removed by default
+    out.joinpath(MANIFEST_FILE).write_text(
+        json.dumps({"files": {"old.txt": {}, "gone.txt": {}, "same.txt": {}}})
+    )
+
+    args = ["--repo", str(archive_repo), "use", "archive", str(out), "--diff"]
+    result = boil_runner(*args, "--diff-format", "json", "--no-input")
+    assert result.exit_code == 1
+    assert json.loads(result.stdout) == {
+        "target": str(out),
+        "added": ["new.txt"],
+        "changed": ["hello.txt"],
+        "removed": ["old.txt"],
+        "identical": ["same.txt"],
+    }
+
+    result = boil_runner(
+        *args, "--diff-format", "json", "--diff-untracked", "--no-input"
+    )
+    assert json.loads(result.stdout)["removed"] == ["build/x.o", "old.txt"]
+
+    result = boil_runner(*args, "--diff-untracked", "-v", "Name", "Bob")
+    assert result.exit_code == 1
+    assert result.stdout.splitlines()[:9] == [
+        "Binary files a/build/x.o and /dev/null differ",
+        "--- a/hello.txt",
+        "+++ b/hello.txt",
+        "@@ -1,2 +1 @@",
+        "-Hello World!",
+        "-Bye",
+        "+Hello Bob!",
+        "\\ No newline at end of file",
+        "--- /dev/null",
+    ]
+    assert "+++ b/new.txt" in result.stdout
+    assert "+++ /dev/null" in result.stdout
+    assert sorted(p.name for p in out.iterdir()) == [
+        ".git",
+        MANIFEST_FILE,
+        "build",
+        "hello.txt",
+        "old.txt",
+        "same.txt",
+    ]
+
+
+def test_boil_use_manifest(monkeypatch, boil_runner, archive_repo, tmp_path):
+    monkeypatch.setattr(console.out, "stderr", False)
+    recipe = archive_repo / "archive"
+    recipe.joinpath("template", "large.bin").write_bytes(b"\x01" * (2 << 20))
+    recipe.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Name": "World",
+                "_settings": {"version": "1.2"},
+                "_files": {"large.bin": {"render": False}},
+            }
+        )
+    )
+    out = tmp_path / "out"
+
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", str(out), "--no-input",
+        "--manifest", "-v", "Name", "Bob",
+    )
+    assert result.exit_code == 0
+    manifest = json.loads(out.joinpath(".parboil-manifest.json").read_text())
+    assert manifest["recipe"] == "archive"
+    assert manifest["version"] == "1.2"
+    assert manifest["files"]["hello.txt"] == {
+        "sha256": hashlib.sha256(b"Hello Bob!").hexdigest(),
+        "size": 10,
+    }
+
+    result = boil_runner("verify", str(out), "--json")
+    assert result.exit_code == 0
+    assert json.loads(result.stdout)["verified"] == ["hello.txt", "large.bin"]
+
+    out.joinpath("hello.txt").write_text("Hello Eve!")
+    out.joinpath("large.bin").unlink()
+    result = boil_runner("verify", str(out), "--json", "--jobs", "2")
+    assert result.exit_code == 1
+    assert json.loads(result.stdout)["changed"] == ["hello.txt"]
+    assert json.loads(result.stdout)["missing"] == ["large.bin"]
+
+    assert boil_runner("verify", str(tmp_path)).exit_code == 2
+
+
+@pytest.mark.parametrize("archive_format", ["tgz", "zip"])
+def test_boil_use_reproducible(
+    monkeypatch, boil_runner, archive_repo, tmp_path, archive_format
+):
+    monkeypatch.setattr(console.out, "stderr", False)
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1600000000")
+    recipe = archive_repo / "archive"
+    for name in ("b.txt", "a/z.txt", "a/c.txt"):
+        path = recipe / "template" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+
+    def generate():
+        result = boil_runner(
+            "--repo", str(archive_repo), "use", "archive", "-", "--no-input",
+            "--format", archive_format, "--reproducible",
+        )
+        assert result.exit_code == 0
+        return result.stdout_bytes
+
+    first = generate()
+    monkeypatch.setattr("time.time", lambda: 1700000000.0)
+    assert generate() == first
+
+    out = tmp_path / "out" / "project"
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", str(out), "--no-input",
+        "--reproducible",
+    )
+    assert result.exit_code == 0
+    for path in [out, *out.rglob("*")]:
+        stat = path.stat()
+        assert stat.st_mtime == 0
+        assert stat.st_mode & 0o777 == (0o755 if path.is_dir() else 0o644)
+
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "yesterday")
+    result = boil_runner(
+        "--repo", str(archive_repo), "use", "archive", str(out), "--reproducible"
+    )
+    assert result.exit_code == 2
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+import parboil.data
+from parboil.data import DataContext, Records, load_data
+from parboil.errors import DataFileError
+from parboil.recipes import Boiler, Recipe
+from parboil.sinks import MemorySink
+
+
+@pytest.fixture()
+def data_recipe(repo_path):
+    recipe_dir = repo_path / "data"
+    files = {
+        "template/services.txt": "{% for s in services %}{{ s.name }} {% endfor %}",
+        "template/regions.txt": "{{ regions|length }}: "
+        "{% for r in regions %}{{ r.code }}={{ r.name }} {% endfor %}",
+        "template/event.txt": "{{ item.id }}",
+        "data/services.json": json.dumps([{"name": "api"}, {"name": "web"}]),
+        "data/regions.csv": '\ufeffcode,name\neu,"Europe,\nWest"\nus,America\n',
+        "data/events.jsonl": '{"id": 1}\n\n{"id": 2}\n',
+        "data/unused.json": "not json",
+    }
+    for name, content in files.items():
+        path = recipe_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Events": "events",
+                "_context": {
+                    "services": "data:services.json",
+                    "regions": "data:regions.csv",
+                    "events": "data:{{ Events }}.jsonl",
+                    "unused": "data:unused.json",
+                },
+                "_files": {
+                    "event.txt": {"foreach": "events", "filename": "{{ item.id }}.txt"}
+                },
+            }
+        )
+    )
+    return Recipe("data", repo_path, load=True)
+
+
+def test_data_context(data_recipe, tmp_path, monkeypatch):
+    monkeypatch.setattr(parboil.data, "_parsed", dict())
+    cache_dir = tmp_path / "cache"
+
+    def generate():
+        boiler = Boiler(
+            data_recipe.copy(),
+            tmp_path / "out",
+            dict(),
+            sink=MemorySink(),
+            data_cache=cache_dir,
+        )
+        boiler.interactive = False
+        boiler.fill()
+        list(boiler.compile())
+        return boiler
+
+    boiler = generate()
+    assert boiler.sink.files == {
+        "services.txt": "api web ",
+        "regions.txt": "2: eu=Europe,\nWest us=America ",
+        "1.txt": "1",
+        "2.txt": "2",
+    }
+    # unused data files are not even bound
+    assert "unused" not in boiler.context
+    assert isinstance(boiler.context["regions"], Records)
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # later runs load the cached data instead of parsing the file
+    monkeypatch.setattr(parboil.data, "_parsed", dict())
+    monkeypatch.setattr(json, "load", None)
+    assert generate().sink.files["services.txt"] == "api web "
+
+
+def test_load_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(parboil.data, "_parsed", dict())
+    path = tmp_path / "data.json"
+    path.write_text('{"a": 1}')
+    data = load_data(path)
+    assert data == {"a": 1}
+    assert load_data(path) is data
+
+    # changed files are parsed again
+    path.write_text('{"a": 22}')
+    assert load_data(path) == {"a": 22}
+
+    rows = tmp_path / "rows.csv"
+    rows.write_text("")
+    assert list(load_data(rows)) == []
+
+    path.write_text("not json")
+    with pytest.raises(DataFileError):
+        load_data(path)
+    with pytest.raises(DataFileError):
+        load_data(tmp_path / "data.xml")
+    with pytest.raises(DataFileError):
+        load_data(tmp_path / "missing.json")
+
+    context = DataContext(dict(rows=rows))
+    assert "rows" in context and list(context) == ["rows"]
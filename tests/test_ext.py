@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from parboil.ext import (
+    jinja_filter_fileify,
+    jinja_filter_roman,
+    jinja_filter_slugify,
+    memoize,
+)
+from parboil.recipes import Recipe
+from parboil.renderer import create_environment
+
+
+@pytest.mark.parametrize(
+    "value,args,expected",
+    [
+        ("My Project", (), "My_Project"),
+        (" Übung für Größen ", (), "Ubung_fuer_Groessen"),
+        ("Café Crème", ("-",), "Cafe-Creme"),
+        ("a b", ("_", {"a": "b", "b": "c"}), "c_c"),
+        (42, (), "42"),
+    ],
+)
+def test_fileify(value, args, expected):
+    assert jinja_filter_fileify(value, *args) == expected
+
+
+@pytest.mark.parametrize(
+    "value,allow_unicode,expected",
+    [
+        ("Hello, World!", False, "hello-world"),
+        ("  --Foo _ Bar--  ", False, "foo-_-bar"),
+        ("Café Crème", False, "cafe-creme"),
+        ("Straße in Köln", True, "straße-in-köln"),
+        ("a\t-\nb", False, "a-b"),
+    ],
+)
+def test_slugify(value, allow_unicode, expected):
+    assert jinja_filter_slugify(value, allow_unicode) == expected
+
+
+def test_roman():
+    assert jinja_filter_roman(1994) == "MCMXCIV"
+    assert jinja_filter_roman(3888) == "MMMDCCCLXXXVIII"
+    assert jinja_filter_roman(0) == "0"
+    assert jinja_filter_roman("x") == "x"
+
+
+def test_memoize():
+    calls = []
+
+    def upper(value, suffix=""):
+        calls.append(value)
+        return str(value).upper() + suffix
+
+    cached = memoize(upper)
+    assert cached("a") == "A"
+    assert cached("a") == "A"
+    assert cached(1) == "1"
+    assert cached(1.0) == "1.0"
+    assert calls == ["a", 1, 1.0]
+
+    # unhashable arguments are not cached
+    assert cached(["a"], suffix="!") == "['A']!"
+    assert cached(["a"], suffix="!") == "['A']!"
+    assert len(calls) == 5
+
+
+@pytest.mark.parametrize(
+    "settings,memoize_filters,memoized",
+    [
+        ({}, None, True),
+        ({"memoize_filters": False}, None, False),
+        ({}, False, False),
+        ({"memoize_filters": False}, True, True),
+    ],
+)
+def test_memoize_filters(repo_path, settings, memoize_filters, memoized):
+    recipe_dir = repo_path / "filters"
+    recipe_dir.joinpath("template").mkdir(parents=True)
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps({"Name": "World", "_settings": settings})
+    )
+    recipe = Recipe("filters", repo_path, load=True)
+
+    env = create_environment(recipe, memoize_filters=memoize_filters)
+    for name in ("fileify", "slugify", "roman"):
+        assert hasattr(env.filters[name], "cache_info") == memoized
+    template = env.from_string("{{ 'My Name'|slugify }} {{ 'My Name'|fileify }}")
+    assert template.render() == "my-name My_Name"
+    assert env.from_string("{{ 12|roman }}").render() == "XII"
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+from jinja2 import TemplateSyntaxError, UndefinedError
+
+from parboil.errors import ProjectConfigError
+from parboil.recipes import Boiler, Recipe
+from parboil.sinks import MemorySink
+
+
+@pytest.fixture()
+def recipe(repo_path):
+    recipe_dir = repo_path / "ingredients"
+    recipe_dir.joinpath("template").mkdir(parents=True)
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Name": "World",
+                "Flag": False,
+                "Lang": ["py", "js"],
+                "Upper": {
+                    "default": "{{ Name|upper }}",
+                    "help": "Uppercase name",
+                    "condition": "{{ Flag }}",
+                },
+                "Python": {"default": "3", "condition": "Lang == 'py'"},
+                "Always": {"default": "yes", "condition": "yes"},
+                "Unused": "nobody",
+            }
+        )
+    )
+    recipe_dir.joinpath("template", "out.txt").write_text(
+        "{{ Name }} {{ Upper }} {{ Python }} {{ Always }}"
+    )
+    return Recipe("ingredients", repo_path, load=True)
+
+
+def make_boiler(recipe, **prefilled):
+    return Boiler(recipe, recipe.root, prefilled, sink=MemorySink(), interactive=False)
+
+
+def test_template_cache(recipe):
+    cache = recipe.template_cache
+
+    assert cache.template("no syntax") is None
+    tpl = cache.template("{{ Name|upper }}")
+    assert tpl is not None
+    assert cache.template("{{ Name|upper }}") is tpl
+
+
+def test_precompiled_fill(recipe, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("template compiled during fill")
+
+    monkeypatch.setattr(recipe.environment, "from_string", fail)
+    monkeypatch.setattr(recipe.environment, "compile_expression", fail)
+
+    boiler = make_boiler(recipe, Flag="yes")
+    boiler.fill()
+
+    assert boiler.context["Upper"] == "WORLD"
+    assert boiler.context["Python"] == "3"
+    assert boiler.context["Always"] == "yes"
+
+
+def test_conditions(recipe):
+    boiler = make_boiler(recipe)
+    boiler.fill()
+    assert "Upper" not in boiler.context
+
+    boiler = make_boiler(recipe.copy(), Flag="no", Lang="js")
+    boiler.fill()
+    assert "Upper" not in boiler.context
+    assert "Python" not in boiler.context
+
+    renderer = boiler.renderer
+    assert renderer.eval_condition(None)
+    assert renderer.eval_condition(True)
+    assert not renderer.eval_condition(0)
+    assert renderer.eval_condition("Lang == 'js' and not Flag|bool")
+    assert renderer.eval_condition("{{ Lang }}-x == 'js-x'") is False
+    assert renderer.eval_condition("{% if Lang == 'js' %}yes{% endif %}")
+    assert not renderer.eval_condition("Unknown")
+
+    # expressions can't contain statements
+    with pytest.raises(TemplateSyntaxError, match=r"unexpected '\)'"):
+        renderer.eval_condition("{{ Flag) %}{% set x = (1 }}")
+    with pytest.raises(TemplateSyntaxError, match="unexpected '}'"):
+        renderer.eval_items("Lang %}{% set x = 1")
+
+
+def test_unused_ingredients(recipe):
+    usage = recipe.usage
+    assert not usage.dynamic
+    assert usage.needed() == {"Name", "Flag", "Lang", "Upper", "Python", "Always"}
+    assert usage.dead(["Name", "Unused"]) == ["Unused"]
+    assert usage.consumers["Flag"] == {"ingredient:Upper"}
+    assert "template:out.txt" in usage.consumers["Name"]
+
+
+def test_usage_includes(repo_path):
+    recipe_dir = repo_path / "includes"
+    recipe_dir.joinpath("template").mkdir(parents=True)
+    recipe_dir.joinpath("includes").mkdir()
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps({"A": "a", "B": "b", "Part": "p", "Unused": "u"})
+    )
+    recipe_dir.joinpath("includes", "part.txt").write_text("{{ Part }}")
+    for name in ("A", "B"):
+        recipe_dir.joinpath("template", f"{name}.txt").write_text(
+            f'{{% include "includes:part.txt" %}} {{{{ {name} }}}}'
+        )
+    recipe = Recipe("includes", repo_path, load=True)
+    assert not recipe.usage.dynamic
+    assert recipe.usage.needed() == {"A", "B", "Part"}
+
+
+def test_lazy_fill(recipe, monkeypatch):
+    boiler = make_boiler(recipe)
+    boiler.fill()
+    assert "Unused" not in boiler.context
+
+    # interactive runs ask for all ingredients
+    def use_default(ingredient, boiler):
+        ingredient._use_default(boiler)
+
+    for cls in ("Ingredient", "ConfirmIngredient", "ChoiceIngredient"):
+        monkeypatch.setattr(f"parboil.ingredients.{cls}._prompt", use_default)
+    boiler = make_boiler(recipe.copy())
+    boiler.interactive = True
+    boiler.fill()
+    assert boiler.context["Unused"] == "nobody"
+
+
+def test_lazy_fill_prefilled_templates(repo_path):
+    recipe_dir = repo_path / "prefilled"
+    recipe_dir.joinpath("template").mkdir(parents=True)
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps({"Name": "alpha", "Slug": "x", "Unused": "nobody"})
+    )
+    recipe_dir.joinpath("template", "out.txt").write_text("Slug: {{ Slug }}")
+    recipe = Recipe("prefilled", repo_path, load=True)
+    assert recipe.usage.needed() == {"Slug"}
+
+    # prefilled values may use otherwise unused ingredients
+    boiler = make_boiler(recipe, Slug="{{ Name }}-lib")
+    boiler.fill()
+    assert boiler.context["Slug"] == "alpha-lib"
+    assert "Unused" not in boiler.context
+
+    boiler = make_boiler(recipe.copy(), Slug="{{ BOILER.context.Name }}")
+    boiler.fill()
+    assert boiler.context["Slug"] == "alpha"
+
+
+def test_lazy_fill_order(repo_path):
+    recipe_dir = repo_path / "order"
+    recipe_dir.joinpath("template").mkdir(parents=True)
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Greeting": "Hello {{ Name }}!",
+                "Slug": "{{ Name|lower }}",
+                "Name": "World",
+            }
+        )
+    )
+    recipe_dir.joinpath("template", "out.txt").write_text("{{ Greeting }} {{ Slug }}")
+    recipe = Recipe("order", repo_path, load=True)
+    assert recipe.usage.order(["Greeting", "Slug", "Name"]) == [
+        "Name",
+        "Greeting",
+        "Slug",
+    ]
+
+    # ingredients are evaluated after the ingredients they use
+    boiler = make_boiler(recipe)
+    boiler.fill()
+    assert boiler.context["Greeting"] == "Hello World!"
+    assert boiler.context["Slug"] == "world"
+
+    # prefilled values may use later ingredients, too
+    boiler = make_boiler(recipe.copy(), Greeting="Hi {{ Slug }}")
+    boiler.fill()
+    assert boiler.context["Greeting"] == "Hi world"
+
+    with pytest.raises(ProjectConfigError, match="cyclic"):
+        make_boiler(recipe.copy(), Name="{{ Greeting }}").fill()
+
+
+def test_render_context(recipe, monkeypatch):
+    boiler = make_boiler(recipe)
+    renderer = boiler.renderer
+
+    # values filled after the renderer was created are seen
+    boiler.context["Late"] = "late"
+    assert renderer.render_string("{{ Late }}") == "late"
+    assert renderer.eval_condition("Late == 'late'")
+
+    boil = {"FILENAME": "a.txt"}
+    assert (
+        renderer.render_string("{{ BOIL.FILENAME }} {{ BOIL.TPLNAME }}", BOIL=boil)
+        == "a.txt ingredients"
+    )
+    assert boil == {"FILENAME": "a.txt"}
+    assert renderer.render_string("{{ BOIL.TPLNAME }}") == "ingredients"
+
+    monkeypatch.setenv("PARBOIL_TEST", "env")
+    assert renderer.render_string("{{ ENV.PARBOIL_TEST }}") == "env"
+    # ENV is read-only
+    with pytest.raises(UndefinedError):
+        renderer.render_string("{{ ENV.pop('PARBOIL_TEST') }}")
+    assert renderer.render_string("{{ range(3)|list }}") == "[0, 1, 2]"
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+
+import json
+import re
+import types
+from pathlib import Path
+
+import pytest
+
+from parboil.errors import BoilerError, PathCollisionError
+from parboil.paths import ConditionalDir, PathRules, glob_to_regex
+from parboil.recipes import Boiler, Recipe
+from parboil.sinks import MemorySink
+
+
+@pytest.mark.parametrize(
+    "pattern,path,matches",
+    [
+        ("**/.DS_Store", ".DS_Store", True),
+        ("**/.DS_Store", "a/b/.DS_Store", True),
+        ("*.txt", "b.txt", True),
+        ("*.txt", "a/b.txt", False),
+        ("build/**", "build", True),
+        ("build/**", "build/x/y.txt", True),
+        ("src/**/*.py", "src/a/b/x.py", True),
+        ("src/**/*.py", "src/x.py", True),
+        ("[!a]?", "bc", True),
+        ("[!a]?", "ab", False),
+        ("node_modules", "node_modules/pkg/index.js", True),
+    ],
+)
+def test_glob_to_regex(pattern, path, matches):
+    assert bool(re.fullmatch(glob_to_regex(pattern), path)) is matches
+
+
+def test_path_rules():
+    files = {
+        "**/*.tpl": {"render": False},
+        "docs/*": {"filename": "doc/{{ BOIL.FILENAME }}"},
+        "a.tpl": {"filename": "b.tpl"},
+        "cache/**": {"exclude": True},
+    }
+    rules = PathRules(files, ["**/.DS_Store"])
+
+    assert rules.config("x/y.tpl") == {"render": False}
+    assert rules.config("a.tpl") == {"render": False, "filename": "b.tpl"}
+    # the first matching pattern wins
+    assert rules.config("docs/x.tpl") == {"render": False}
+    assert rules.config("README.md") == dict()
+
+    assert rules.excluded("cache")
+    assert rules.excluded("sub/.DS_Store")
+    assert not rules.excluded("a.tpl")
+
+    # exact entries added later are found
+    files["new.txt"] = {"exclude": True}
+    assert rules.excluded("new.txt")
+
+
+def test_prune_excluded(repo_path, monkeypatch):
+    recipe_dir = repo_path / "rules"
+    for name in ("keep.txt", "raw.txt", "node_modules/pkg/index.js", ".DS_Store"):
+        path = recipe_dir / "template" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("{{ Name }}")
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Name": "World",
+                "_files": {
+                    "raw*": {"render": False},
+                    "node_modules": {"exclude": True},
+                },
+            }
+        )
+    )
+
+    walked = []
+    excluded = PathRules.excluded
+
+    def record(self, path):
+        walked.append(path)
+        return excluded(self, path)
+
+    monkeypatch.setattr(PathRules, "excluded", record)
+
+    recipe = Recipe("rules", repo_path)
+    recipe.excludes.append("**/.DS_Store")
+    recipe.load()
+    # the template directory is read lazily
+    assert walked == []
+
+    templates = [str(path) for path in recipe.walk_templates()]
+    assert templates == ["keep.txt", "raw.txt"]
+    assert "node_modules" in walked
+    assert "node_modules/pkg" not in walked
+
+    boiler = Boiler(recipe, recipe.root, dict(), sink=MemorySink(), interactive=False)
+    boiler.fill()
+    list(boiler.compile())
+    assert boiler.sink.files == {"keep.txt": "World", "raw.txt": "{{ Name }}"}
+
+
+@pytest.fixture()
+def conditional_recipe(repo_path):
+    recipe_dir = repo_path / "conditional"
+    files = {
+        "README.md": "{{ Name }}",
+        "docs/index.md": "Docs for {{ Name }}",
+        "docs/.parboil-if": "{{ Docs }}",
+        "docs/api/ref.md": "Reference",
+        "tests/test_a.py": "pass",
+        "ci.yml": "ci",
+    }
+    for name, content in files.items():
+        path = recipe_dir / "template" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Name": "World",
+                "Docs": False,
+                "Tests": True,
+                "CI": False,
+                "_files": {
+                    "tests": {"condition": "Tests"},
+                    "ci.yml": {"condition": "CI"},
+                },
+            }
+        )
+    )
+    return Recipe("conditional", repo_path, load=True)
+
+
+def test_conditional_dirs(conditional_recipe):
+    templates = list(conditional_recipe.walk_templates())
+    conditions = {
+        str(_file.path): _file.condition
+        for _file in templates
+        if isinstance(_file, ConditionalDir)
+    }
+    assert conditions == {"docs": "{{ Docs }}", "tests": "Tests"}
+    assert "docs/index.md" not in [str(f) for f in templates]
+    assert {"Docs", "Tests", "CI"} <= conditional_recipe.usage.needed()
+
+    def generate(**prefilled):
+        boiler = Boiler(
+            conditional_recipe.copy(),
+            conditional_recipe.root,
+            prefilled,
+            sink=MemorySink(),
+            interactive=False,
+        )
+        boiler.fill()
+        list(boiler.compile())
+        return sorted(boiler.sink.files)
+
+    assert generate() == ["README.md", "tests/test_a.py"]
+    assert generate(Docs="yes", Tests="no", CI="yes") == [
+        "README.md",
+        "ci.yml",
+        "docs/api/ref.md",
+        "docs/index.md",
+    ]
+
+
+def test_plan_files(repo_path, monkeypatch):
+    recipe_dir = repo_path / "plan"
+    for name in ("a.txt", "sub/b.txt", "sub/c.txt", "d.txt"):
+        path = recipe_dir / "template" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Name": "World",
+                "_files": {
+                    "sub/*.txt": "{{ BOIL.RELDIR }}/{{ Name }}-{{ BOIL.OUTNAME }}",
+                    "d.txt": "{{ Name|lower }}.txt",
+                },
+            }
+        )
+    )
+    recipe = Recipe("plan", repo_path, load=True)
+    boiler = Boiler(recipe, repo_path / "out", dict(), sink=MemorySink())
+    boiler.interactive = False
+    boiler.fill()
+
+    compiled = []
+    from_string = recipe.environment.from_string
+    monkeypatch.setattr(
+        recipe.environment,
+        "from_string",
+        lambda source, *args: compiled.append(source) or from_string(source, *args),
+    )
+    plan = {str(p.source): p.target for p in boiler.plan_files()}
+    assert plan == {
+        "a.txt": "a.txt",
+        "sub/b.txt": "sub/World-out",
+        "sub/c.txt": "sub/World-out",
+        "d.txt": "world.txt",
+    }
+    # each filename pattern is compiled once per recipe
+    list(boiler.plan_files())
+    assert sorted(compiled) == [
+        "{{ BOIL.RELDIR }}/{{ Name }}-{{ BOIL.OUTNAME }}",
+        "{{ Name|lower }}.txt",
+    ]
+
+    # collisions are found before any file is written
+    with pytest.raises(PathCollisionError) as e:
+        next(boiler.compile())
+    assert e.value.path == "sub/World-out"
+    assert boiler.sink.files == {}
+
+
+def test_plan_filename_error(repo_path):
+    recipe_dir = repo_path / "broken"
+    for name in ("a.txt", "b.txt", "c.txt"):
+        path = recipe_dir / "template" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Name": "World",
+                "_files": {"a.txt": "{{ Name }}.txt", "b.txt": "{{ Name }.txt"},
+            }
+        )
+    )
+    recipe = Recipe("broken", repo_path, load=True)
+    boiler = Boiler(recipe, repo_path / "out", dict(), sink=MemorySink())
+    boiler.interactive = False
+    boiler.fill()
+
+    # the error names the template, whose output path is broken
+    with pytest.raises(BoilerError, match="output path of b.txt"):
+        list(boiler.plan_files())
+
+
+def test_plan_chunks(repo_path, monkeypatch):
+    monkeypatch.setattr("parboil.recipes.PLAN_CHUNK", 2)
+    recipe_dir = repo_path / "chunks"
+    for i in range(5):
+        path = recipe_dir / "template" / f"{{{{ Name }}}}{i}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(str(i))
+    recipe_dir.joinpath("template", "a.txt").write_text("")
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps({"Name": "x", "_files": {"a.txt": "x4.txt"}})
+    )
+    recipe = Recipe("chunks", repo_path, load=True)
+    boiler = Boiler(recipe, repo_path / "out", dict(), sink=MemorySink())
+    boiler.interactive = False
+    boiler.fill()
+
+    plan = boiler.plan_files()
+    # the template directory is read while the plan is consumed
+    assert isinstance(plan, types.GeneratorType)
+    assert [p.target for p in plan] == ["x4.txt", *(f"x{i}.txt" for i in range(5))]
+
+    # the empty a.txt shares its path with x4.txt
+    assert sum(success for success, _, _ in boiler.compile()) == 5
+    assert boiler.sink.files["x4.txt"] == "4"
+
+    # collisions with files of earlier chunks are found, too
+    recipe_dir.joinpath("template", "a.txt").write_text("a")
+    boiler = Boiler(recipe, repo_path / "out", dict(), sink=MemorySink())
+    boiler.interactive = False
+    boiler.fill()
+    with pytest.raises(PathCollisionError) as e:
+        list(boiler.compile())
+    assert e.value.sources == [Path("a.txt"), Path("{{ Name }}4.txt")]
+
+
+def test_compile_plans_once(repo_path, monkeypatch):
+    monkeypatch.setattr("parboil.recipes.PLAN_CHUNK", 2)
+    recipe_dir = repo_path / "once"
+    for i in range(5):
+        path = recipe_dir / "template" / f"{{{{ Name }}}}{i}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(str(i))
+    recipe_dir.joinpath("parboil.json").write_text(json.dumps({"Name": "x"}))
+    recipe = Recipe("once", repo_path, load=True)
+    boiler = Boiler(recipe, repo_path / "out", dict(), sink=MemorySink())
+    boiler.interactive = False
+    boiler.fill()
+
+    walks, planned = [], []
+    walk = recipe.rules.walk
+    monkeypatch.setattr(
+        recipe.rules, "walk", lambda *args: walks.append(args) or walk(*args)
+    )
+    render_targets = Boiler._render_targets
+    monkeypatch.setattr(
+        Boiler,
+        "_render_targets",
+        lambda self, chunk: planned.extend(chunk) or render_targets(self, chunk),
+    )
+    assert sum(success for success, _, _ in boiler.compile()) == 5
+    # the template directory is read and each output path rendered once
+    assert len(walks) == 1
+    assert len(planned) == 5
+
+
+def test_foreach(repo_path, monkeypatch):
+    recipe_dir = repo_path / "foreach"
+    files = {
+        "service.py": "# {{ service }} {{ BOIL.INDEX }} {{ BOIL.FILENAME }}",
+        "region.txt": "{{ item }}",
+    }
+    for name, content in files.items():
+        path = recipe_dir / "template" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    recipe_dir.joinpath("parboil.json").write_text(
+        json.dumps(
+            {
+                "Regions": "eu",
+                "_context": {"services": ["Api", "Web", "legacy"]},
+                "_files": {
+                    "service.py": {
+                        "foreach": "services",
+                        "as": "service",
+                        "filename": "services/{{ service|lower }}.py",
+                        "condition": "service != 'legacy'",
+                    },
+                    "region.txt": {
+                        "foreach": "Regions",
+                        "filename": "{{ item }}/{{ Regions|length }}.txt",
+                    },
+                },
+            }
+        )
+    )
+    recipe = Recipe("foreach", repo_path, load=True)
+    assert {"services", "Regions"} <= recipe.usage.needed()
+
+    compiled = []
+    from_string = recipe.environment.from_string
+    monkeypatch.setattr(
+        recipe.environment,
+        "from_string",
+        lambda source, *args: compiled.append(source) or from_string(source, *args),
+    )
+
+    boiler = Boiler(
+        recipe, repo_path / "out", dict(Regions="eu, us"), sink=MemorySink()
+    )
+    boiler.interactive = False
+    boiler.fill()
+    list(boiler.compile())
+    assert boiler.sink.files == {
+        "services/api.py": "# Api 0 api.py",
+        "services/web.py": "# Web 1 web.py",
+        "eu/6.txt": "eu",
+        "us/6.txt": "us",
+    }
+    # each filename pattern is compiled once for all items
+    assert compiled.count("services/{{ service|lower }}.py") == 1
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import Environment, TemplateAssertionError
+
+from parboil import plugins
+from parboil.plugins import ANSIBLE_FILTERS, create_filters, create_tests
+
+
+@pytest.fixture()
+def env(monkeypatch):
+    def entry_points(group):
+        if group == plugins.FILTERS_GROUP:
+            return [
+                SimpleNamespace(name="shout", load=lambda: lambda s: f"{s}!"),
+                SimpleNamespace(name="upper", load=lambda: lambda s: "clobbered"),
+            ]
+        return [SimpleNamespace(name="short", load=lambda: lambda s: len(s) < 4)]
+
+    monkeypatch.setattr(plugins, "entry_points", entry_points)
+    env = Environment()
+    env.filters = create_filters(env.filters)
+    env.tests = create_tests(env.tests)
+    return env
+
+
+def test_ansible_filter_names():
+    assert sorted(ANSIBLE_FILTERS) == sorted(plugins.ansible_filters())
+
+
+def test_lazy_filters(env):
+    assert not dict.__contains__(env.filters, "to_json")
+
+    tpl = env.from_string("{{ data|to_json }} {{ name|upper|shout }}")
+    assert dict.__contains__(env.filters, "to_json")
+    assert not dict.__contains__(env.filters, "b64encode")
+    assert tpl.render(data=[1], name="bob") == "[1] BOB!"
+
+
+def test_plugin_tests(env):
+    assert env.from_string("{{ 'bob' is short }}").render() == "True"
+    assert "short" in env.tests.names()
+    assert "shout" in env.filters.names()
+
+
+def test_unknown_filter(env):
+    with pytest.raises(TemplateAssertionError):
+        env.from_string("{{ name|unknown }}")
+    assert env.filters.get("unknown") is None
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import stat
+import threading
+import zipfile
+
+import pytest
+
+from parboil import client
+from parboil import server as server_module
+from parboil.errors import ServerError
+from parboil.server import make_server
+
+
+@pytest.fixture()
+def server_repo(repo_path):
+    recipe = repo_path / "served"
+    recipe.joinpath("template").mkdir(parents=True)
+    recipe.joinpath("parboil.json").write_text(
+        json.dumps({"Name": "World", "Greeting": "Hi"})
+    )
+    recipe.joinpath("template", "hello.txt").write_text("Hello {{ Name }}!")
+    return repo_path
+
+
+def serve(httpd):
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
+
+
+@pytest.fixture()
+def server(server_repo, tmp_path):
+    address = f"unix:{tmp_path / 'boil.sock'}"
+    httpd = serve(make_server(address, server_repo, root=tmp_path))
+    yield address
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_server_recipes(server):
+    assert client.recipes(server) == ["served"]
+
+
+def test_server_archive(server):
+    buf = io.BytesIO()
+    result = client.generate(
+        server, "served", {"Name": "Bob"}, archive_format="zip", out=buf
+    )
+    assert result["created"] == 1
+    with zipfile.ZipFile(io.BytesIO(buf.getvalue())) as zf:
+        assert zf.read("hello.txt") == b"Hello Bob!"
+
+
+def test_server_directory(server, out_path):
+    result = client.generate(server, "served", target=str(out_path))
+    assert result["created"] == 1
+    assert out_path.joinpath("hello.txt").read_text() == "Hello World!"
+
+    with pytest.raises(ServerError) as e:
+        client.generate(server, "served", target="relative/path")
+    assert e.value.status == 400
+
+    # targets need to be inside the server root
+    for target in ("/etc/parboil", str(out_path / ".." / ".." / "x")):
+        with pytest.raises(ServerError) as e:
+            client.generate(server, "served", target=target)
+        assert e.value.status == 403
+
+
+def test_server_socket_mode(server, tmp_path):
+    mode = os.stat(tmp_path / "boil.sock").st_mode
+    assert stat.S_IMODE(mode) == 0o600
+
+
+def test_server_token(server_repo, tmp_path, monkeypatch):
+    with pytest.raises(ServerError):
+        make_server("127.0.0.1:0", server_repo, root=tmp_path)
+
+    httpd = serve(make_server("127.0.0.1:0", server_repo, token="s3cret"))
+    address = f"127.0.0.1:{httpd.server_address[1]}"
+    try:
+        monkeypatch.delenv(client.TOKEN_ENV, raising=False)
+        with pytest.raises(ServerError) as e:
+            client.recipes(address)
+        assert e.value.status == 401
+        with pytest.raises(ServerError) as e:
+            client.recipes(address, token="wrong")
+        assert e.value.status == 401
+
+        assert client.recipes(address, token="s3cret") == ["served"]
+        monkeypatch.setenv(client.TOKEN_ENV, "s3cret")
+        assert client.recipes(address) == ["served"]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_server_errors(server):
+    with pytest.raises(ServerError) as e:
+        client.generate(server, "unknown", archive_format="zip", out=io.BytesIO())
+    assert e.value.status == 404
+
+
+def test_server_invalidation(server, server_repo, monkeypatch):
+    def render():
+        buf = io.BytesIO()
+        client.generate(server, "served", archive_format="zip", out=buf)
+        with zipfile.ZipFile(io.BytesIO(buf.getvalue())) as zf:
+            return {name: zf.read(name).decode() for name in zf.namelist()}
+
+    assert render() == {"hello.txt": "Hello World!"}
+
+    # new files are picked up
+    template_dir = server_repo / "served" / "template"
+    template_dir.joinpath("new.txt").write_text("{{ Name }}")
+    assert render() == {"hello.txt": "Hello World!", "new.txt": "World"}
+
+    # templates edited in place use previously unused ingredients, once
+    # the files are checked again
+    monkeypatch.setattr("parboil.server.RECHECK_INTERVAL", 0)
+    template_dir.joinpath("new.txt").write_text("{{ Greeting }} {{ Name }}")
+    assert render()["new.txt"] == "Hi World"
+
+    # until then only the directories are checked
+    monkeypatch.setattr("parboil.server.RECHECK_INTERVAL", 3600)
+    stamps = []
+    recipe_stamp = server_module.recipe_stamp
+    monkeypatch.setattr(
+        "parboil.server.recipe_stamp",
+        lambda recipe, files=True: stamps.append(files) or recipe_stamp(recipe, files),
+    )
+    render()
+    render()
+    assert stamps == [False, False]
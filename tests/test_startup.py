@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import parboil
+
+# generous budget for the imports of `boil list --plain` in seconds
+IMPORT_BUDGET = 0.25
+# modules only needed by commands that render or print rich output
+HEAVY_MODULES = ("jinja2", "jinja2_ansible_filters", "rich", "jsonc", "subprocess")
+
+
+def importtime(*args):
+    env = dict(os.environ)
+    src = str(Path(parboil.__file__).parent.parent)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "parboil", *args],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    modules = dict()
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header
+        modules[name.strip()] = int(cumulative)
+        # top level imports include the time of all nested imports
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return proc.stdout, modules, total / 1e6
+
+
+@pytest.mark.repo_path_contents("test")
+def test_list_startup(repo_path):
+    stdout, modules, total = importtime("--repo", str(repo_path), "list", "--plain")
+    assert stdout.split() == ["test"]
+
+    loaded = [m for m in modules if m.split(".")[0] in HEAVY_MODULES]
+    assert loaded == []
+    assert total < IMPORT_BUDGET
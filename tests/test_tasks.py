@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+import pytest
+
+from parboil.cache import TaskCache
+from parboil.errors import ProjectConfigError
+from parboil.tasks import Task, TaskRunner, run_tasks, task_graph
+
+
+def test_task_graph():
+    tasks = [
+        Task("git init"),
+        Task("npm install", parallel=True),
+        Task("poetry install", parallel=True),
+        Task("pre-commit install"),
+        Task("echo done", id="done", needs="1"),
+    ]
+    assert task_graph(tasks) == [set(), {0}, {0}, {0, 1, 2}, {0}]
+
+    # tasks without options run one after another
+    assert task_graph([Task("a"), Task("b"), Task("c")]) == [set(), {0}, {1}]
+
+
+def test_task_graph_errors():
+    with pytest.raises(ProjectConfigError):
+        task_graph([Task("a", id="x"), Task("b", id="x")])
+    with pytest.raises(ProjectConfigError):
+        task_graph([Task("a", needs=["unknown"])])
+    with pytest.raises(ProjectConfigError):
+        task_graph([Task("a", id="a", needs=["b"]), Task("b", id="b", needs=["a"])])
+
+
+def test_run_parallel(tmp_path):
+    tasks = [Task("sleep 0.5", parallel=True) for _ in range(3)]
+    start = time.monotonic()
+    results = run_tasks(tasks, cwd=tmp_path, jobs=3)
+    assert time.monotonic() - start < 1.4
+    assert all(result.success for result in results)
+
+
+def test_run_output(tmp_path):
+    lines = []
+    tasks = [
+        Task("echo one", id="one", parallel=True),
+        Task("echo two", id="two", parallel=True),
+    ]
+    run_tasks(
+        tasks,
+        cwd=tmp_path,
+        jobs=2,
+        output=lambda i, task, line: lines.append((task.id, line)),
+    )
+    assert sorted(lines) == [("one", "one"), ("two", "two")]
+
+
+def test_run_cancel(tmp_path):
+    tasks = [
+        Task("exit 1", id="fail"),
+        Task("touch a", needs=["fail"]),
+        Task("touch b", needs=["2"]),
+        Task("touch c", needs=[]),
+    ]
+    results = run_tasks(tasks, cwd=tmp_path, jobs=2)
+    assert [r.success for r in results] == [False, False, False, True]
+    assert [r.cancelled for r in results] == [False, True, True, False]
+    assert not tmp_path.joinpath("a").exists()
+    assert tmp_path.joinpath("c").exists()
+
+
+def test_task_cache(tmp_path):
+    cache = TaskCache(tmp_path / "cache")
+    work = tmp_path / "work"
+    work.mkdir()
+    work.joinpath("deps.lock").write_text("a==1")
+
+    def make_task():
+        return Task(
+            "mkdir -p out; date +%s%N > out/stamp",
+            cache={"inputs": "deps.lock", "outputs": ["out"]},
+        )
+
+    first = run_tasks([make_task()], cwd=work, cache=cache)
+    assert first[0].cached is False
+    stamp = work.joinpath("out", "stamp").read_text()
+
+    work.joinpath("out", "stamp").unlink()
+    second = run_tasks([make_task()], cwd=work, cache=cache)
+    assert second[0].cached is True
+    assert work.joinpath("out", "stamp").read_text() == stamp
+
+    # changed inputs run the task again
+    work.joinpath("deps.lock").write_text("a==2")
+    third = run_tasks([make_task()], cwd=work, cache=cache)
+    assert third[0].cached is False
+    assert work.joinpath("out", "stamp").read_text() != stamp
+
+    with pytest.raises(ProjectConfigError):
+        Task("true", cache={"inputs": ["deps.lock"]})
+
+
+def test_pipelined_runner(tmp_path):
+    tasks = [
+        Task("touch early", files=["package.json"]),
+        Task("touch concurrent", stage="concurrent", needs=[]),
+        Task("touch late", parallel=True),
+    ]
+    runner = TaskRunner(tasks, cwd=tmp_path, jobs=2, pipelined=True).start()
+    runner.wait([1])
+    assert tmp_path.joinpath("concurrent").exists()
+
+    runner.notify("package.json")
+    runner.wait([0])
+    assert tmp_path.joinpath("early").exists()
+    assert not tmp_path.joinpath("late").exists()
+
+    results = runner.join()
+    assert all(result.success for result in results)
+    assert tmp_path.joinpath("late").exists()
+
+
+def test_task_timeout(tmp_path):
+    task = Task("sleep 10; touch late", timeout=0.3)
+    start = time.monotonic()
+    assert not task.execute(cwd=tmp_path)
+    assert time.monotonic() - start < 5
+    assert task.timed_out
+    assert not tmp_path.joinpath("late").exists()
+
+    # the global timeout only applies to tasks without their own
+    task = Task("sleep 0.5", timeout=5)
+    assert task.execute(cwd=tmp_path, timeout=0.1)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="sessions are POSIX only")
+def test_task_sessions(tmp_path):
+    def session(**kwargs):
+        lines = []
+        task = Task("python -c 'import os; print(os.getsid(0))'")
+        assert task.execute(cwd=tmp_path, output=lines.append, **kwargs)
+        return int(lines[0])
+
+    # tasks stay in the session of the terminal to receive Ctrl-C
+    assert session() == os.getsid(0)
+    assert session(timeout=10) == os.getsid(0)
+    # only tasks with a timeout, that can't read input, are detached
+    assert session(timeout=10, stdin=False) != os.getsid(0)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="process groups are POSIX only")
+def test_task_timeout_group(tmp_path):
+    # the subprocesses of the shell keep the output pipe open, unless the
+    # whole process group is killed
+    lines = []
+    task = Task("echo started; sleep 20 && echo done", timeout=0.5)
+    start = time.monotonic()
+    assert not task.execute(cwd=tmp_path, output=lines.append, stdin=True)
+    assert time.monotonic() - start < 5
+    assert task.timed_out
+    assert lines == ["started"]
+
+    # interactive tasks with a timeout get a process group of their own
+    task = Task("python -c 'import os; print(os.getpgid(0))'", timeout=10)
+    lines = []
+    assert task.execute(cwd=tmp_path, output=lines.append, stdin=True)
+    assert int(lines[0]) != os.getpgid(0)
+
+
+def test_runner_kill(tmp_path):
+    tasks = [Task("sleep 10; touch late"), Task("touch never")]
+    runner = TaskRunner(tasks, cwd=tmp_path, jobs=1, timeout=30).start()
+    while not runner._running:
+        time.sleep(0.01)
+
+    start = time.monotonic()
+    runner.cancel(kill=True)
+    results = runner.join()
+    assert time.monotonic() - start < 5
+    assert [r.cancelled for r in results] == [True, True]
+    assert not any(r.success for r in results)
+    assert not tmp_path.joinpath("late").exists()
+    assert not tmp_path.joinpath("never").exists()
+
+
+def test_task_stats(tmp_path):
+    task = Task("python -c 'sum(range(10**6))'")
+    assert task.execute(cwd=tmp_path, output=lambda line: None)
+    assert task.stats.wall_time > 0
+    if hasattr(os, "wait4"):
+        assert task.stats.cpu_time > 0
+        assert task.stats.max_rss > 0
+
+
+def test_quiet_log_file(tmp_path):
+    lines = []
+    tasks = [Task("echo hidden", quiet=True, id="quiet"), Task("echo shown")]
+    results = run_tasks(
+        tasks,
+        cwd=tmp_path,
+        output=lambda i, task, line: lines.append(line),
+        log_dir=tmp_path / "logs",
+    )
+    assert lines == ["shown"]
+    assert results[0].log_file == tmp_path / "logs" / "quiet.log"
+    assert results[0].log_file.read_text().strip() == "hidden"